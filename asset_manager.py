@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FONT = "font"
+BACKGROUND = "background"
+PRELOAD_PAGE = "preload.html"
+
+
+@dataclass
+class Asset:
+    """一个渲染用的静态资源（字体或背景图）"""
+    name: str
+    kind: str
+    source: Path
+    digest: str = ""
+    staged_path: Path | None = None
+
+    @property
+    def file_name(self) -> str:
+        """带内容哈希的文件名，内容不变时URL不变，浏览器可以一直缓存"""
+        return f"{self.source.stem}.{self.digest[:12]}{self.source.suffix}"
+
+
+class AssetManager:
+    """管理模板用到的字体和背景图
+
+    启动时检查一次所有资源，按内容哈希复制到 stage_dir，之后每次渲染只需要拼URL，
+    不再逐个检查和复制文件。额外的字体和背景可以写在清单文件中注册，不需要改代码：
+
+        {
+            "fonts": {"title": "优设标题黑.ttf", "content": "No.14-上首水滴体.ttf"},
+            "backgrounds": {"default": "bg1.jpg", "pink": "backgrounds/pink.jpg"}
+        }
+    """
+
+    def __init__(self, stage_dir: Path, url_prefix: str = "assets/"):
+        self.stage_dir = Path(stage_dir)
+        self.url_prefix = url_prefix
+        self._assets: dict[tuple[str, str], Asset] = {}
+        self._lock = threading.Lock()
+        self._staged = False
+
+    def register(self, kind: str, name: str, source: Path | str):
+        """注册（或替换）一个资源，下一次使用前会重新暂存"""
+        with self._lock:
+            self._assets[(kind, name)] = Asset(name=name, kind=kind, source=Path(source))
+            self._staged = False
+
+    def load_manifest(self, path: Path | str):
+        """从清单文件注册资源，清单中的相对路径相对于清单所在目录"""
+        path = Path(path)
+        if not path.exists():
+            return
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        for section, kind in (("fonts", FONT), ("backgrounds", BACKGROUND)):
+            for name, source in manifest.get(section, {}).items():
+                self.register(kind, name, path.parent / source)
+        logger.info(f"已加载资源清单: {path}")
+
+    def names(self, kind: str) -> list[str]:
+        return [name for asset_kind, name in self._assets if asset_kind == kind]
+
+    def source(self, kind: str, name: str) -> Path:
+        """资源的原始路径（暂存前也可用，例如给排版引擎读取字宽）"""
+        return self._get(kind, name).source
+
+    def _get(self, kind: str, name: str) -> Asset:
+        asset = self._assets.get((kind, name))
+        if asset is None:
+            raise KeyError(f"未注册的{'字体' if kind == FONT else '背景'}: {name}")
+        return asset
+
+    def stage(self):
+        """检查所有资源并按内容哈希复制到暂存目录，清理不再使用的旧版本"""
+        with self._lock:
+            if self._staged:
+                return
+            for asset in self._assets.values():
+                if not asset.source.exists():
+                    raise FileNotFoundError(
+                        f"找不到{'字体' if asset.kind == FONT else '背景图片'}文件: {asset.source}"
+                    )
+
+            self.stage_dir.mkdir(parents=True, exist_ok=True)
+            for asset in self._assets.values():
+                asset.digest = _file_digest(asset.source)
+                asset.staged_path = self.stage_dir / asset.file_name
+                if not asset.staged_path.exists():
+                    tmp_path = self.stage_dir / f".{asset.file_name}.{uuid.uuid4().hex}.tmp"
+                    shutil.copyfile(asset.source, tmp_path)
+                    os.replace(tmp_path, asset.staged_path)
+                    logger.info(f"已暂存资源: {asset.source} -> {asset.staged_path}")
+
+            in_use = {asset.file_name for asset in self._assets.values()} | {PRELOAD_PAGE}
+            for path in self.stage_dir.iterdir():
+                if path.is_file() and path.name not in in_use and not path.name.startswith("."):
+                    path.unlink(missing_ok=True)
+            self._staged = True
+
+    def path(self, kind: str, name: str) -> Path:
+        """暂存后的资源路径"""
+        self.stage()
+        return self._get(kind, name).staged_path
+
+    def url(self, kind: str, name: str) -> str:
+        """模板中引用资源的URL（相对于HTML文件）"""
+        self.stage()
+        return self.url_prefix + self._get(kind, name).file_name
+
+    def preload_page(self) -> Path:
+        """生成一个引用所有字体和背景图的页面，新启动的浏览器先加载它，把资源放进缓存"""
+        self.stage()
+        fonts = [asset for asset in self._assets.values() if asset.kind == FONT]
+        backgrounds = [asset for asset in self._assets.values() if asset.kind == BACKGROUND]
+        font_faces = "\n".join(
+            f"@font-face {{ font-family: 'preload-{index}'; src: url('{asset.file_name}'); }}"
+            for index, asset in enumerate(fonts)
+        )
+        texts = "\n".join(
+            f"<p style=\"font-family: 'preload-{index}'\">预加载 Preload</p>" for index in range(len(fonts))
+        )
+        boxes = "\n".join(
+            f"<div class=\"content-box\" style=\"width: 1px; height: 1px; background-image: url('{asset.file_name}')\">"
+            f"</div>"
+            for asset in backgrounds
+        )
+        path = self.stage_dir / PRELOAD_PAGE
+        path.write_text(
+            f"<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><style>{font_faces}</style></head>"
+            f"<body>{texts}{boxes}</body></html>",
+            encoding="utf-8"
+        )
+        return path
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
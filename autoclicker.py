@@ -1,27 +1,53 @@
 import pyautogui
 import time
-import keyboard
 import sys
+import argparse
+import functools
+import queue
+import threading
+import shutil
+from pathlib import Path
 from pynput import mouse, keyboard as kb
 import json
+import vision_anchor
 
 # 设置防故障安全措施
 pyautogui.FAILSAFE = True
+# 播放节奏完全由录制的时间决定，不需要每次调用后再额外暂停
+pyautogui.PAUSE = 0
+
+# 交互模式的热键 -> 命令
+HOTKEYS = {
+    '<f2>': 'record',
+    '<f3>': 'stop',
+    '<f4>': 'play',
+    '<esc>': 'quit',
+}
+# 热键本身不录制
+HOTKEY_KEYS = {kb.Key.f2, kb.Key.f3, kb.Key.f4, kb.Key.esc}
+
+FORMAT_VERSION = 2  # 紧凑格式；旧的录制文件（动作对象的列表）仍然可以播放
+DOUBLE_CLICK_FALLBACK = 0.4  # 读不到系统双击间隔时使用的值（秒），取常见桌面环境默认值中较小的
+SPIN_MARGIN = 0.002  # 离目标时间不到这么多秒时改为忙等，sleep 的精度不够
+LATE_WARNING = 0.02  # 延迟超过这么多秒的动作单独列出
 
 class ClickRecorder:
-    def __init__(self):
+    def __init__(self, ignored_keys=(), anchor_size=None):
+        self.ignored_keys = set(ignored_keys)
+        self.anchor_size = anchor_size  # 设置后每次按下鼠标时截取这么大的锚点
         self.recorded_actions = []
         self.is_recording = False
         self.mouse_listener = None
         self.keyboard_listener = None
         self.start_time = None
         self.drag_start = None
+        self.last_press = None  # 上一次按下的 (x, y, 按键, 时间)
 
     def on_click(self, x, y, button, pressed):
         if not self.is_recording:
             return
         
-        current_time = time.time()
+        current_time = time.perf_counter()
         if self.start_time is None:
             self.start_time = current_time
             interval = 0
@@ -30,8 +56,13 @@ class ClickRecorder:
 
         button_name = 'left' if button == mouse.Button.left else 'right'
         if pressed:
+            # 在按下的瞬间截图，界面还没有对这次点击做出反应；
+            # 双击的后续点击不截图，界面已经响应了第一次点击，播放时随第一次点击一起定位
+            repeat = is_repeat_click(self.last_press, (x, y, button_name, interval))
+            self.last_press = (x, y, button_name, interval)
+            anchor = {} if repeat else self.capture_anchor(x, y)
             if not self.drag_start:
-                self.drag_start = (x, y, button_name)
+                self.drag_start = (x, y, button_name, anchor)
             else:
                 # 如果已经有拖动起点，这是一个新的点击，清除拖动状态
                 self.drag_start = None
@@ -40,12 +71,13 @@ class ClickRecorder:
                     'x': x,
                     'y': y,
                     'button': button_name,
-                    'interval': interval
+                    'interval': interval,
+                    **anchor
                 })
                 print(f"记录{button_name}点击: ({x}, {y})")
         else:  # 释放点击
             if self.drag_start:
-                start_x, start_y, start_button = self.drag_start
+                start_x, start_y, start_button, anchor = self.drag_start
                 if (start_x, start_y) != (x, y):  # 如果起点和终点不同，记录为拖动
                     self.recorded_actions.append({
                         'type': 'drag',
@@ -54,7 +86,8 @@ class ClickRecorder:
                         'end_x': x,
                         'end_y': y,
                         'button': start_button,
-                        'interval': interval
+                        'interval': interval,
+                        **anchor
                     })
                     print(f"记录拖动: 从({start_x}, {start_y})到({x}, {y})")
                 else:  # 如果起点和终点相同，记录为点击
@@ -63,17 +96,32 @@ class ClickRecorder:
                         'x': x,
                         'y': y,
                         'button': button_name,
-                        'interval': interval
+                        'interval': interval,
+                        **anchor
                     })
                     print(f"记录{button_name}点击: ({x}, {y})")
                 self.drag_start = None
 
+    def capture_anchor(self, x, y):
+        if not self.anchor_size:
+            return {}
+        try:
+            anchor = vision_anchor.capture_anchor(x, y, self.anchor_size)
+        except Exception as e:
+            print(f"截取锚点失败: {str(e)}")
+            return {}
+        if anchor is None:
+            print("点击位置周围没有明显特征，不保存锚点")
+            return {}
+        image, offset, scale = anchor
+        return {'anchor_image': image, 'anchor_offset': offset, 'anchor_scale': scale}
+
     def on_key(self, key):
-        if not self.is_recording:
+        if not self.is_recording or key in self.ignored_keys:
             return
 
         try:
-            current_time = time.time()
+            current_time = time.perf_counter()
             if self.start_time is None:
                 self.start_time = current_time
                 interval = 0
@@ -100,6 +148,7 @@ class ClickRecorder:
             self.recorded_actions = []
             self.start_time = None
             self.drag_start = None
+            self.last_press = None
             self.mouse_listener = mouse.Listener(on_click=self.on_click)
             self.keyboard_listener = kb.Listener(on_press=self.on_key)
             self.mouse_listener.start()
@@ -117,100 +166,458 @@ class ClickRecorder:
 
     def save_recording(self, filename="clicks.json"):
         if self.recorded_actions:
-            with open(filename, 'w') as f:
-                json.dump(self.recorded_actions, f)
+            save_actions(self.recorded_actions, filename)
             print(f"录制已保存到 {filename}")
             return True
         else:
             print("没有记录到动作")
             return False
 
-def play_recorded_actions(filename="clicks.json"):
-    try:
-        with open(filename, 'r') as f:
-            actions = json.load(f)
-        
-        print("开始播放录制的动作...")
-        
-        last_time = 0
-        for action in actions:
-            # 等待到指定的时间间隔
-            wait_time = action['interval'] - last_time
-            if wait_time > 0:
-                time.sleep(wait_time)
-            
-            if action['type'] == 'click':
-                if action['button'] == 'left':
-                    pyautogui.click(x=action['x'], y=action['y'])
+@functools.lru_cache(maxsize=1)
+def double_click_interval():
+    """系统的双击间隔（秒）：Windows 读取系统设置，其他系统使用 DOUBLE_CLICK_FALLBACK"""
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            return ctypes.windll.user32.GetDoubleClickTime() / 1000
+        except (ImportError, AttributeError, OSError):
+            pass
+    return DOUBLE_CLICK_FALLBACK
+
+def is_repeat_click(previous, current, window=None):
+    """current 是否是 previous 的连续点击（多击的一部分），两者都是 (x, y, 按键, 时间)"""
+    if previous is None:
+        return False
+    window = double_click_interval() if window is None else window
+    return previous[:3] == current[:3] and 0 <= current[3] - previous[3] <= window
+
+def compact_actions(actions, window=None):
+    """合并多余的动作：同一位置、同一按键在系统双击间隔内的连续点击合并为一次多击
+
+    合并后的动作记录平均的点击间隔（click_interval），播放时按这个间隔连击。
+    后面的点击带有自己的锚点时不合并，以免丢掉锚点。
+    不同按键的点击（例如先左键选中、再右键打开菜单）是不同的操作，不合并。
+    """
+    merged = []
+    for action in actions:
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and action['type'] == previous['type'] == 'click'
+            and 'anchor' not in action and 'anchor_image' not in action
+            and is_repeat_click(
+                (previous['x'], previous['y'], previous['button'], previous.get('last_interval', previous['interval'])),
+                (action['x'], action['y'], action['button'], action['interval']),
+                window
+            )
+        ):
+            clicks = previous.get('clicks', 1) + 1
+            previous['clicks'] = clicks
+            previous['click_interval'] = (action['interval'] - previous['interval']) / (clicks - 1)
+            previous['last_interval'] = action['interval']
+            continue
+        merged.append(dict(action))
+    for action in merged:
+        action.pop('last_interval', None)
+    return merged
+
+def encode_actions(actions):
+    """转换为紧凑格式：时间为从开始录制起的毫秒数，每个动作是一个数组，末尾的默认值省略
+
+    click: ["c", 时间, x, y, 按键, 次数, 连击间隔毫秒]
+    drag:  ["d", 时间, 起点x, 起点y, 终点x, 终点y, 按键]
+    key:   ["k", 时间, 按键]
+    有锚点的动作不省略默认值，末尾再加一个对象：{"anchor": 图片路径, "offset": [dx, dy], "scale": 屏幕缩放}
+    """
+    rows = []
+    for action in compact_actions(actions):
+        at = round(action['interval'] * 1000)
+        if action['type'] == 'click':
+            row = [
+                "c", at, action['x'], action['y'], action['button'], action.get('clicks', 1),
+                round(action.get('click_interval', 0) * 1000)
+            ]
+            defaults = [None, None, None, None, 'left', 1, 0]
+        elif action['type'] == 'drag':
+            row = ["d", at, action['start_x'], action['start_y'], action['end_x'], action['end_y'], action['button']]
+            defaults = [None] * 6 + ['left']
+        else:
+            row = ["k", at, action['key']]
+            defaults = []
+        if 'anchor' in action:
+            row.append({
+                "anchor": action['anchor'],
+                "offset": list(action['anchor_offset']),
+                "scale": action.get('anchor_scale', 1.0)
+            })
+        else:
+            while len(row) > 2 and len(row) <= len(defaults) and row[-1] == defaults[len(row) - 1]:
+                row.pop()
+        rows.append(row)
+    return {"version": FORMAT_VERSION, "actions": rows}
+
+def decode_actions(data):
+    """读取录制数据，返回动作对象的列表（interval 为从开始录制起的秒数）"""
+    if isinstance(data, list):
+        return data  # 旧格式
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的录制格式版本: {data.get('version')}")
+    actions = []
+    for row in data["actions"]:
+        extra = row[-1] if isinstance(row[-1], dict) else None
+        if extra is not None:
+            row = row[:-1]
+        kind, at = row[0], row[1] / 1000
+        if kind == "c":
+            x, y, button, clicks, click_interval = (row[2:] + ['left', 1, 0][len(row) - 4:])[:5]
+            actions.append({'type': 'click', 'x': x, 'y': y, 'button': button, 'clicks': clicks, 'interval': at})
+            if click_interval:
+                actions[-1]['click_interval'] = click_interval / 1000
+        elif kind == "d":
+            start_x, start_y, end_x, end_y, button = (row[2:] + ['left'][len(row) - 6:])[:5]
+            actions.append({
+                'type': 'drag', 'start_x': start_x, 'start_y': start_y,
+                'end_x': end_x, 'end_y': end_y, 'button': button, 'interval': at
+            })
+        elif kind == "k":
+            actions.append({'type': 'key', 'key': row[2], 'interval': at})
+        else:
+            raise ValueError(f"未知的动作类型: {kind}")
+        if extra is not None:
+            actions[-1].update({
+                'anchor': extra['anchor'],
+                'anchor_offset': tuple(extra['offset']),
+                'anchor_scale': extra.get('scale', 1.0)
+            })
+    return actions
+
+def anchor_dir(filename):
+    """锚点图片保存在录制文件旁边的 <文件名>.anchors 目录中"""
+    return Path(filename).with_suffix('.anchors')
+
+def load_actions(filename="clicks.json"):
+    """读取录制文件，锚点图片的路径转换为绝对路径"""
+    with open(filename, 'r') as f:
+        actions = decode_actions(json.load(f))
+    base_dir = Path(filename).resolve().parent
+    for action in actions:
+        if 'anchor' in action:
+            action['anchor'] = str(base_dir / action['anchor'])
+    return actions
+
+def save_actions(actions, filename="clicks.json"):
+    """保存录制文件，锚点图片写入 anchor_dir，文件中记录相对路径"""
+    directory = anchor_dir(filename)
+    written = set()
+    saved = []
+    for index, action in enumerate(actions):
+        action = dict(action)
+        image = action.pop('anchor_image', None)
+        if image is not None or 'anchor' in action:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{index}.png"
+            if image is not None:
+                image.save(path)
+            elif Path(action['anchor']).resolve() != path.resolve():
+                shutil.copyfile(action['anchor'], path)
+            written.add(path.name)
+            action['anchor'] = path.relative_to(Path(filename).parent).as_posix()
+        saved.append(action)
+    if directory.is_dir():
+        # 删除之前录制留下的图片
+        for stale in directory.glob("*.png"):
+            if stale.name not in written:
+                stale.unlink()
+    with open(filename, 'w') as f:
+        json.dump(encode_actions(saved), f, ensure_ascii=False, separators=(',', ':'))
+
+def prepare_anchors(actions):
+    """播放前一次性加载所有锚点模板，并按当前屏幕的缩放比例缩放"""
+    anchored = [action for action in actions if 'anchor' in action]
+    if not anchored:
+        return 0
+    scale = vision_anchor.screen_scale()
+    for action in anchored:
+        action['template'] = vision_anchor.Template.load(
+            action['anchor'], action['anchor_offset'], action.get('anchor_scale', 1.0), scale
+        )
+    return len(anchored)
+
+def wait_until(deadline, stop_event=None):
+    """等到 deadline（time.perf_counter 的时间），被 stop_event 打断时返回 False"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if remaining > SPIN_MARGIN:
+            if stop_event is not None:
+                if stop_event.wait(remaining - SPIN_MARGIN):
+                    return False
+            else:
+                time.sleep(remaining - SPIN_MARGIN)
+        elif stop_event is not None and stop_event.is_set():
+            return False
+
+def action_position(action):
+    """动作的起始位置，锚点相对这个位置截取"""
+    if action['type'] == 'drag':
+        return action['start_x'], action['start_y']
+    return action['x'], action['y']
+
+def perform_action(action, speed=1.0, position=None):
+    """执行动作，position 为找到的锚点位置时整体平移到这个位置"""
+    dx, dy = 0, 0
+    if position is not None:
+        x, y = action_position(action)
+        dx, dy = position[0] - x, position[1] - y
+    if action['type'] == 'click':
+        pyautogui.click(
+            x=action['x'] + dx, y=action['y'] + dy, button=action['button'], clicks=action.get('clicks', 1),
+            interval=action.get('click_interval', 0) / speed
+        )
+    elif action['type'] == 'drag':
+        pyautogui.mouseDown(x=action['start_x'] + dx, y=action['start_y'] + dy, button=action['button'])
+        pyautogui.moveTo(action['end_x'] + dx, action['end_y'] + dy, duration=0.2 / speed)
+        pyautogui.mouseUp(button=action['button'])
+    elif action['type'] == 'key':
+        pyautogui.press(action['key'])
+
+class PlaybackStats:
+    """每个动作实际开始执行的时间比计划晚了多少（秒）"""
+
+    def __init__(self):
+        self.lateness = []
+
+    def add(self, index, action, lateness):
+        self.lateness.append(lateness)
+        if lateness > LATE_WARNING:
+            print(f"第 {index + 1} 个动作（{action['type']}）延迟 {lateness * 1000:.1f}ms")
+
+    def summary(self):
+        if not self.lateness:
+            return {"actions": 0}
+        ordered = sorted(self.lateness)
+        return {
+            "actions": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+            "late_actions": sum(1 for value in ordered if value > LATE_WARNING)
+        }
+
+def play_actions(actions, stop_event=None, speed=1.0, stats=None, anchor_timeout=vision_anchor.ANCHOR_TIMEOUT):
+    """播放一组动作
+
+    每个动作的目标时间是开始播放的时刻加上录制时的时间（除以 speed），都以单调时钟计算，
+    上一个动作耗时多少都不会推迟之后的动作。stop_event 被设置时立即停止。
+    加载了锚点模板的动作不等目标时间，锚点一出现就执行，之后的动作改为相对它的实际执行时间计算。
+    """
+    stats = stats if stats is not None else PlaybackStats()
+    started = time.perf_counter()
+    for index, action in enumerate(actions):
+        deadline = started + action['interval'] / speed
+        position = None
+        if 'template' in action:
+            x, y = action_position(action)
+            position = vision_anchor.find_anchor(
+                action['template'], x, y, timeout=anchor_timeout, stop_event=stop_event
+            )
+            if position is None:
+                if stop_event is not None and stop_event.is_set():
+                    print("播放已停止")
                 else:
-                    pyautogui.rightClick(x=action['x'], y=action['y'])
-            elif action['type'] == 'drag':
-                pyautogui.mouseDown(x=action['start_x'], y=action['start_y'], button=action['button'])
-                pyautogui.moveTo(action['end_x'], action['end_y'], duration=0.2)
-                pyautogui.mouseUp()
-            elif action['type'] == 'key':
-                pyautogui.press(action['key'])
-            
-            last_time = action['interval']
-            
+                    print(f"第 {index + 1} 个动作的锚点在 {anchor_timeout:g} 秒内没有出现，停止播放")
+                return False
+            now = time.perf_counter()
+            started = now - action['interval'] / speed
+        elif not wait_until(deadline, stop_event):
+            print("播放已停止")
+            return False
+        stats.add(index, action, time.perf_counter() - deadline)
+        perform_action(action, speed, position)
+    
+    summary = stats.summary()
+    if summary["actions"]:
+        print(
+            f"播放完成，共 {summary['actions']} 个动作，"
+            f"延迟平均 {summary['mean_ms']}ms，p95 {summary['p95_ms']}ms，最大 {summary['max_ms']}ms"
+        )
+    else:
         print("播放完成")
+    return True
+
+def play_loop(filename="clicks.json", loops=1, stop_event=None, speed=1.0, stats=None,
+              anchors=True, anchor_timeout=vision_anchor.ANCHOR_TIMEOUT):
+    """连续播放 loops 次，loops 为0时一直播放直到停止；录制文件和锚点模板只加载一次"""
+    try:
+        actions = load_actions(filename)
+        if anchors:
+            count = prepare_anchors(actions)
+            if count:
+                print(f"已加载 {count} 个锚点")
+        
+        count = 0
+        while loops == 0 or count < loops:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            count += 1
+            if loops != 1:
+                print(f"第 {count} 次播放")
+            print(f"开始播放录制的动作（{speed:g} 倍速）...")
+            if not play_actions(actions, stop_event, speed, stats, anchor_timeout):
+                return False
         return True
     except FileNotFoundError:
         print("未找到录制文件")
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, ValueError, KeyError, IndexError):
         print("录制文件格式错误")
     except Exception as e:
         print(f"播放时发生错误: {str(e)}")
     return False
 
-def main():
+def play_recorded_actions(filename="clicks.json", stop_event=None, speed=1.0, stats=None, anchors=True):
+    """播放录制的动作"""
+    return play_loop(filename, 1, stop_event, speed, stats, anchors)
+
+def run_hotkeys(filename="clicks.json", anchor_size=None):
+    """交互模式：热键只把命令放入队列，主线程阻塞等待命令，空闲时不占用CPU"""
     print("自动点击录制/播放程序")
     print("按 'F2' 开始录制")
     print("按 'F3' 停止录制并保存")
-    print("按 'F4' 播放录制")
+    print("按 'F4' 播放录制（播放中按 'Esc' 停止）")
     print("按 'Esc' 退出程序")
     print("支持左键、右键点击、拖动和键盘按键")
     
-    recorder = ClickRecorder()
+    recorder = ClickRecorder(ignored_keys=HOTKEY_KEYS, anchor_size=anchor_size)
+    commands = queue.Queue()
+    stop_event = threading.Event()  # 播放在主线程中进行，Esc 需要直接打断
+    
+    def on_hotkey(command):
+        if command == 'quit':
+            stop_event.set()
+        commands.put(command)
     
+    hotkeys = kb.GlobalHotKeys({key: functools.partial(on_hotkey, command) for key, command in HOTKEYS.items()})
+    hotkeys.start()
     try:
         while True:
-            # 开始录制
-            if keyboard.is_pressed('F2'):
+            command = commands.get()
+            if command == 'record':
                 recorder.start_recording()
-                time.sleep(0.5)
-            
-            # 停止录制并保存
-            elif keyboard.is_pressed('F3'):
+            elif command == 'stop':
                 recorder.stop_recording()
-                recorder.save_recording()
-                time.sleep(0.5)
-            
-            # 播放录制
-            elif keyboard.is_pressed('F4'):
+                recorder.save_recording(filename)
+            elif command == 'play':
                 if recorder.is_recording:
                     print("请先停止录制（按'F3'）")
                 else:
-                    play_recorded_actions()
-                time.sleep(0.5)
-                
-            # 检查 Esc 键来退出程序
-            elif keyboard.is_pressed('Esc'):
+                    play_recorded_actions(filename, stop_event)
+                    if stop_event.is_set():
+                        # 播放中按下的 Esc 只停止播放，不退出程序
+                        stop_event.clear()
+                        drain(commands)
+            elif command == 'quit':
                 print("程序已退出!")
-                if recorder.is_recording:
-                    recorder.stop_recording()
-                sys.exit()
-                
+                break
     except KeyboardInterrupt:
         print("程序已终止!")
+    finally:
+        hotkeys.stop()
         if recorder.is_recording:
             recorder.stop_recording()
-        sys.exit()
+    return 0
+
+def drain(commands):
+    """丢弃播放期间积压的命令"""
+    while True:
+        try:
+            commands.get_nowait()
+        except queue.Empty:
+            return
+
+def run_record(filename="clicks.json", duration=None, anchor_size=None):
+    """命令行录制：录制 duration 秒，或者直到按 Ctrl+C"""
+    recorder = ClickRecorder(anchor_size=anchor_size)
+    recorder.start_recording()
+    print(f"录制 {duration} 秒..." if duration else "按 Ctrl+C 停止录制")
+    try:
+        threading.Event().wait(duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop_recording()
+    return 0 if recorder.save_recording(filename) else 1
+
+def run_play(filename="clicks.json", loops=1, speed=1.0, report=None,
+             anchors=True, anchor_timeout=vision_anchor.ANCHOR_TIMEOUT):
+    """命令行播放：不注册任何热键，按 Ctrl+C 停止；report 指定时把每个动作的延迟写入JSON文件"""
+    stop_event = threading.Event()
+    stats = PlaybackStats()
+    try:
+        result = 0 if play_loop(filename, loops, stop_event, speed, stats, anchors, anchor_timeout) else 1
+    except KeyboardInterrupt:
+        print("播放已停止")
+        result = 1
+    if report:
+        with open(report, 'w') as f:
+            json.dump({
+                **stats.summary(),
+                "speed": speed,
+                "lateness_ms": [round(value * 1000, 3) for value in stats.lateness]
+            }, f, indent=2)
+        print(f"延迟报告已保存到 {report}")
+    return result
+
+def run_convert(source, target=None):
+    """把录制文件转换为紧凑格式"""
+    actions = load_actions(source)
+    save_actions(actions, target or source)
+    print(f"已转换 {len(actions)} 个动作 -> {len(compact_actions(actions))} 个，保存到 {target or source}")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="自动点击录制/播放程序，不带命令时进入热键模式")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    record = subparsers.add_parser("record", help="录制动作（不需要热键）")
+    record.add_argument("file", nargs="?", default="clicks.json", help="保存的文件")
+    record.add_argument("--duration", type=float, help="录制时长（秒），默认直到按 Ctrl+C")
+    record.add_argument("--anchors", action="store_true", help="每次点击时截取锚点，播放时等锚点出现再点击")
+    record.add_argument("--anchor-size", type=int, default=vision_anchor.ANCHOR_SIZE, help="锚点边长（像素）")
+    
+    play = subparsers.add_parser("play", help="播放录制的动作（不需要热键）")
+    play.add_argument("file", nargs="?", default="clicks.json", help="录制文件")
+    play.add_argument("--loop", type=int, default=1, metavar="N", help="播放次数，0表示一直播放")
+    play.add_argument("--speed", type=float, default=1.0, help="播放速度倍数，例如2表示两倍速")
+    play.add_argument("--report", help="把每个动作的延迟写入这个JSON文件")
+    play.add_argument("--no-anchors", dest="anchors", action="store_false", help="忽略锚点，只按录制的坐标和时间播放")
+    play.add_argument("--anchor-timeout", type=float, default=vision_anchor.ANCHOR_TIMEOUT,
+                      help="等待锚点出现的最长时间（秒）")
+    
+    convert = subparsers.add_parser("convert", help="把录制文件转换为紧凑格式")
+    convert.add_argument("source", help="录制文件")
+    convert.add_argument("target", nargs="?", help="保存的文件，默认覆盖原文件")
+    
+    parser.add_argument("--file", dest="hotkey_file", default="clicks.json", help="热键模式使用的录制文件")
+    parser.add_argument("--record-anchors", action="store_true", help="热键模式录制时截取锚点")
+    args = parser.parse_args(argv)
+    if args.command == "play" and args.speed <= 0:
+        parser.error("--speed 必须大于0")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.command == "record":
+            return run_record(args.file, args.duration, args.anchor_size if args.anchors else None)
+        if args.command == "play":
+            return run_play(args.file, args.loop, args.speed, args.report, args.anchors, args.anchor_timeout)
+        if args.command == "convert":
+            return run_convert(args.source, args.target)
+        return run_hotkeys(args.hotkey_file, vision_anchor.ANCHOR_SIZE if args.record_anchors else None)
     except Exception as e:
         print(f"发生错误: {str(e)}")
-        if recorder.is_recording:
-            recorder.stop_recording()
-        sys.exit(1)
+        return 1
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
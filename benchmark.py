@@ -0,0 +1,391 @@
+"""性能基准测试
+
+启动模拟的Ollama服务（fake_ollama.py）和生成服务，依次运行以下场景，
+统计延迟的 p50/p95/p99、吞吐量、服务进程（含浏览器子进程）的内存峰值，
+以及各处理阶段（include_timings 返回的耗时）的分布和内存峰值，结果写入JSON文件，便于比较不同版本：
+
+    python benchmark.py --renderer raster --output bench.json
+    python benchmark.py --baseline bench.json --output bench-new.json
+
+- single: 只请求标题页（模型生成 + 分页 + 渲染一页）
+- post: 逐个生成整篇文章（/generate/batch）
+- concurrent: 并发生成整篇文章
+
+整个过程只访问本机，不需要网络和真实模型。
+--backends 大于1时启动多个模拟的Ollama服务，由生成服务在它们之间分配请求；
+--stop-backend 在场景开始若干秒后停掉第一个模拟服务，用来检查自动切换后端：
+
+    python benchmark.py --renderer raster --backends 3 --routing latency --stop-backend 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from metrics import process_tree_rss
+
+ROOT = Path(__file__).resolve().parent
+SCENARIOS = ("single", "post", "concurrent")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """线性插值的分位数，q 取 0~100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4) if values else 0.0
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MemoryMonitor(threading.Thread):
+    """定期采样服务进程树的内存，记录每个场景中的峰值"""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        # 不能叫 _stop：threading.Thread.join() 内部会调用同名的方法
+        self._stop_event = threading.Event()
+        self.supported = Path(f"/proc/{pid}/status").exists()
+
+    def reset(self):
+        self.peak = process_tree_rss(self.pid) if self.supported else 0
+
+    def run(self):
+        while self.supported and not self._stop_event.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ServerProcess:
+    """在子进程中启动一个服务，等待健康检查地址可用"""
+
+    def __init__(self, name: str, command: list[str], ready_url: str, env: dict = None, log_path: Path = None):
+        self.name = name
+        self.command = command
+        self.ready_url = ready_url
+        self.env = env
+        self.log_path = log_path
+        self.process = None
+
+    def __enter__(self):
+        log = open(self.log_path, "w", encoding="utf-8") if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            self.command, cwd=ROOT, env={**os.environ, **(self.env or {})},
+            stdout=log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} 启动失败，退出码 {self.process.returncode}，日志: {self.log_path}")
+            try:
+                if httpx.get(self.ready_url, timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise TimeoutError(f"{self.name} 启动超时")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, endpoint: str, payload: dict,
+                       requests: int, concurrency: int, monitor: MemoryMonitor) -> dict:
+    """以给定并发发送 requests 个请求，统计延迟、吞吐量、内存峰值和各阶段耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+    stages: dict[str, list[float]] = {}
+    stage_rss: dict[str, float] = {}
+    extras: dict[str, list[float]] = {}
+    pages = 0
+
+    async def one(index: int):
+        nonlocal pages
+        async with semaphore:
+            body = {**payload, "topic": f"{payload['topic']} #{index}", "include_timings": True}
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=body)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                errors.append(str(e))
+                return
+            latencies.append(time.perf_counter() - started)
+            data = response.json()
+            pages += len(data.get("pages", [])) or 1
+            timings = data.get("timings", {})
+            for stage, entry in timings.get("stages", {}).items():
+                stages.setdefault(stage, []).append(entry["seconds"])
+                if "peak_rss_mb" in entry:
+                    stage_rss[stage] = max(stage_rss.get(stage, 0.0), entry["peak_rss_mb"])
+            for key in ("llm_ttft_seconds", "llm_tokens_per_second"):
+                if key in timings:
+                    extras.setdefault(key, []).append(timings[key])
+
+    monitor.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "latency_seconds": summarize(latencies),
+        "throughput": {
+            "requests_per_second": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            "pages_per_second": round(pages / elapsed, 3) if elapsed else 0.0
+        },
+        "peak_rss_mb": round(monitor.peak / 1024 / 1024, 1) if monitor.supported else None,
+        "stages": {
+            stage: {**summarize(values), **({"peak_rss_mb": stage_rss[stage]} if stage in stage_rss else {})}
+            for stage, values in sorted(stages.items())
+        },
+        **{key: summarize(values) for key, values in extras.items()}
+    }
+    if errors:
+        result["error_samples"] = errors[:5]
+    return result
+
+
+def print_report(results: dict, baseline: dict = None):
+    baseline_scenarios = (baseline or {}).get("scenarios", {})
+    first = results.get("first_request")
+    if first:
+        print(f"第一个请求  {first['latency_seconds']:.3f}s  首个token {first['llm_ttft_seconds'] or 0:.3f}s")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_seconds"]
+        line = (
+            f"{name:<11} p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+            f"{result['throughput']['requests_per_second']:.2f} req/s  "
+            f"{result['throughput']['pages_per_second']:.2f} 页/s  峰值内存 {result['peak_rss_mb']} MB"
+        )
+        old = baseline_scenarios.get(name)
+        if old and old["latency_seconds"]["p50"]:
+            change = (latency["p50"] / old["latency_seconds"]["p50"] - 1) * 100
+            line += f"  （p50 相比基线 {change:+.1f}%）"
+        print(line)
+        if "llm_ttft_seconds" in result:
+            ttft = result["llm_ttft_seconds"]
+            print(f"    {'首个token':<14} p50 {ttft['p50'] * 1000:8.1f}ms  p95 {ttft['p95'] * 1000:8.1f}ms")
+        for stage, summary in result["stages"].items():
+            line = f"    {stage:<16} p50 {summary['p50'] * 1000:8.1f}ms  p95 {summary['p95'] * 1000:8.1f}ms"
+            if "peak_rss_mb" in summary:
+                line += f"  峰值内存 {summary['peak_rss_mb']} MB"
+            print(line)
+    router = results.get("router")
+    if router and len(router["backends"]) > 1:
+        print(f"后端分配（{router['strategy']}，切换 {router['failovers']} 次）")
+        for backend in router["backends"]:
+            print(f"    {backend['url']:<24} 请求 {backend['requests']:4d}  失败 {backend['failures']:3d}  "
+                  f"{'可用' if backend['healthy'] else '不可用'}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args, base_url: str, monitor: MemoryMonitor, ollama_urls: list[str],
+                        on_scenarios_start=None) -> dict:
+    payload = {"topic": "周末宅家", "style": "轻松活泼"}
+    if args.renderer:
+        payload["renderer"] = args.renderer
+    if args.image_format:
+        payload["image_format"] = args.image_format
+
+    scenarios = {
+        "single": ("/generate", 1, args.requests),
+        "post": ("/generate/batch", 1, args.requests),
+        "concurrent": ("/generate/batch", args.concurrency, args.requests * args.concurrency),
+    }
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        # 预热：第一次请求会加载字体、编译模板、启动浏览器，不计入场景的结果，单独记录第一个请求的耗时
+        first_request = None
+        for index in range(args.warmup):
+            started = time.perf_counter()
+            response = await client.post("/generate/batch", json={**payload, "topic": "预热", "include_timings": True})
+            if index == 0 and response.status_code == 200:
+                timings = response.json().get("timings", {})
+                first_request = {
+                    "latency_seconds": round(time.perf_counter() - started, 4),
+                    "llm_ttft_seconds": timings.get("llm_ttft_seconds")
+                }
+        if on_scenarios_start is not None:
+            on_scenarios_start()
+        for name in args.scenarios:
+            endpoint, concurrency, requests = scenarios[name]
+            print(f"运行场景 {name}：{requests} 个请求，并发 {concurrency}")
+            results[name] = await run_scenario(client, name, endpoint, payload, requests, concurrency, monitor)
+        metrics_text = (await client.get("/metrics")).text
+        router = (await client.get("/pool/stats")).json()["llm"]["router"]
+        llm_stats = []
+        for url in ollama_urls:
+            try:
+                llm_stats.append({"url": url, **(await client.get(f"{url}/stats")).json()})
+            except httpx.HTTPError:
+                llm_stats.append({"url": url, "stopped": True})
+    return {"first_request": first_request, "scenarios": results, "llm": llm_stats, "router": router,
+            "metrics": metrics_text}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成服务的性能基准测试")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"要运行的场景，逗号分隔（{'/'.join(SCENARIOS)}）")
+    parser.add_argument("--requests", type=int, default=5, help="每个场景的请求数（并发场景为 请求数 x 并发数）")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发场景的并发数")
+    parser.add_argument("--warmup", type=int, default=1, help="预热请求数")
+    parser.add_argument("--renderer", choices=["browser", "raster"], help="渲染方式，默认使用服务配置")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], help="输出图片格式，默认使用服务配置")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="模拟模型的输出速度，0表示不限速")
+    parser.add_argument("--ttft", type=float, default=0.05, help="模拟模型返回第一个token前的等待时间（秒）")
+    parser.add_argument("--paragraphs", type=int, default=12, help="模拟文案的段落数")
+    parser.add_argument("--load-time", type=float, default=0, help="模拟模型未加载时的加载时间（秒）")
+    parser.add_argument("--prefill-rate", type=float, default=0,
+                        help="模拟模型每秒处理多少个提示词字符（与上一个提示词相同的前缀不计时间），0表示不计")
+    parser.add_argument("--timeout", type=float, default=300, help="单个请求的超时时间（秒）")
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"), help="结果保存路径（JSON）")
+    parser.add_argument("--baseline", type=Path, help="之前的结果文件，用于对比")
+    parser.add_argument("--backends", type=int, default=1, help="启动的模拟Ollama服务数")
+    parser.add_argument("--routing", choices=["least_outstanding", "latency"], help="后端路由策略，默认使用服务配置")
+    parser.add_argument("--stop-backend", type=float, metavar="SECONDS",
+                        help="场景开始这么多秒后停掉第一个模拟Ollama服务")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="传给生成服务的环境变量，可重复指定")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main():
+    args = parse_args()
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    ollama_ports, app_port = [free_port() for _ in range(max(1, args.backends))], free_port()
+    ollama_urls = [f"http://127.0.0.1:{port}" for port in ollama_ports]
+
+    with tempfile.TemporaryDirectory(prefix="xhs-bench-") as work_dir, ExitStack() as stack:
+        work_dir = Path(work_dir)
+        fake_ollamas = [
+            stack.enter_context(ServerProcess(
+                "fake_ollama",
+                [sys.executable, "fake_ollama.py", "--port", str(port),
+                 "--tokens-per-second", str(args.tokens_per_second), "--ttft", str(args.ttft),
+                 "--paragraphs", str(args.paragraphs),
+                 "--load-time", str(args.load_time), "--prefill-rate", str(args.prefill_rate)],
+                f"http://127.0.0.1:{port}/api/tags",
+                log_path=work_dir / f"fake_ollama_{index}.log"
+            ))
+            for index, port in enumerate(ollama_ports)
+        ]
+        server_env = {
+            "OLLAMA_BACKENDS": ",".join(ollama_urls),
+            "SAVE_DIR": str(work_dir / "generated_content"),
+            "STAGE_MEMORY": "1",  # 各阶段的耗时中附带内存峰值
+            **({"OLLAMA_ROUTING": args.routing} if args.routing else {}),
+            **dict(item.split("=", 1) for item in args.server_env)
+        }
+        app = stack.enter_context(ServerProcess(
+            "xiaohongshu_generator",
+            [sys.executable, "-m", "uvicorn", "xiaohongshu_generator:app",
+             "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+            f"http://127.0.0.1:{app_port}/pool/stats",
+            env=server_env,
+            log_path=work_dir / "server.log"
+        ))
+
+        def schedule_stop():
+            if args.stop_backend is not None:
+                timer = threading.Timer(args.stop_backend, fake_ollamas[0].process.terminate)
+                timer.daemon = True
+                timer.start()
+
+        monitor = MemoryMonitor(app.process.pid)
+        monitor.start()
+        try:
+            run = asyncio.run(run_benchmark(
+                args, f"http://127.0.0.1:{app_port}", monitor, ollama_urls, on_scenarios_start=schedule_stop
+            ))
+        finally:
+            monitor.stop()
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "renderer": args.renderer,
+            "image_format": args.image_format,
+            "tokens_per_second": args.tokens_per_second,
+            "ttft": args.ttft,
+            "paragraphs": args.paragraphs,
+            "load_time": args.load_time,
+            "prefill_rate": args.prefill_rate,
+            "backends": len(ollama_urls),
+            "routing": args.routing,
+            "stop_backend": args.stop_backend,
+            "server_env": args.server_env
+        },
+        **run
+    }
+    args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(results, baseline)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""clean_content 的微基准测试
+
+对比原来逐个 re.sub 的实现和 content_cleaner 的实现（整段清理与逐个token流式清理），
+输入是模拟 DeepSeek-R1 的输出：很长的 <think> 思考过程加上标题和正文。
+
+    python benchmark_clean.py --think-chars 20000 --repeat 200
+"""
+import argparse
+import re
+import time
+
+from content_cleaner import cleaner_for
+from fake_ollama import DEFAULT_PARAGRAPHS, DEFAULT_TITLE, split_tokens
+
+
+def legacy_clean_content(text: str) -> str:
+    """原来的实现，作为对照"""
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    text = re.sub(r'\[思考\].*?\[/思考\]', '', text, flags=re.DOTALL)
+    text = re.sub(r'【思考】.*?【/思考】', '', text, flags=re.DOTALL)
+    text = re.sub(r'（思考）.*?（/思考）', '', text, flags=re.DOTALL)
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return text.strip()
+
+
+def legacy_stream(tokens: list[str]) -> list[str]:
+    """原来 /generate/stream 的做法：每收到换行就重新清理目前为止的全部输出"""
+    raw_parts, lines, consumed = [], [], 0
+    for index, token in enumerate(tokens):
+        raw_parts.append(token)
+        final = index == len(tokens) - 1
+        if "\n" not in token and not final:
+            continue
+        raw_text = "".join(raw_parts)
+        if not final:
+            raw_text = raw_text[:raw_text.rfind("\n") + 1]
+            if "<think>" in raw_text and "</think>" not in raw_text:
+                continue
+        cleaned = [line for line in legacy_clean_content(raw_text).splitlines() if line.strip()]
+        lines.extend(cleaned[consumed:])
+        consumed = len(cleaned)
+    return lines
+
+
+def streaming(tokens: list[str], cleaner) -> list[str]:
+    """与 /generate/stream 相同的按行流式清理"""
+    stream, lines = cleaner.stream(), []
+    for token in tokens:
+        lines.extend(stream.lines(token))
+    lines.extend(stream.finish_lines())
+    return lines
+
+
+def sample_output(think_chars: int, paragraphs: int) -> str:
+    reasoning = "用户想要一篇小红书文案，我先想想结构和语气。\n" * (think_chars // 24 + 1)
+    body = "\n\n".join(f"  {DEFAULT_PARAGRAPHS[i % len(DEFAULT_PARAGRAPHS)]}  " for i in range(paragraphs))
+    return f"<think>\n{reasoning[:think_chars]}\n</think>\n\n{DEFAULT_TITLE}\n\n\n{body}\n<!-- 结束 -->\n"
+
+
+def measure(function, repeat: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clean_content 的微基准测试")
+    parser.add_argument("--think-chars", type=int, default=20000, help="思考过程的字数")
+    parser.add_argument("--paragraphs", type=int, default=30, help="正文段落数")
+    parser.add_argument("--repeat", type=int, default=200, help="整段清理的重复次数（流式为其十分之一）")
+    args = parser.parse_args()
+
+    text = sample_output(args.think_chars, args.paragraphs)
+    tokens = split_tokens(text)
+    cleaner = cleaner_for("deepseek-r1:1.5b")
+    if cleaner.clean(text) != legacy_clean_content(text):
+        raise SystemExit("两种实现的结果不一致")
+    if streaming(tokens, cleaner) != legacy_stream(tokens):
+        raise SystemExit("两种流式清理的结果不一致")
+
+    stream_repeat = max(1, args.repeat // 10)
+    results = [
+        ("整段清理（原实现）", measure(lambda: legacy_clean_content(text), args.repeat)),
+        ("整段清理（content_cleaner）", measure(lambda: cleaner.clean(text), args.repeat)),
+        ("流式清理（原实现）", measure(lambda: legacy_stream(tokens), stream_repeat)),
+        ("流式清理（StreamingCleaner）", measure(lambda: streaming(tokens, cleaner), stream_repeat)),
+    ]
+    print(f"输入 {len(text)} 字，{len(tokens)} 个token")
+    for (name, micros), baseline in zip(results, (None, results[0][1], None, results[2][1])):
+        line = f"{name:<24} {micros:12.1f} µs"
+        if baseline:
+            line += f"  （快 {baseline / micros:.1f} 倍）"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+logger = logging.getLogger(__name__)
+
+
+def create_chrome_driver() -> webdriver.Chrome:
+    """创建无头Chrome驱动"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--hide-scrollbars')
+    chrome_options.add_argument(f'--window-size=1200,1600')
+    chrome_options.add_argument('--disable-web-security')  # 添加此选项以允许跨域
+    return webdriver.Chrome(options=chrome_options)
+
+
+class PooledDriver:
+    """池中的驱动及其使用信息"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.renders = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """长期存活的无头Chrome驱动池
+
+    - 按需创建驱动，最多 size 个
+    - 取出时做健康检查，失效的驱动会被替换
+    - 每个驱动渲染 max_renders 次后回收重建
+    """
+
+    def __init__(self, size: int = 2, max_renders: int = 50, checkout_timeout: float = 60.0,
+                 driver_factory=create_chrome_driver):
+        self.size = max(1, size)
+        self.max_renders = max_renders
+        self.checkout_timeout = checkout_timeout
+        self.driver_factory = driver_factory
+
+        # 空闲驱动和驱动数量都由 _available 保护；归还或销毁驱动时唤醒等待的线程
+        self._idle: list[PooledDriver] = []  # 从末尾取出，优先复用最近使用过的驱动
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._total = 0  # 已创建（或正在创建）且未销毁的驱动数量
+        self._closed = False
+
+        self._stats = {
+            "created": 0,
+            "recycled": 0,
+            "replaced": 0,
+            "checkouts": 0,
+            "checkout_wait_seconds": 0.0,
+        }
+
+    def start(self, prewarm: int = 1):
+        """预热若干个驱动，避免第一个请求承担启动开销"""
+        for _ in range(min(prewarm, self.size)):
+            with self._available:
+                if self._closed or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.error(f"预热浏览器失败: {str(e)}")
+                return
+            self._put_idle(pooled)
+
+    def _create(self) -> PooledDriver:
+        """创建驱动，调用前已在 _total 中占好名额，失败时释放名额"""
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._available:
+                self._total -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+        logger.info("已启动新的浏览器实例")
+        return PooledDriver(driver)
+
+    def _destroy(self, pooled: PooledDriver):
+        with self._available:
+            self._total -= 1
+            # 空出了名额，等待中的线程可以创建新的驱动
+            self._available.notify()
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: {str(e)}")
+
+    def _put_idle(self, pooled: PooledDriver):
+        with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    @staticmethod
+    def _is_healthy(pooled: PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def acquire(self) -> PooledDriver:
+        """取出一个可用的驱动，必要时创建或等待"""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        while True:
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("浏览器池已关闭")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._total < self.size:
+                        # 先占好名额再在锁外创建，创建期间其他线程不会超出 size
+                        self._total += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("等待可用浏览器超时")
+                    self._available.wait(remaining)
+            if pooled is None:
+                pooled = self._create()
+
+            if not self._is_healthy(pooled):
+                logger.warning("检测到浏览器已失效，正在替换")
+                with self._lock:
+                    self._stats["replaced"] += 1
+                self._destroy(pooled)
+                continue
+
+            with self._lock:
+                self._stats["checkouts"] += 1
+                self._stats["checkout_wait_seconds"] += time.monotonic() - started
+            return pooled
+
+    def release(self, pooled: PooledDriver, broken: bool = False):
+        """归还驱动，失效或达到渲染上限的驱动会被销毁"""
+        pooled.renders += 1
+        if broken or self._closed:
+            if broken:
+                with self._lock:
+                    self._stats["replaced"] += 1
+            self._destroy(pooled)
+            return
+        if self.max_renders and pooled.renders >= self.max_renders:
+            with self._lock:
+                self._stats["recycled"] += 1
+            logger.info(f"浏览器已渲染 {pooled.renders} 次，回收重建")
+            self._destroy(pooled)
+            return
+        self._put_idle(pooled)
+
+    @contextmanager
+    def driver(self):
+        """以上下文管理器的方式借用驱动"""
+        pooled = self.acquire()
+        try:
+            yield pooled.driver
+        except Exception:
+            self.release(pooled, broken=not self._is_healthy(pooled))
+            raise
+        else:
+            self.release(pooled)
+
+    def stats(self) -> dict:
+        """返回浏览器池的运行统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            total = self._total
+            idle = len(self._idle)
+        stats.update({
+            "size": self.size,
+            "max_renders": self.max_renders,
+            "total": total,
+            "idle": idle,
+            "in_use": total - idle,
+        })
+        return stats
+
+    def close(self):
+        """关闭所有空闲驱动，借出中的驱动归还时关闭"""
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for pooled in idle:
+            self._destroy(pooled)
@@ -0,0 +1,203 @@
+import functools
+import re
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Block:
+    """模型输出中需要整段去掉的内容：从 start 到 end（包含两端标记）
+
+    drop_unclosed 为True时，没有结束标记的内容一直去掉到结尾（输出被截断在思考过程中）；
+    否则按普通文字原样保留，正文里偶尔出现的开始标记不会吞掉后面的内容。
+    """
+    start: str
+    end: str
+    drop_unclosed: bool = False
+
+
+# 所有模型都会去掉的内容：思考过程和HTML注释
+DEFAULT_BLOCKS = (
+    Block("<think>", "</think>", drop_unclosed=True),
+    Block("[思考]", "[/思考]"),
+    Block("【思考】", "【/思考】"),
+    Block("（思考）", "（/思考）"),
+    Block("<!--", "-->"),
+)
+# 按模型名前缀追加的标记，模型名不区分大小写
+MODEL_BLOCKS: dict[str, tuple[Block, ...]] = {
+    "openthinker": (Block("<|begin_of_thought|>", "<|end_of_thought|>", drop_unclosed=True),),
+    "marco-o1": (Block("<Thought>", "</Thought>", drop_unclosed=True),),
+}
+
+# 每行首尾的空白以及换行：一个换行保留为一个，连续的空行合并为一个空行
+_LINE_BREAK_PATTERN = re.compile(r"[^\S\n]*\n(?:\s*(\n))?[^\S\n]*")
+
+
+def normalize_lines(text: str) -> str:
+    """去掉每行首尾的空白，合并连续的空行，并去掉整体首尾的空白"""
+    return _LINE_BREAK_PATTERN.sub(r"\n\1", text).strip()
+
+
+def split_lines(text: str) -> list[str]:
+    """清理空白后按行拆分，去掉空行"""
+    return [line for line in normalize_lines(text).splitlines() if line]
+
+
+class ContentCleaner:
+    """去掉模型输出中的思考过程等内容
+
+    所有开始标记合成一个预编译的正则，对整段文本只扫描一遍；
+    结束标记用 str.find 查找。没有结束标记时按 Block.drop_unclosed 去掉到结尾或者保留原文。
+    """
+
+    def __init__(self, blocks: tuple[Block, ...] = DEFAULT_BLOCKS):
+        self.blocks = tuple(blocks)
+        self._blocks = {block.start: block for block in self.blocks}
+        # 较长的标记放在前面，避免被较短的前缀抢先匹配
+        starts = sorted(self._blocks, key=len, reverse=True)
+        self._start_pattern = re.compile("|".join(map(re.escape, starts)))
+        # 所有开始标记的真前缀，流式输入时这些结尾需要等下一段再判断
+        self._prefixes = {start[:size] for start in starts for size in range(1, len(start))}
+        self._max_prefix = max((len(prefix) for prefix in self._prefixes), default=0)
+
+    def strip_blocks(self, text: str) -> str:
+        """只去掉标记的内容，不处理空白"""
+        parts = []
+        position = 0
+        while True:
+            match = self._start_pattern.search(text, position)
+            if match is None:
+                parts.append(text[position:])
+                break
+            parts.append(text[position:match.start()])
+            block = self._blocks[match.group()]
+            close = text.find(block.end, match.end())
+            if close < 0:
+                if block.drop_unclosed:
+                    break
+                # 没有结束标记：开始标记按普通文字保留，从它后面继续查找
+                parts.append(match.group())
+                position = match.end()
+                continue
+            position = close + len(block.end)
+        return "".join(parts)
+
+    def clean(self, text: str) -> str:
+        """清理生成的内容：去掉标记的内容，去掉每行首尾的空白，合并多余的空行"""
+        return normalize_lines(self.strip_blocks(text))
+
+    def stream(self) -> "StreamingCleaner":
+        return StreamingCleaner(self)
+
+    def _partial_start(self, text: str) -> int:
+        """text 结尾可能是某个开始标记的前半部分时，返回这部分的长度"""
+        for size in range(min(self._max_prefix, len(text)), 0, -1):
+            if text[-size:] in self._prefixes:
+                return size
+        return 0
+
+
+class StreamingCleaner:
+    """边接收模型输出边去掉思考过程
+
+    feed() 返回已经确定不属于任何标记内容的文本，可能是某个标记开头的结尾部分会留到下一次；
+    输出结束后调用 finish() 取出剩余的文本。返回的文本没有处理空白，可以再交给 normalize_lines。
+    按行处理时改用 lines() 和 finish_lines()，只返回已经完整的行。
+    没有结束标记时需要保留原文的标记（drop_unclosed 为False），其内容在结束标记出现或输出结束前一直留在缓冲区。
+    """
+
+    def __init__(self, cleaner: ContentCleaner):
+        self.cleaner = cleaner
+        self._buffer = ""
+        self._block = None  # 正在跳过的标记
+        self._scanned = 0  # _buffer 中已经查找过结束标记的位置
+        self._line = ""  # lines() 已清理、但还没有换行的部分
+
+    @property
+    def in_block(self) -> bool:
+        return self._block is not None
+
+    def feed(self, chunk: str) -> str:
+        text = self._buffer + chunk
+        parts = []
+        position = 0
+        scan = self._scanned
+        while True:
+            if self._block is not None:
+                end = self._block.end
+                close = text.find(end, scan)
+                if close < 0:
+                    # 结束标记可能被拆开，下次从可能属于它的结尾开始查找
+                    resume = max(scan, len(text) - len(end) + 1)
+                    if self._block.drop_unclosed:
+                        position = resume
+                    # 否则从开始标记起全部保留：到结尾都没有结束标记时要原样输出
+                    self._scanned = resume - position
+                    break
+                position = close + len(end)
+                self._block = None
+            match = self.cleaner._start_pattern.search(text, position)
+            if match is None:
+                rest = text[position:]
+                keep = self.cleaner._partial_start(rest)
+                parts.append(rest[:len(rest) - keep])
+                position = len(text) - keep
+                self._scanned = 0
+                break
+            parts.append(text[position:match.start()])
+            self._block = self.cleaner._blocks[match.group()]
+            position = match.end() if self._block.drop_unclosed else match.start()
+            scan = match.end()
+        self._buffer = text[position:]
+        return "".join(parts)
+
+    def finish(self) -> str:
+        """结束输入：没有结束标记的内容按 Block.drop_unclosed 丢弃或者原样保留"""
+        block, rest = self._block, self._buffer
+        if block is not None:
+            # 与 ContentCleaner.strip_blocks 相同：开始标记保留，后面的内容继续清理
+            rest = "" if block.drop_unclosed else block.start + self.cleaner.strip_blocks(rest[len(block.start):])
+        self._buffer = ""
+        self._block = None
+        self._scanned = 0
+        return rest
+
+    def lines(self, chunk: str) -> list[str]:
+        """接收一段输出，返回新出现的完整的非空行（已清理空白）
+
+        只有清理后的文本中出现换行时才处理空白，逐个token输入时大部分调用直接返回。
+        """
+        cleaned = self.feed(chunk)
+        self._line += cleaned
+        if "\n" not in cleaned:
+            return []
+        cut = self._line.rfind("\n") + 1
+        text, self._line = self._line[:cut], self._line[cut:]
+        return split_lines(text)
+
+    def finish_lines(self) -> list[str]:
+        """结束输入，返回剩余的行"""
+        text, self._line = self._line + self.finish(), ""
+        return split_lines(text)
+
+
+def register_blocks(model_prefix: str, *blocks: Block):
+    """为某一类模型追加需要去掉的标记"""
+    key = model_prefix.lower()
+    MODEL_BLOCKS[key] = MODEL_BLOCKS.get(key, ()) + blocks
+    cleaner_for.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def cleaner_for(*models: str) -> ContentCleaner:
+    """按模型名返回清理器：默认标记加上模型名前缀匹配的标记
+
+    传入多个模型（多个后端使用不同模型）时合并所有匹配的标记。
+    """
+    names = [model.lower() for model in models]
+    extra = tuple(
+        block
+        for prefix, blocks in MODEL_BLOCKS.items() if any(name.startswith(prefix) for name in names)
+        for block in blocks
+    )
+    return ContentCleaner(DEFAULT_BLOCKS + extra)
@@ -0,0 +1,153 @@
+import logging
+import mimetypes
+import threading
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type("font/woff2", ".woff2")
+mimetypes.add_type("font/ttf", ".ttf")
+
+
+class DocumentServer:
+    """进程内的本地HTTP服务，把渲染好的HTML直接交给浏览器
+
+    文档只保存在内存中，不写入磁盘，也不需要之后清理；
+    /assets/ 下的字体和背景图从 asset_dir 读取，文件名带有内容哈希，允许浏览器长期缓存。
+    页面也可以把二进制数据（例如 canvas 导出的图片）POST 到 upload_slot 返回的地址，
+    避免经过WebDriver协议时的base64编码。
+    """
+
+    def __init__(self, asset_dir: Path, host: str = "127.0.0.1", port: int = 0):
+        self.asset_dir = Path(asset_dir)
+        self.host = host
+        self.port = port
+        self._documents: dict[str, bytes] = {}
+        self._uploads: dict[str, bytes | None] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._served = 0
+
+    @property
+    def base_url(self) -> str:
+        self.start()
+        return f"http://{self.host}:{self._server.server_port}/"
+
+    def start(self):
+        with self._lock:
+            if self._server is not None:
+                return
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+            self._server.daemon_threads = True
+            threading.Thread(
+                target=self._server.serve_forever, name="document-server", daemon=True
+            ).start()
+        logger.info(f"文档服务已启动: {self.base_url}")
+
+    def close(self):
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    @contextmanager
+    def publish(self, html: str):
+        """在 with 块内通过返回的URL提供文档，结束后从内存中移除"""
+        # 文档放在根路径下，模板中 assets/ 开头的相对URL正好指向资源目录
+        name = f"{uuid.uuid4().hex}.html"
+        with self._lock:
+            self._documents[name] = html.encode("utf-8")
+        try:
+            yield self.base_url + name
+        finally:
+            with self._lock:
+                self._documents.pop(name, None)
+
+    @contextmanager
+    def upload_slot(self):
+        """在 with 块内接收一次上传，返回 (相对URL, 读取函数)，读取函数返回上传的数据或None"""
+        name = f"uploads/{uuid.uuid4().hex}"
+        with self._lock:
+            self._uploads[name] = None
+        try:
+            yield "/" + name, lambda: self._uploads.get(name)
+        finally:
+            with self._lock:
+                self._uploads.pop(name, None)
+
+    def asset_url(self, name: str) -> str:
+        return f"{self.base_url}assets/{quote(name)}"
+
+    def _document(self, name: str) -> bytes | None:
+        with self._lock:
+            return self._documents.get(name)
+
+    def _asset(self, relative: str) -> Path | None:
+        path = (self.asset_dir / relative).resolve()
+        if not path.is_relative_to(self.asset_dir.resolve()) or not path.is_file():
+            return None
+        return path
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # 浏览器会对中文文件名做百分号编码
+                path = unquote(self.path.split("?", 1)[0]).lstrip("/")
+                if path.startswith("assets/"):
+                    asset = server._asset(path[len("assets/"):])
+                    if asset is None:
+                        self.send_error(404)
+                        return
+                    body = asset.read_bytes()
+                    content_type = mimetypes.guess_type(asset.name)[0] or "application/octet-stream"
+                    # 资源文件名带内容哈希，内容变化时URL也会变化
+                    cache_control = "no-cache" if asset.suffix == ".html" else "public, max-age=31536000, immutable"
+                else:
+                    body = server._document(path)
+                    if body is None:
+                        self.send_error(404)
+                        return
+                    content_type = "text/html; charset=utf-8"
+                    cache_control = "no-store"
+                server._served += 1
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", cache_control)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = unquote(self.path.split("?", 1)[0]).lstrip("/")
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    if path not in server._uploads:
+                        body = None
+                    else:
+                        server._uploads[path] = body
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents = len(self._documents)
+        return {
+            "running": self._server is not None,
+            "documents": documents,
+            "served": self._served
+        }
@@ -0,0 +1,177 @@
+"""模拟的Ollama服务，用于基准测试和离线调试
+
+按固定的速度流式返回预设的文案（NDJSON，与 /api/generate 的格式一致），
+不需要GPU、模型文件和网络。
+
+    python fake_ollama.py --port 11435 --tokens-per-second 50
+    OLLAMA_URL=http://localhost:11435 python xiaohongshu_generator.py
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from keep_alive import parse_keep_alive
+
+DEFAULT_MODEL = "deepseek-r1:1.5b"
+
+DEFAULT_TITLE = "周末在家也能过得很精致✨"
+DEFAULT_PARAGRAPHS = [
+    "最近发现周末宅在家里一点都不无聊，只要提前安排好，一天下来反而比出门还充实。",
+    "早上睡到自然醒，先给自己做一份简单的早餐，煎蛋、吐司再加一杯热牛奶，边吃边听喜欢的播客。",
+    "上午用来整理房间，把衣柜里不穿的衣服挑出来，桌面只留下常用的东西，整个人都清爽了很多。",
+    "中午试着做了一道新菜，照着视频一步一步来，虽然卖相一般，但是味道意外地不错。",
+    "下午泡一壶花茶，窝在沙发上看完了一直想看的那本书，阳光照进来的时候真的很治愈。",
+    "傍晚出门散散步，顺便去楼下的超市买点水果，回来的路上看到了特别好看的晚霞。",
+    "晚上敷个面膜，写写手账，把这一周的小确幸都记下来，睡前再做几分钟拉伸。",
+    "其实生活的仪式感不需要花很多钱，认真对待每一个小时，就会发现日子越来越有意思。",
+]
+
+
+def default_text(paragraphs: int = 8, think: bool = True) -> str:
+    """标题加若干段正文，段落不够时循环使用"""
+    body = [DEFAULT_PARAGRAPHS[i % len(DEFAULT_PARAGRAPHS)] for i in range(paragraphs)]
+    thinking = "<think>\n先想一下文案的结构：标题、分段描述、结尾总结。\n</think>\n\n" if think else ""
+    return thinking + DEFAULT_TITLE + "\n\n" + "\n\n".join(body)
+
+
+def split_tokens(text: str, chars_per_token: int = 2) -> list[str]:
+    """按固定字符数把文本切成“token”，近似中文模型的输出粒度"""
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def common_prefix(a: str, b: str) -> int:
+    size = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        size += 1
+    return size
+
+
+def create_app(text: str = None, tokens_per_second: float = 50, ttft: float = 0.1,
+               model: str = DEFAULT_MODEL, load_time: float = 0,
+               prefill_chars_per_second: float = 0) -> FastAPI:
+    """创建模拟服务
+
+    tokens_per_second 为0时不等待，尽快输出；ttft 为返回第一个token前的固定等待时间（秒）。
+    load_time 模拟模型未加载（或 keep_alive 到期已卸载）时的加载时间；
+    prefill_chars_per_second 模拟处理提示词的速度，与上一个提示词相同的前缀视为已缓存，不计时间。
+    """
+    app = FastAPI()
+    tokens = split_tokens(text if text is not None else default_text())
+    stats = {"requests": 0, "tokens": 0, "loads": 0, "prefill_chars": 0, "cached_chars": 0}
+    state = {"loaded_until": None, "last_prompt": ""}  # loaded_until: 模型卸载的时间，inf 表示一直保持
+    load_lock = asyncio.Lock()
+
+    async def prepare(prompt: str, seconds: float | None) -> float:
+        """模拟加载模型和处理提示词，返回加载耗时"""
+        started = time.monotonic()
+        async with load_lock:  # 同时到达的请求等待同一次加载
+            if state["loaded_until"] is None or time.monotonic() >= state["loaded_until"]:
+                stats["loads"] += 1
+                state["last_prompt"] = ""  # 重新加载后缓存为空
+                await asyncio.sleep(load_time)
+                state["loaded_until"] = float("inf")
+        load_duration = time.monotonic() - started
+        state["loaded_until"] = float("inf") if seconds is None else time.monotonic() + seconds
+        if seconds == 0:
+            state["loaded_until"] = None
+        cached = common_prefix(prompt, state["last_prompt"])
+        state["last_prompt"] = prompt
+        stats["cached_chars"] += cached
+        stats["prefill_chars"] += len(prompt) - cached
+        if prefill_chars_per_second > 0:
+            await asyncio.sleep((len(prompt) - cached) / prefill_chars_per_second)
+        return load_duration
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        delay = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        prompt = payload.get("prompt", "")
+        limit = (payload.get("options") or {}).get("num_predict")
+        try:
+            keep_alive = parse_keep_alive(payload.get("keep_alive", "5m"))
+        except ValueError as e:
+            # 与Ollama一样，keep_alive 格式不对时直接返回400
+            return JSONResponse({"error": str(e)}, status_code=400)
+        output = tokens[:limit] if limit is not None and limit >= 0 else tokens
+
+        async def stream():
+            started = time.perf_counter()
+            load_duration = await prepare(prompt, keep_alive)
+            if not prompt:
+                # 空提示词只加载模型
+                yield json.dumps({"model": model, "response": "", "done": True, "done_reason": "load",
+                                  "load_duration": int(load_duration * 1e9)}) + "\n"
+                return
+            await asyncio.sleep(ttft)
+            eval_started = time.perf_counter()
+            for token in output:
+                yield json.dumps({"model": model, "response": token, "done": False}, ensure_ascii=False) + "\n"
+                stats["tokens"] += 1
+                if delay:
+                    await asyncio.sleep(delay)
+            now = time.perf_counter()
+            yield json.dumps({
+                "model": model,
+                "response": "",
+                "done": True,
+                "total_duration": int((now - started) * 1e9),
+                "load_duration": int(load_duration * 1e9),
+                "eval_count": len(output),
+                "eval_duration": int((now - eval_started) * 1e9)
+            }) + "\n"
+
+        if payload.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        parts = [json.loads(line) async for line in stream()]
+        return {**parts[-1], "response": "".join(part["response"] for part in parts)}
+
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="模拟的Ollama服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="/api/tags 中返回的模型名")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="输出速度，0表示不限速")
+    parser.add_argument("--ttft", type=float, default=0.1, help="返回第一个token前的等待时间（秒）")
+    parser.add_argument("--load-time", type=float, default=0, help="模型未加载时的加载时间（秒）")
+    parser.add_argument("--prefill-rate", type=float, default=0,
+                        help="每秒处理多少个提示词字符，0表示不计时间；与上一个提示词相同的前缀不计时间")
+    parser.add_argument("--paragraphs", type=int, default=8, help="默认文案的段落数")
+    parser.add_argument("--no-think", action="store_true", help="默认文案不带<think>思考内容")
+    parser.add_argument("--text-file", help="使用文件中的文案代替默认文案")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as file:
+            text = file.read()
+    else:
+        text = default_text(args.paragraphs, think=not args.no_think)
+    uvicorn.run(
+        create_app(text, args.tokens_per_second, args.ttft, args.model, args.load_time, args.prefill_rate),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
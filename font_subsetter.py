@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from layout_engine import strip_markup
+
+logger = logging.getLogger(__name__)
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # 没有安装 fontTools 时直接使用完整字体
+    ft_subset = None
+
+try:
+    import brotli  # noqa: F401  WOFF2 压缩需要
+    WOFF2_AVAILABLE = True
+except ImportError:
+    WOFF2_AVAILABLE = False
+
+
+class FontSubsetter:
+    """按帖子实际用到的字符生成字体子集
+
+    一篇帖子通常只用到几百个汉字，完整的中文字体却有 1.4~4MB，浏览器每次渲染都要解析。
+    子集以 字体文件名 + 字符集合 的哈希命名缓存在 directory 中，相同字符集只生成一次；
+    安装了 brotli 时输出 WOFF2，否则输出 TTF 子集。
+    """
+
+    def __init__(self, directory: Path, url_prefix: str = "assets/subsets/", max_files: int = 500):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self.max_files = max_files
+        self.flavor = "woff2" if WOFF2_AVAILABLE else None
+        self.suffix = ".woff2" if self.flavor else ".ttf"
+        self.css_format = "woff2" if self.flavor else "truetype"
+        self._lock = threading.Lock()
+        self._building: dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def available(self) -> bool:
+        return ft_subset is not None
+
+    @staticmethod
+    def glyph_set(*texts: str) -> str:
+        """文本（可以带HTML标签）中实际显示的字符，排序去重"""
+        chars = set(" ")
+        for text in texts:
+            chars.update(strip_markup(text or ""))
+        chars.discard("\n")
+        return "".join(sorted(chars))
+
+    def make_key(self, font_path: Path, chars: str) -> str:
+        # 暂存后的字体文件名里已经带有内容哈希，字体更新后键自然改变
+        payload = f"{Path(font_path).name}\0{chars}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    def subset(self, font_path: Path, *texts: str) -> Path:
+        """返回只包含 texts 中字符的字体子集路径"""
+        font_path = Path(font_path)
+        chars = self.glyph_set(*texts)
+        key = self.make_key(font_path, chars)
+        path = self.directory / f"{font_path.stem.rsplit('.', 1)[0]}.{key}{self.suffix}"
+
+        # 同一个子集只由一个线程生成，其他线程等待后直接使用
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        try:
+            with building:
+                if path.exists():
+                    self._hits += 1
+                    os.utime(path)  # 刷新修改时间，用于按最近使用淘汰
+                    return path
+                self._misses += 1
+                self._build(font_path, chars, path)
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+        self.evict()
+        return path
+
+    def _build(self, font_path: Path, chars: str, path: Path):
+        options = ft_subset.Options()
+        options.flavor = self.flavor
+        options.layout_features = ["*"]  # 保留字距、竖排等排版特性
+        options.name_IDs = ["*"]
+        options.notdef_outline = True
+        options.hinting = False  # 截图时不需要hinting
+        options.desubroutinize = True
+
+        font = TTFont(str(font_path))
+        subsetter = ft_subset.Subsetter(options)
+        subsetter.populate(text=chars)
+        subsetter.subset(font)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        ft_subset.save_font(font, str(tmp_path), options)
+        font.close()
+        os.replace(tmp_path, path)
+        logger.info(f"已生成字体子集: {path.name}（{len(chars)} 个字符，{path.stat().st_size // 1024}KB）")
+
+    def evict(self) -> int:
+        """子集文件超过 max_files 个时删除最久未使用的"""
+        files = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        removed = 0
+        for _, path in sorted(files)[:max(0, len(files) - self.max_files)]:
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def url(self, path: Path) -> str:
+        """模板中引用子集的URL（相对于HTML文件）"""
+        return self.url_prefix + Path(path).name
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.available,
+            "format": self.css_format,
+            "files": len(list(self.directory.glob(f"*{self.suffix}"))) if self.directory.exists() else 0,
+            "hits": self._hits,
+            "misses": self._misses
+        }
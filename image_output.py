@@ -0,0 +1,178 @@
+import io
+import logging
+import time
+from dataclasses import dataclass
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 格式名 -> (Pillow格式, 扩展名, MIME类型)
+FORMATS = {
+    "png": ("PNG", ".png", "image/png"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+}
+MIN_QUALITY = 10  # 按目标大小搜索质量时的下限
+
+
+@dataclass(frozen=True)
+class OutputOptions:
+    """输出图片的格式、质量、缩放倍数和目标大小
+
+    target_bytes 只对有损格式（webp、jpeg）生效：在 MIN_QUALITY 到 quality 之间
+    二分查找不超过目标大小的最高质量。
+    """
+    format: str = "png"
+    quality: int = 90
+    scale: float = 2
+    target_bytes: int | None = None
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][1]
+
+    @property
+    def mime_type(self) -> str:
+        return FORMATS[self.format][2]
+
+    @property
+    def lossy(self) -> bool:
+        return self.format != "png"
+
+    @property
+    def capture_format(self) -> str:
+        """让浏览器直接输出的格式：需要按目标大小搜索质量时先取无损PNG，再由服务端编码"""
+        return "png" if self.lossy and self.target_bytes else self.format
+
+
+@dataclass
+class EncodedImage:
+    """编码后的图片以及编码耗时，over_target 表示没能压缩到目标大小以内"""
+    data: bytes
+    format: str
+    width: int
+    height: int
+    quality: int | None
+    encode_ms: float
+    over_target: bool = False
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def info(self) -> dict:
+        return {
+            "format": self.format,
+            "width": self.width,
+            "height": self.height,
+            "quality": self.quality,
+            "bytes": self.size,
+            "encode_ms": round(self.encode_ms, 1),
+            "over_target": self.over_target
+        }
+
+
+def _over_target(data: bytes, options: OutputOptions) -> bool:
+    return bool(options.target_bytes) and len(data) > options.target_bytes
+
+
+def _save(image: Image.Image, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG", compress_level=1)  # 优先速度，体积交给有损格式
+    elif image_format == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def encode_image(image: Image.Image, options: OutputOptions, source_scale: float | None = None) -> EncodedImage:
+    """按输出选项编码图片
+
+    source_scale 是 image 本身的缩放倍数，与 options.scale 不同时先缩放。
+    """
+    started = time.perf_counter()
+    if source_scale and abs(source_scale - options.scale) > 1e-6:
+        size = (round(image.width * options.scale / source_scale), round(image.height * options.scale / source_scale))
+        image = image.resize(size, Image.LANCZOS)
+    if options.format == "jpeg" and image.mode != "RGB":
+        # JPEG没有透明通道，圆角外的透明区域填成白色
+        canvas = Image.new("RGB", image.size, "white")
+        canvas.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = canvas
+
+    quality = options.quality if options.lossy else None
+    data = _save(image, options.format, quality)
+    if options.lossy and options.target_bytes and len(data) > options.target_bytes:
+        data, quality = _search_quality(image, options, data)
+    elif options.target_bytes and len(data) > options.target_bytes:
+        logger.warning(f"PNG为无损格式，无法压缩到目标大小: {len(data)} > {options.target_bytes}")
+
+    return EncodedImage(
+        data=data,
+        format=options.format,
+        width=image.width,
+        height=image.height,
+        quality=quality,
+        encode_ms=(time.perf_counter() - started) * 1000,
+        over_target=_over_target(data, options)
+    )
+
+
+def _search_quality(image: Image.Image, options: OutputOptions, data: bytes) -> tuple[bytes, int]:
+    """二分查找不超过目标大小的最高质量，都超出时返回尝试过的最低质量的结果
+
+    data 是按 options.quality 编码的结果；options.quality 不高于 MIN_QUALITY 时不再搜索，原样返回。
+    """
+    low, high = MIN_QUALITY, options.quality - 1
+    best = None
+    smallest = (data, options.quality)
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _save(image, options.format, quality)
+        if len(candidate) <= options.target_bytes:
+            best = (candidate, quality)
+            low = quality + 1
+        else:
+            smallest = (candidate, quality)
+            high = quality - 1
+    if best is None:
+        logger.warning(
+            f"质量 {smallest[1]} 仍超出目标大小: {len(smallest[0])} > {options.target_bytes}"
+        )
+        return smallest
+    return best
+
+
+def resize_capture(data: bytes, width: int, height: int) -> bytes:
+    """把浏览器截图缩放到指定的像素尺寸，尺寸已经相同时原样返回"""
+    image = Image.open(io.BytesIO(data))
+    if abs(image.width - width) <= 1 and abs(image.height - height) <= 1:
+        return data
+    return _save(image.resize((width, height), Image.LANCZOS), "png", None)
+
+
+def finish_capture(data: bytes, options: OutputOptions, capture_ms: float = 0) -> EncodedImage:
+    """处理浏览器返回的图片数据
+
+    格式已经符合要求且不需要按目标大小调整时直接使用，不再解码和重新编码；
+    否则（例如驱动只能返回PNG）由服务端重新编码。
+    """
+    image = Image.open(io.BytesIO(data))  # 只读取文件头
+    actual_format = image.format.lower()
+    within_target = not (options.lossy and options.target_bytes and len(data) > options.target_bytes)
+    if actual_format == options.format and within_target:
+        return EncodedImage(
+            data=data,
+            format=options.format,
+            width=image.width,
+            height=image.height,
+            quality=options.quality if options.lossy else None,
+            encode_ms=capture_ms,
+            over_target=_over_target(data, options)
+        )
+    encoded = encode_image(image, options)
+    encoded.encode_ms += capture_ms
+    return encoded
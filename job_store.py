@@ -0,0 +1,261 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 页面渲染状态
+PAGE_PENDING = "pending"
+PAGE_DONE = "done"
+PAGE_FAILED = "failed"
+
+
+class JobStore(ABC):
+    """生成任务存储的接口
+
+    每个任务以 request_id 为键，记录标题、分好页的内容以及每一页的渲染状态，
+    服务重启或崩溃后客户端可以凭 request_id 继续渲染剩余页面，而不必重新调用模型。
+    """
+
+    def __init__(self, default_ttl: float = 24 * 3600):
+        self.default_ttl = default_ttl
+
+    @abstractmethod
+    def save_job(self, request_id: str, title: str, content_pages: list[str],
+                 topic: str = "", style: str = "", ttl: float = None, complete: bool = True):
+        """创建或更新任务，保留已有的页面状态
+
+        complete 为False表示内容还没有生成完（流式生成中途保存），这样的任务不能当作完成的文章继续渲染。
+        """
+
+    @abstractmethod
+    def get_job(self, request_id: str) -> dict | None:
+        """读取任务，不存在或已过期时返回None"""
+
+    @abstractmethod
+    def set_page_status(self, request_id: str, page_index: int, status: str, image_path: str = None,
+                        output: dict = None):
+        """更新某一页的渲染状态，output 为图片的输出信息（格式、大小、编码耗时等）
+
+        任务不存在（例如渲染完成前已被清理）时忽略。
+        """
+
+    @abstractmethod
+    def delete_job(self, request_id: str):
+        """删除任务及其页面状态"""
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        """删除所有过期任务，返回删除的数量"""
+
+    def _expires_at(self, ttl: float = None) -> float:
+        return time.time() + (ttl if ttl is not None else self.default_ttl)
+
+
+class MemoryJobStore(JobStore):
+    """进程内的任务存储，重启后丢失，仅用于单进程调试"""
+
+    def __init__(self, default_ttl: float = 24 * 3600):
+        super().__init__(default_ttl)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save_job(self, request_id, title, content_pages, topic="", style="", ttl=None, complete=True):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.setdefault(request_id, {
+                "request_id": request_id,
+                "created_at": now,
+                "pages": {}
+            })
+            job.update({
+                "topic": topic,
+                "style": style,
+                "title": title,
+                "content_pages": list(content_pages),
+                "total_pages": len(content_pages),
+                "complete": complete,
+                "updated_at": now,
+                "expires_at": self._expires_at(ttl)
+            })
+
+    def get_job(self, request_id):
+        with self._lock:
+            job = self._jobs.get(request_id)
+            if job is None or "title" not in job or job["expires_at"] < time.time():
+                return None
+            return {**job, "pages": dict(job["pages"])}
+
+    def set_page_status(self, request_id, page_index, status, image_path=None, output=None):
+        with self._lock:
+            job = self._jobs.get(request_id)
+            if job is None:
+                return
+            job["pages"][int(page_index)] = {"status": status, "image_path": image_path, "output": output}
+
+    def delete_job(self, request_id):
+        with self._lock:
+            self._jobs.pop(request_id, None)
+
+    def evict_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, job in self._jobs.items() if job["expires_at"] < now]
+            for key in expired:
+                del self._jobs[key]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """基于SQLite的任务存储（默认）
+
+    数据保存在文件中，服务重启后仍然可用；开启WAL后多个服务进程可以共享同一个文件。
+    """
+
+    def __init__(self, path: Path, default_ttl: float = 24 * 3600):
+        super().__init__(default_ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    request_id TEXT PRIMARY KEY,
+                    topic TEXT NOT NULL DEFAULT '',
+                    style TEXT NOT NULL DEFAULT '',
+                    title TEXT NOT NULL,
+                    content_pages TEXT NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 1,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+                CREATE TABLE IF NOT EXISTS pages (
+                    request_id TEXT NOT NULL,
+                    page_index INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    image_path TEXT,
+                    output TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (request_id, page_index)
+                );
+            """)
+            # 旧版本创建的表没有 output 和 complete 列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(pages)")}
+            if "output" not in columns:
+                conn.execute("ALTER TABLE pages ADD COLUMN output TEXT")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "complete" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+
+    @contextmanager
+    def _connect(self):
+        """打开一个连接并在一个事务中执行，结束后关闭
+
+        每次操作使用独立连接，线程池和多个进程都可以安全访问。
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_job(self, request_id, title, content_pages, topic="", style="", ttl=None, complete=True):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO jobs (request_id, topic, style, title, content_pages, complete,
+                                  created_at, updated_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (request_id) DO UPDATE SET
+                    topic = excluded.topic,
+                    style = excluded.style,
+                    title = excluded.title,
+                    content_pages = excluded.content_pages,
+                    complete = excluded.complete,
+                    updated_at = excluded.updated_at,
+                    expires_at = excluded.expires_at
+            """, (request_id, topic, style, title, json.dumps(content_pages, ensure_ascii=False),
+                  int(complete), now, now, self._expires_at(ttl)))
+
+    def get_job(self, request_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE request_id = ? AND expires_at >= ?",
+                (request_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            page_rows = conn.execute(
+                "SELECT page_index, status, image_path, output FROM pages WHERE request_id = ?",
+                (request_id,)
+            ).fetchall()
+        content_pages = json.loads(row["content_pages"])
+        return {
+            "request_id": row["request_id"],
+            "topic": row["topic"],
+            "style": row["style"],
+            "title": row["title"],
+            "content_pages": content_pages,
+            "total_pages": len(content_pages),
+            "complete": bool(row["complete"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+            "pages": {
+                page["page_index"]: {
+                    "status": page["status"],
+                    "image_path": page["image_path"],
+                    "output": json.loads(page["output"]) if page["output"] else None
+                }
+                for page in page_rows
+            }
+        }
+
+    def set_page_status(self, request_id, page_index, status, image_path=None, output=None):
+        with self._connect() as conn:
+            # 只在任务还存在时写入，渲染完成前任务被清理时不会留下孤立的页面
+            conn.execute("""
+                INSERT INTO pages (request_id, page_index, status, image_path, output, updated_at)
+                SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM jobs WHERE request_id = ?)
+                ON CONFLICT (request_id, page_index) DO UPDATE SET
+                    status = excluded.status,
+                    image_path = excluded.image_path,
+                    output = excluded.output,
+                    updated_at = excluded.updated_at
+            """, (request_id, int(page_index), status, image_path,
+                  json.dumps(output) if output else None, time.time(), request_id))
+
+    def delete_job(self, request_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE request_id = ?", (request_id,))
+            conn.execute("DELETE FROM jobs WHERE request_id = ?", (request_id,))
+
+    def evict_expired(self):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+            # 同时清理没有对应任务的页面（包括旧版本遗留的）
+            conn.execute("DELETE FROM pages WHERE request_id NOT IN (SELECT request_id FROM jobs)")
+            return cursor.rowcount
+
+
+def create_job_store(url: str, default_ttl: float = 24 * 3600) -> JobStore:
+    """根据配置创建任务存储
+
+    - memory: 进程内存储
+    - sqlite:///path/to/jobs.db: SQLite文件存储
+    """
+    if url == "memory":
+        return MemoryJobStore(default_ttl)
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(Path(url[len("sqlite:///"):]), default_ttl)
+    raise ValueError(f"不支持的任务存储: {url}")
@@ -0,0 +1,42 @@
+"""Ollama 的 keep_alive 取值
+
+Ollama 接受数字（秒）或 Go 的时长字符串（time.ParseDuration 的格式，例如 "30m"、"1h30m"、"5m0s"、"250ms"），
+负数表示模型一直保持加载。这里统一换算成秒，发送给 Ollama 时再转换回它能接受的格式。
+"""
+import re
+
+_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "μs": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+_NUMBER = r"(?:\d+(?:\.\d*)?|\.\d+)"
+_PART = re.compile(rf"({_NUMBER})(ns|us|µs|μs|ms|s|m|h)")
+_DURATION = re.compile(rf"[+-]?(?:{_NUMBER}(?:ns|us|µs|μs|ms|s|m|h))+")
+_SECONDS = re.compile(rf"[+-]?{_NUMBER}")
+
+
+def parse_keep_alive(value) -> float | None:
+    """换算成秒，负数（一直保持）返回None，格式不对时抛出 ValueError
+
+    支持数字或纯数字的字符串（秒）以及 Go 的时长字符串："1h30m"、"5m0s"、"-1m"、"500ms"。
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"无效的 keep_alive: {value!r}")
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        if _SECONDS.fullmatch(text):
+            seconds = float(text)
+        elif _DURATION.fullmatch(text):
+            seconds = sum(float(number) * _UNITS[unit] for number, unit in _PART.findall(text))
+            if text.startswith("-"):
+                seconds = -seconds
+        else:
+            raise ValueError(f"无效的 keep_alive: {value!r}，应为秒数或 \"30m\"、\"1h30m\" 这样的时长")
+    return None if seconds < 0 else seconds
+
+
+def format_keep_alive(seconds: float | None):
+    """转换为发送给 Ollama 的取值：一直保持时为 -1，否则为 "<秒数>s" """
+    if seconds is None:
+        return -1
+    text = f"{seconds:.3f}".rstrip("0").rstrip(".")
+    return f"{text}s"
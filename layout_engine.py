@@ -0,0 +1,369 @@
+import functools
+import html
+import logging
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+try:
+    from fontTools.ttLib import TTFont
+except ImportError:  # fontTools 是可选依赖，缺失时使用估算的字宽
+    TTFont = None
+
+# 字体中没有的字符的默认宽度（单位：em）
+EMOJI_ADVANCE = 1.25  # 浏览器回退到彩色emoji字体时的大致宽度
+CJK_ADVANCE = 1.0
+DEFAULT_ADVANCE = 0.55
+
+# 不能出现在行首的字符（避头）
+NO_LINE_START = set(
+    "，。、；：！？）」』】》〉〕”’…—～·%‰"
+    ",.;:!?)]}>"
+    "ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶー々"
+)
+# 不能出现在行尾的字符（避尾）
+NO_LINE_END = set("（「『【《〈〔“‘([{<￥$")
+# 不占宽度、必须跟随前一个字符的字符（变体选择符、零宽连接符、肤色修饰等）
+ZERO_WIDTH = set("​‌‍︎️")
+
+# 拆分成排版单元：连续空白、西文单词或单个字符，并按避头尾规则带上前后不可分开的标点
+_UNIT_PATTERN = re.compile(
+    r"\s+"
+    r"|[%(no_end)s]*(?:[A-Za-z0-9\u00c0-\u024f'’\-_@#%%&+=/.]+|\S)(?:[%(no_start)s]|\u200d\S)*"
+    r"|\S" % {
+        "no_end": re.escape("".join(NO_LINE_END)),
+        "no_start": re.escape("".join(NO_LINE_START | ZERO_WIDTH) + "".join(map(chr, range(0x1F3FB, 0x1F400)))),
+    }
+)
+# 标记：HTML标签、实体或普通文本
+_MARKUP_PATTERN = re.compile(r"(<[^>]*>)|(&#?\w+;)|([^<&]+|[<&])")
+_TAG_PATTERN = re.compile(r"<[^>]*>")
+_OPEN_TAG_PATTERN = re.compile(r"<([A-Za-z][\w-]*)[^>]*?(?<!/)>")
+_CLOSE_TAG_PATTERN = re.compile(r"</([A-Za-z][\w-]*)\s*>")
+
+
+def strip_markup(text: str) -> str:
+    """去掉HTML标签并还原实体，得到实际显示的文字"""
+    return html.unescape(_TAG_PATTERN.sub("", text))
+
+
+def is_emoji(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x1F000 <= code <= 0x1FAFF
+        or 0x2600 <= code <= 0x27BF
+        or 0x2B00 <= code <= 0x2BFF
+        or 0x1F1E6 <= code <= 0x1F1FF
+    )
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x3000 <= code <= 0x9FFF
+        or 0xF900 <= code <= 0xFAFF
+        or 0xFF00 <= code <= 0xFFEF
+        or 0x20000 <= code <= 0x2FA1F
+    )
+
+
+def _fallback_advance(char: str) -> float:
+    if char in ZERO_WIDTH:
+        return 0.0
+    if is_emoji(char):
+        return EMOJI_ADVANCE
+    if _is_cjk(char):
+        return CJK_ADVANCE
+    return DEFAULT_ADVANCE
+
+
+class FontMetrics:
+    """从TTF文件读取的字形宽度表（单位：em），只加载一次"""
+
+    MAX_CACHED_WIDTHS = 200000
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.widths = {}
+        self.line_height = 1.2  # CSS中 line-height: normal 对应的倍数
+        if path is None:
+            return
+        if TTFont is None:
+            logger.warning("未安装fontTools，排版将使用估算的字宽")
+            return
+        if not Path(path).exists():
+            logger.warning(f"找不到字体文件: {path}，排版将使用估算的字宽")
+            return
+
+        font = TTFont(path, lazy=True)
+        units_per_em = font["head"].unitsPerEm
+        metrics = font["hmtx"].metrics
+        self.widths = {
+            chr(code): metrics[glyph][0] / units_per_em
+            for code, glyph in font.getBestCmap().items()
+        }
+        hhea = font["hhea"]
+        self.line_height = (hhea.ascent - hhea.descent + hhea.lineGap) / units_per_em
+        font.close()
+
+    def advance(self, char: str) -> float:
+        width = self.widths.get(char)
+        if width is None:
+            width = self.widths[char] = _fallback_advance(char)
+        return width
+
+    def measure(self, text: str) -> float:
+        """文字宽度（单位：em），连续空白按一个空格计算"""
+        width = self.widths.get(text)
+        if width is not None:
+            return width
+        if text.isspace():
+            return self.advance(" ")
+        width = sum(map(self.advance, text))
+        if len(self.widths) < self.MAX_CACHED_WIDTHS:
+            self.widths[text] = width  # 同时缓存多字符单元（单词、带标点的字）的宽度
+        return width
+
+
+@functools.lru_cache(maxsize=None)
+def load_font_metrics(path: str | None) -> FontMetrics:
+    """按路径缓存字体宽度表"""
+    return FontMetrics(Path(path) if path else None)
+
+
+def break_lines(text: str, font: FontMetrics, font_size: float, max_width: float) -> list[tuple[int, int]]:
+    """按CJK规则断行，返回每一行在 text 中的起止位置
+
+    text 为纯文字（不含标记），连续空白按HTML规则视为一个空格，行尾空格不计宽度。
+    先算出每个排版单元的累计宽度，再用二分查找每一行能放下的最后一个单元。
+    """
+    units = _UNIT_PATTERN.findall(text)
+    if not units:
+        return [(0, 0)]
+    max_em = max_width / font_size + 1e-6
+    get = font.widths.get
+    measure = font.measure
+    edges = [0.0, *accumulate(get(unit) or measure(unit) for unit in units)]
+    offsets = [0, *accumulate(map(len, units))]
+
+    lines = []
+    count = len(units)
+    start = 0
+    while start < count:
+        if units[start].isspace():
+            start += 1  # 行首空白不显示
+            continue
+        end = bisect_right(edges, edges[start] + max_em, start + 1) - 1
+        if end < count and units[end].isspace():
+            end += 1  # 行尾空白悬挂在行外
+        if end <= start:
+            # 单个单元比整行还宽（超长的西文单词），按字符强制断开
+            end = start + 1
+            position = offsets[start]
+            for piece in _force_break(units[start], font, max_em):
+                lines.append((position, position + len(piece)))
+                position += len(piece)
+            start = end
+            continue
+        lines.append((offsets[start], offsets[end]))
+        start = end
+    return lines or [(0, 0)]
+
+
+def _force_break(unit: str, font: FontMetrics, max_em: float) -> list[str]:
+    pieces = []
+    piece = ""
+    width = 0.0
+    for char in unit:
+        advance = font.advance(char)
+        if piece and width + advance > max_em:
+            pieces.append(piece)
+            piece, width = "", 0.0
+        piece += char
+        width += advance
+    pieces.append(piece)
+    return pieces
+
+
+def split_markup(markup: str, offset: int) -> tuple[str, str]:
+    """在显示文字的第 offset 个字符处拆分带标记的文本
+
+    拆分点落在标签内部时，前半部分补上闭合标签，后半部分重新打开同样的标签。
+    """
+    visible = 0
+    open_tags = []
+    for match in _MARKUP_PATTERN.finditer(markup):
+        tag, entity, text = match.groups()
+        if tag:
+            if _CLOSE_TAG_PATTERN.fullmatch(tag):
+                if open_tags:
+                    open_tags.pop()
+            elif _OPEN_TAG_PATTERN.fullmatch(tag):
+                open_tags.append(tag)
+            continue
+        length = 1 if entity else len(text)
+        if visible + length > offset:
+            cut = match.start() if entity else match.start() + (offset - visible)
+            break
+        visible += length
+    else:
+        return markup, ""
+
+    head = markup[:cut].rstrip()
+    tail = markup[cut:].lstrip()
+    closing = "".join(f"</{_OPEN_TAG_PATTERN.match(tag).group(1)}>" for tag in reversed(open_tags))
+    return head + closing, "".join(open_tags) + tail
+
+
+@dataclass
+class PageGeometry:
+    """内容页各部分的尺寸，与内容页模板的CSS保持一致（单位：px）"""
+    box_height: float = 1300
+    box_width: float = 975
+    wrapper_padding: float = 40
+    title_font_size: float = 32
+    title_margin: float = 30 + 30
+    content_padding: float = 30 + 30
+    paragraph_gap: float = 25
+    paragraph_padding_x: float = 30 + 30
+    paragraph_padding_y: float = 25 + 25
+    paragraph_border: float = 2 + 2
+    body_font_size: float = 24
+    body_line_height: float = 1.8
+    hashtags_font_size: float = 20
+    hashtags_padding: float = 15 + 15
+    hashtags_border: float = 2 + 2
+
+    @property
+    def inner_width(self) -> float:
+        return self.box_width - 2 * self.wrapper_padding
+
+    @property
+    def text_width(self) -> float:
+        return self.inner_width - self.paragraph_padding_x - self.paragraph_border
+
+
+class LayoutEngine:
+    """根据真实字宽计算段落高度并分页，不需要浏览器"""
+
+    LINE_CACHE_SIZE = 4096
+
+    def __init__(self, body_font: str | None, geometry: PageGeometry = None, min_split_lines: int = 2):
+        self.font = load_font_metrics(body_font)
+        self.geometry = geometry or PageGeometry()
+        self.min_split_lines = min_split_lines
+        # 每个实例单独缓存断行结果：缓存随实例一起释放，不同字体和尺寸的实例互不影响
+        self._paragraph_lines = functools.lru_cache(maxsize=self.LINE_CACHE_SIZE)(self._break_paragraph)
+
+    def _break_paragraph(self, paragraph: str) -> tuple[tuple[int, int], ...]:
+        return tuple(break_lines(
+            strip_markup(paragraph), self.font, self.geometry.body_font_size, self.geometry.text_width
+        ))
+
+    def line_height(self) -> float:
+        return self.geometry.body_font_size * self.geometry.body_line_height
+
+    def paragraph_height(self, paragraph: str) -> float:
+        g = self.geometry
+        return len(self._paragraph_lines(paragraph)) * self.line_height() + g.paragraph_padding_y + g.paragraph_border
+
+    def title_height(self, title: str) -> float:
+        g = self.geometry
+        lines = break_lines(strip_markup(title), self.font, g.title_font_size, g.inner_width) if title else []
+        return max(1, len(lines)) * g.title_font_size * self.font.line_height + g.title_margin
+
+    def hashtags_height(self) -> float:
+        g = self.geometry
+        return g.hashtags_font_size * self.font.line_height + g.hashtags_padding + g.hashtags_border
+
+    def available_height(self, title: str = "") -> float:
+        """内容区（.content）可容纳的高度"""
+        g = self.geometry
+        return g.box_height - 2 * g.wrapper_padding - self.title_height(title) - g.content_padding
+
+    def _split_paragraph(self, paragraph: str, height: float) -> tuple[str, str] | None:
+        """把段落拆成能放进 height 的前半部分和剩余部分，放不下足够的行时返回None"""
+        g = self.geometry
+        lines = self._paragraph_lines(paragraph)
+        fit = int((height - g.paragraph_padding_y - g.paragraph_border) // self.line_height())
+        if fit < 1 or fit >= len(lines):
+            return None
+        head, tail = split_markup(paragraph, lines[fit][0])
+        if not head or not tail:
+            return None
+        return head, tail
+
+    def split_oversized(self, paragraph: str, title: str = "") -> list[str]:
+        """把单独一页都放不下的段落按行拆成多段，其他段落原样返回"""
+        available = self.available_height(title)
+        pieces = []
+        while self.paragraph_height(paragraph) > available:
+            split = self._split_paragraph(paragraph, available)
+            if split is None:
+                break
+            pieces.append(split[0])
+            paragraph = split[1]
+        pieces.append(paragraph)
+        return pieces
+
+    def paginate(self, paragraphs: list[str], title: str = "", complete: bool = True) -> list[list[str]]:
+        """顺序贪心分页，返回每页的段落列表
+
+        放不下的段落按行拆分到下一页；complete 为True时，
+        如果最后一页加上话题标签会溢出，则把最后一段挪到新的一页。
+        """
+        g = self.geometry
+        available = self.available_height(title)
+        pages = []
+        current = []
+        used = 0.0
+
+        queue = list(reversed([p for p in paragraphs if p.strip()]))
+        while queue:
+            paragraph = queue.pop()
+            height = self.paragraph_height(paragraph)
+            gap = g.paragraph_gap if current else 0
+            if used + gap + height <= available:
+                current.append(paragraph)
+                used += gap + height
+                continue
+
+            # 当前页放不下：能放下足够多行时拆分段落，否则换页
+            remaining = available - used - gap
+            min_lines = 1 if not current else self.min_split_lines
+            split = self._split_paragraph(paragraph, remaining)
+            if split and len(self._paragraph_lines(split[0])) >= min_lines:
+                current.append(split[0])
+                queue.append(split[1])
+                pages.append(current)
+                current, used = [], 0.0
+            elif current:
+                pages.append(current)
+                current, used = [], 0.0
+                queue.append(paragraph)
+            else:
+                # 空页也放不下一行（不会发生在正常尺寸下），单独成页避免死循环
+                pages.append([paragraph])
+
+        if current:
+            pages.append(current)
+
+        if complete and pages:
+            last = pages[-1]
+            hashtags_space = self.hashtags_height()
+            if self._page_height(last) + hashtags_space > available:
+                if len(last) > 1:
+                    pages.append([last.pop()])
+                else:
+                    # 只有一段也放不下标签时，按行拆出能和标签共存的部分
+                    split = self._split_paragraph(last[0], available - hashtags_space)
+                    if split:
+                        pages[-1:] = [[split[0]], [split[1]]]
+        return pages
+
+    def _page_height(self, page: list[str]) -> float:
+        return sum(self.paragraph_height(p) for p in page) + self.geometry.paragraph_gap * (len(page) - 1)
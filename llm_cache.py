@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """LLM原始输出的磁盘缓存
+
+    以模型名、完整提示词和采样参数的哈希作为键，每个键最多保存 variations 个样本，
+    样本数量达到要求后按轮询方式返回。超过 max_age 的条目和超出 max_bytes 时
+    最久未使用的条目会被清理。
+
+    读写都是同步的文件操作，在事件循环中应通过 asyncio.to_thread 调用。
+    清理要遍历整个目录，只在每 evict_every 次写入后进行一次（另外由服务的后台任务定期清理），
+    因此两次清理之间总大小可能略微超出 max_bytes。
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 200 * 1024 * 1024, max_age: float = 7 * 24 * 3600,
+                 evict_every: int = 50):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_every = max(1, evict_every)
+        self._puts = 0  # 上次清理后写入的次数
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: dict) -> str:
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "params": params},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            logger.warning(f"缓存文件损坏，已忽略: {path} ({str(e)})")
+            return None
+        if time.time() - entry.get("created_at", 0) > self.max_age:
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def _save(self, key: str, entry: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def get(self, key: str, variations: int = 1, allow_partial: bool = False) -> str | None:
+        """读取一个样本
+
+        已保存的样本少于 variations 时返回None，让调用方生成新的样本；
+        allow_partial 为True时只要有样本就轮询返回。
+        """
+        with self._lock:
+            entry = self._load(key)
+            if entry is None or not entry["samples"]:
+                return None
+            samples = entry["samples"][:max(1, variations)]
+            if len(samples) < variations and not allow_partial:
+                return None
+            index = entry.get("next", 0) % len(samples)
+            entry["next"] = index + 1
+            self._save(key, entry)  # 同时刷新修改时间，用于按最近使用淘汰
+            return samples[index]
+
+    def put(self, key: str, text: str, variations: int = 1, replace: bool = False):
+        """保存一个新样本，最多保留 variations 个
+
+        样本已满时默认不再保存；replace 为True时用新样本替换最早的样本。
+        """
+        with self._lock:
+            entry = self._load(key) or {"created_at": time.time(), "samples": [], "next": 0}
+            samples = entry["samples"]
+            if len(samples) < max(1, variations) or replace:
+                samples.append(text)
+                del samples[:-max(1, variations)]
+                entry["next"] = len(samples)
+            self._save(key, entry)
+            self._puts += 1
+            due = self._puts >= self.evict_every
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """清理过期条目，并在总大小超出限制时按最久未使用删除"""
+        removed = 0
+        now = time.time()
+        with self._lock:
+            self._puts = 0
+            files = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        if removed:
+            logger.info(f"已清理 {removed} 个LLM缓存条目")
+        return removed
+
+    def stats(self) -> dict:
+        files = list(self.directory.glob("*.json"))
+        return {
+            "entries": len(files),
+            "bytes": sum(path.stat().st_size for path in files if path.exists()),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age
+        }
@@ -0,0 +1,271 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 秒级耗时的默认分桶，覆盖从模板渲染（毫秒级）到模型生成（分钟级）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge:
+    """采集时才读取当前值的指标，value 返回数值或 {标签值元组: 数值}"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, value, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._value = value
+
+    def collect(self) -> list[str]:
+        value = self._value()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in values]
+
+
+class Histogram:
+    """累计分桶的直方图，与Prometheus的histogram类型一致"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # 标签值 -> [各分桶计数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % _format_value(bound))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """保存所有指标，按Prometheus文本格式输出"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, value, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, value, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram("xhs_stage_duration_seconds", "各处理阶段的耗时（秒）", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("xhs_stage_errors_total", "各处理阶段抛出异常的次数", ("stage",))
+
+
+class Timings:
+    """一个请求内各阶段的耗时汇总
+
+    渲染在线程池中并行执行，多个线程会同时写入同一个对象。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages: dict[str, list] = {}
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, rss: int = None):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, None])
+            entry[0] += 1
+            entry[1] += seconds
+            if rss is not None:
+                entry[2] = max(entry[2] or 0, rss)
+
+    def set(self, name: str, value: float):
+        with self._lock:
+            self._values[name] = value
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "stages": {
+                    stage: {
+                        "count": count,
+                        "seconds": round(seconds, 4),
+                        **({"peak_rss_mb": round(rss / 1024 / 1024, 1)} if rss is not None else {})
+                    }
+                    for stage, (count, seconds, rss) in self._stages.items()
+                },
+                **{name: round(value, 4) for name, value in self._values.items()}
+            }
+
+
+def process_tree_rss(pid: int) -> int:
+    """进程及其所有子进程（例如Chrome）的常驻内存之和（字节），只支持Linux"""
+    children = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # /proc/<pid>/stat 的第4个字段是父进程ID（进程名中可能有空格，从最后一个括号后开始解析）
+            stat = (entry / "stat").read_text()
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        except (OSError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+                    break
+        except OSError:
+            continue
+    return total
+
+
+# 各阶段开始和结束时采样内存的函数，为None时不采样（每次采样要遍历 /proc，只在基准测试时开启）
+_rss_sampler = None
+
+
+def sample_stage_memory(sampler):
+    """开启（sampler 为返回字节数的函数）或关闭（None）阶段内存采样
+
+    采样的是整个进程树，并发请求时同一时刻其他请求占用的内存也会计入。
+    """
+    global _rss_sampler
+    _rss_sampler = sampler
+
+
+_current_timings: contextvars.ContextVar[Timings | None] = contextvars.ContextVar("timings", default=None)
+
+
+def begin_request() -> Timings:
+    """为当前请求开始记录耗时
+
+    每个请求运行在自己的上下文中，之后在同一上下文（以及复制了上下文的线程）里的 span 都会计入。
+    """
+    timings = Timings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Timings | None:
+    return _current_timings.get()
+
+
+@contextmanager
+def span(stage: str):
+    """记录一个阶段的耗时：写入直方图，并计入当前请求的耗时汇总
+
+    开启了阶段内存采样时，同时记录阶段开始和结束时内存的较大值。
+    """
+    sampler = _rss_sampler if _current_timings.get() is not None else None
+    rss = sampler() if sampler is not None else None
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            if sampler is not None:
+                rss = max(rss, sampler())
+            timings.add(stage, elapsed, rss)
+
+
+def record(name: str, value: float):
+    """把一个数值（例如首个token延迟）写入当前请求的耗时汇总"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.set(name, value)
@@ -0,0 +1,169 @@
+"""在多个Ollama服务之间分配生成请求
+
+- 每个后端记录正在处理的请求数和首个token延迟的指数移动平均
+- least_outstanding：选正在处理的请求最少的后端，相同时轮流选择（选处理过的请求最少的）
+- latency：按 延迟 x (正在处理的请求数 + 1) 估计排队后的等待时间，选最小的
+- 健康检查在后台定期进行，请求路径上不再检查；出错的后端立即标记为不可用，等下一次检查恢复
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+LATENCY = "latency"
+STRATEGIES = (LEAST_OUTSTANDING, LATENCY)
+LATENCY_ALPHA = 0.3  # 延迟移动平均中新样本的权重
+
+
+class NoBackendAvailable(Exception):
+    """没有可用的后端"""
+
+
+class Backend:
+    """一个Ollama服务及其运行状态"""
+
+    def __init__(self, url: str, model: str):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.healthy = False  # 第一次健康检查之前不分配请求
+        self.model_available = False
+        self.checked_at = None
+        self.outstanding = 0  # 正在处理的请求数
+        self.latency = None  # 首个token延迟的移动平均（秒）
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def observe_latency(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_ALPHA * (seconds - self.latency)
+
+    def mark_down(self, error: str):
+        """请求出错：在下一次健康检查之前不再分配请求"""
+        self.healthy = False
+        self.failures += 1
+        self.last_error = error
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "model_available": self.model_available,
+            "outstanding": self.outstanding,
+            "latency_seconds": round(self.latency, 4) if self.latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+def parse_backends(spec: str, default_model: str) -> list[Backend]:
+    """解析后端列表："http://a:11434,http://b:11434|qwen2.5:7b"，用逗号或空白分隔，| 后面是该后端使用的模型"""
+    backends = []
+    for entry in spec.replace(",", " ").split():
+        url, _, model = entry.partition("|")
+        backends.append(Backend(url, model or default_model))
+    if not backends:
+        raise ValueError("至少需要一个Ollama后端")
+    return backends
+
+
+class BackendRouter:
+    """按策略为每个请求选择后端，并定期检查各后端的健康状态"""
+
+    def __init__(self, backends: list[Backend], strategy: str = LEAST_OUTSTANDING,
+                 health_interval: float = 30.0, probe_timeout: float = 5.0):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的路由策略: {strategy}，可选: {', '.join(STRATEGIES)}")
+        self.backends = list(backends)
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self.failovers = 0
+
+    @property
+    def models(self) -> tuple[str, ...]:
+        """所有后端使用的模型（去重并排序）"""
+        return tuple(sorted({backend.model for backend in self.backends}))
+
+    @property
+    def available(self) -> bool:
+        return any(backend.healthy for backend in self.backends)
+
+    async def probe(self, backend: Backend, client: httpx.AsyncClient) -> bool:
+        """检查一个后端，返回它是否从不可用变为可用"""
+        was_healthy = backend.healthy
+        try:
+            response = await client.get(f"{backend.url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+            backend.model_available = any(model["name"] == backend.model for model in models)
+            if not backend.model_available:
+                logger.warning(f"警告: 后端 {backend.url} 上未找到模型 {backend.model}，请先下载")
+            backend.healthy = True
+        except Exception as e:
+            if was_healthy:
+                logger.warning(f"Ollama后端不可用: {backend.url}: {str(e)}")
+            backend.healthy = False
+            backend.last_error = str(e)
+        backend.checked_at = time.monotonic()
+        return backend.healthy and not was_healthy
+
+    async def probe_all(self, client: httpx.AsyncClient) -> list[Backend]:
+        """并发检查所有后端，返回刚恢复可用的后端"""
+        recovered = await asyncio.gather(*(self.probe(backend, client) for backend in self.backends))
+        return [backend for backend, flag in zip(self.backends, recovered) if flag]
+
+    async def run_health_checks(self, client_factory, on_recover=None):
+        """后台定期检查所有后端；on_recover(backend) 是后端恢复可用时在后台运行的协程（例如预热模型）"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                for backend in await self.probe_all(client_factory()):
+                    logger.info(f"Ollama后端已恢复: {backend.url}")
+                    if on_recover is not None:
+                        asyncio.create_task(on_recover(backend))
+            except Exception as e:
+                logger.error(f"检查Ollama后端失败: {str(e)}")
+
+    def _score(self, backend: Backend, default_latency: float) -> tuple:
+        # 还没有延迟数据的后端按已知的最低延迟估计，让新加入的后端也能分到请求
+        latency = backend.latency if backend.latency is not None else default_latency
+        if self.strategy == LATENCY:
+            return (latency * (backend.outstanding + 1), backend.outstanding)
+        # 延迟相近的后端之间差别只是噪声，空闲时按处理过的请求数轮流，不会总是选同一个
+        return (backend.outstanding, backend.requests)
+
+    def choose(self, exclude=()) -> Backend:
+        """选择一个可用的后端，exclude 中的后端（本次请求已经失败过的）不再选择"""
+        candidates = [backend for backend in self.backends if backend.healthy and backend not in exclude]
+        if not candidates:
+            raise NoBackendAvailable("没有可用的Ollama后端")
+        known = [backend.latency for backend in candidates if backend.latency is not None]
+        default_latency = min(known, default=0.0)
+        return min(candidates, key=lambda backend: self._score(backend, default_latency))
+
+    @contextmanager
+    def track(self, backend: Backend):
+        """统计后端正在处理的请求数"""
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        finally:
+            backend.outstanding -= 1
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "failovers": self.failovers,
+            "backends": [backend.stats() for backend in self.backends],
+        }
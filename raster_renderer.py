@@ -0,0 +1,329 @@
+import functools
+import html
+import logging
+import re
+import threading
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+
+from layout_engine import ZERO_WIDTH, LayoutEngine, break_lines, is_emoji, load_font_metrics
+
+logger = logging.getLogger(__name__)
+
+# 彩色emoji位图字体（如 NotoColorEmoji）只提供这一个尺寸
+EMOJI_BITMAP_SIZE = 109
+
+_RUN_PATTERN = re.compile(r"(<[^>]*>)|([^<]+|<)")
+_COLOR_PATTERN = re.compile(r"color\s*:\s*([^;\"']+)")
+_CLOSE_TAG_PATTERN = re.compile(r"</[^>]*>")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def parse_runs(markup: str, default_color: str) -> list[tuple[str, str, bool]]:
+    """把带 <span style="color: ..."> 的文本拆成 (文字, 颜色, 是否带样式) 片段"""
+    runs = []
+    styles = [(default_color, False)]
+    for match in _RUN_PATTERN.finditer(markup):
+        tag, text = match.groups()
+        if tag:
+            if _CLOSE_TAG_PATTERN.fullmatch(tag):
+                if len(styles) > 1:
+                    styles.pop()
+            elif not tag.endswith("/>"):
+                color = _COLOR_PATTERN.search(tag)
+                styles.append((color.group(1).strip(), True) if color else styles[-1])
+            continue
+        runs.append((html.unescape(text), *styles[-1]))
+    return runs
+
+
+def _clusters(text: str) -> list[str]:
+    """把文字拆成字形簇：变体选择符、零宽连接符及其后的字符、肤色修饰跟随前一个字符"""
+    clusters = []
+    for char in text:
+        if clusters and (
+            char in ZERO_WIDTH or clusters[-1].endswith("‍") or 0x1F3FB <= ord(char) <= 0x1F3FF
+        ):
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+    return clusters
+
+
+@functools.lru_cache(maxsize=8)
+def load_background(path: str, width: int, height: int, blur: float = 0) -> Image.Image:
+    """读取背景图并按 background-size: cover 居中裁剪缩放，结果按尺寸缓存"""
+    with Image.open(path) as image:
+        background = ImageOps.fit(image.convert("RGB"), (width, height), Image.LANCZOS, centering=(0.5, 0.5))
+    if blur:
+        background = background.filter(ImageFilter.GaussianBlur(blur))
+    return background
+
+
+class RasterRenderer:
+    """不依赖浏览器，直接用字体光栅化绘制标题页和内容页
+
+    布局与两个HTML模板一致，分页和断行复用 LayoutEngine，
+    因此光栅渲染的结果与浏览器渲染的分页相同。
+    """
+
+    MAX_CACHED_GLYPHS = 20000
+
+    def __init__(self, background: Path, title_font: Path, content_font: Path,
+                 layout: LayoutEngine, emoji_font: Path | None = None, scale: float = 2):
+        self.background = Path(background)
+        self.title_font = Path(title_font)
+        self.content_font = Path(content_font)
+        self.emoji_font = Path(emoji_font) if emoji_font else None
+        self.layout = layout
+        self.scale = scale
+        self._local = threading.local()  # FreeType 字体对象不在线程间共享，每个渲染线程各加载一次
+
+        if self.emoji_font is None or not self.emoji_font.exists():
+            if self.emoji_font is not None:
+                logger.warning(f"找不到emoji字体: {self.emoji_font}，光栅渲染将跳过emoji")
+            self.emoji_font = None
+
+    def prewarm(self):
+        """提前解码并缩放背景图，避免第一个请求承担这部分开销"""
+        self._canvas()
+        self._canvas(blur=1)
+
+    def _font(self, path: Path, size: float) -> ImageFont.FreeTypeFont:
+        fonts = self._local.__dict__.setdefault("fonts", {})
+        key = (path, round(size))
+        font = fonts.get(key)
+        if font is None:
+            font = fonts[key] = ImageFont.truetype(str(path), key[1])
+        return font
+
+    def _emoji_font(self, size: int) -> tuple[ImageFont.FreeTypeFont, int]:
+        """返回emoji字体及其实际加载的尺寸（位图字体只能按固定尺寸加载）"""
+        fonts = self._local.__dict__.setdefault("emoji_fonts", {})
+        if size not in fonts:
+            try:
+                fonts[size] = (ImageFont.truetype(str(self.emoji_font), size), size)
+            except OSError:
+                fonts[size] = (ImageFont.truetype(str(self.emoji_font), EMOJI_BITMAP_SIZE), EMOJI_BITMAP_SIZE)
+        return fonts[size]
+
+    def _emoji_image(self, cluster: str, size: int) -> Image.Image | None:
+        cache = self._local.__dict__.setdefault("emoji_images", {})
+        key = (cluster, size)
+        if key not in cache:
+            font, loaded_size = self._emoji_font(size)
+            left, top, right, bottom = font.getbbox(cluster, embedded_color=True)
+            if right <= left or bottom <= top:
+                cache[key] = None
+            else:
+                image = Image.new("RGBA", (right, bottom))
+                ImageDraw.Draw(image).text((0, 0), cluster, font=font, embedded_color=True)
+                if loaded_size != size:
+                    ratio = size / loaded_size
+                    image = image.resize((max(1, round(right * ratio)), max(1, round(bottom * ratio))), Image.LANCZOS)
+                cache[key] = image
+        return cache[key]
+
+    def _canvas(self, blur: float = 0, background: Path | None = None) -> Image.Image:
+        g = self.layout.geometry
+        size = (round(g.box_width * self.scale), round(g.box_height * self.scale))
+        return load_background(str(background or self.background), *size, blur=blur * self.scale).copy()
+
+    def _draw_line(self, image: Image.Image, draw: ImageDraw.ImageDraw, clusters: list[tuple[str, str, bool]],
+                   x: float, baseline: float, font_path: Path, font_size: float, justify_width: float = 0):
+        """绘制一行文字；justify_width 不为0时把多余的宽度平均分到字形簇之间（text-align: justify）"""
+        s = self.scale
+        metrics = load_font_metrics(str(font_path))
+        advances = [metrics.measure(cluster) * font_size * s for cluster, _, _ in clusters]
+        spacing = 0.0
+        if justify_width and len(clusters) > 1:
+            spacing = max(0.0, (justify_width * s - sum(advances)) / (len(clusters) - 1))
+
+        for (cluster, color, styled), advance in zip(clusters, advances):
+            if is_emoji(cluster[0]):
+                if self.emoji_font is not None:
+                    emoji_size = round(font_size * s)
+                    emoji = self._emoji_image(cluster, emoji_size)
+                    if emoji is not None:
+                        top = max(0, round(baseline - emoji_size * 0.88))
+                        image.paste(emoji, (round(x), top), emoji)
+            elif not cluster.isspace():
+                if styled:
+                    # .macaron-text 的 text-shadow: 1px 1px 2px rgba(255, 255, 255, 0.8)
+                    self._paste_glyph(image, font_path, font_size * s, cluster, x + s, baseline + s,
+                                      (255, 255, 255), opacity=0.8)
+                self._paste_glyph(image, font_path, font_size * s, cluster, x, baseline, color)
+            x += advance + spacing
+
+    def _glyph(self, font_path: Path, size: float, cluster: str, opacity: float = 1.0) -> tuple | None:
+        """字形的灰度蒙版及其相对基线的偏移，每个线程按 (字体, 字号, 字符) 缓存"""
+        glyphs = self._local.__dict__.setdefault("glyphs", {})
+        key = (font_path, round(size), cluster, opacity)
+        glyph = glyphs.get(key, False)
+        if glyph is False:
+            if opacity != 1.0:
+                base = self._glyph(font_path, size, cluster)
+                glyph = base and (base[0].point(lambda v: round(v * opacity)), base[1], base[2])
+            else:
+                font = self._font(font_path, size)
+                left, top, right, bottom = font.getbbox(cluster, anchor="ls")
+                if right <= left or bottom <= top:
+                    glyph = None
+                else:
+                    mask = Image.new("L", (right - left, bottom - top))
+                    ImageDraw.Draw(mask).text((-left, -top), cluster, font=font, fill=255, anchor="ls")
+                    glyph = (mask, left, top)
+            if len(glyphs) >= self.MAX_CACHED_GLYPHS:
+                glyphs.clear()
+            glyphs[key] = glyph
+        return glyph
+
+    def _paste_glyph(self, image: Image.Image, font_path: Path, size: float, cluster: str,
+                     x: float, baseline: float, color, opacity: float = 1.0):
+        glyph = self._glyph(font_path, size, cluster, opacity)
+        if glyph is not None:
+            mask, left, top = glyph
+            image.paste(color, (round(x) + left, round(baseline) + top), mask)
+
+    def _line_clusters(self, runs: list[tuple[str, str, bool]], start: int, end: int) -> list[tuple[str, str, bool]]:
+        """取出一行中的字形簇，连续空白合并为一个空格，行首行尾空白去掉"""
+        clusters = []
+        offset = 0
+        for text, color, styled in runs:
+            run_offset = offset
+            offset += len(text)
+            if offset <= start or run_offset >= end:
+                continue
+            piece = text[max(start, run_offset) - run_offset:min(end, offset) - run_offset]
+            for cluster in _clusters(_WHITESPACE_PATTERN.sub(" ", piece)):
+                if cluster == " " and (not clusters or clusters[-1][0] == " "):
+                    continue
+                clusters.append((cluster, color, styled))
+        while clusters and clusters[-1][0] == " ":
+            clusters.pop()
+        return clusters
+
+    def render_title(self, title: str, background: Path | None = None) -> Image.Image:
+        """绘制标题页：150px 标题字体，水平、垂直居中，保留换行"""
+        g = self.layout.geometry
+        s = self.scale
+        font_size = 150
+        line_height = font_size  # line-height: 1
+        width = g.box_width - 2 * 60 - 2 * 40  # .title-wrapper 和 .title 的内边距
+        metrics = load_font_metrics(str(self.title_font))
+
+        lines = []
+        for text in title.split("\n"):
+            lines += [text[start:end] for start, end in break_lines(text, metrics, font_size, width)]
+
+        image = self._canvas(background=background)
+        draw = ImageDraw.Draw(image)
+        font = self._font(self.title_font, font_size * s)
+        ascent, descent = font.getmetrics()
+        half_leading = (line_height * s - ascent - descent) / 2
+        top = (g.box_height - len(lines) * line_height) / 2 * s
+        for index, text in enumerate(lines):
+            text = text.strip()
+            clusters = [(cluster, "#000", False) for cluster in _clusters(text)]
+            text_width = sum(metrics.measure(cluster) for cluster, _, _ in clusters) * font_size
+            x = (g.box_width - text_width) / 2 * s
+            baseline = top + index * line_height * s + half_leading + ascent
+            self._draw_line(image, draw, clusters, x, baseline, self.title_font, font_size)
+        return image.convert("RGB")
+
+    def render_content(self, title: str, content: str, hashtags: str = "",
+                       background: Path | None = None) -> Image.Image:
+        """绘制内容页：标题、圆角半透明段落卡片、最后一页的话题标签"""
+        g = self.layout.geometry
+        s = self.scale
+        metrics = load_font_metrics(str(self.content_font))
+        image = self._canvas(blur=1, background=background)  # .content-wrapper 的 backdrop-filter: blur(1px)
+
+        left = g.wrapper_padding
+        right = g.box_width - g.wrapper_padding
+        y = g.wrapper_padding + self.layout.title_height(title) + g.content_padding / 2
+        paragraphs = [p.strip() for p in content.split("\n\n") if p.strip()]
+        boxes = []
+        for paragraph in paragraphs:
+            height = self.layout.paragraph_height(paragraph)
+            self._card(image, left, y, right, y + height, radius=20)
+            boxes.append((paragraph, y))
+            y += height + g.paragraph_gap
+
+        hashtags_top = None
+        if hashtags:
+            hashtags_height = self.layout.hashtags_height()
+            hashtags_top = g.box_height - g.wrapper_padding - hashtags_height
+            self._card(image, left, hashtags_top, right, hashtags_top + hashtags_height, radius=15, outer=False)
+        draw = ImageDraw.Draw(image)
+
+        # 标题：32px，加粗，居中
+        title_font = self._font(self.content_font, g.title_font_size * s)
+        title_top = g.wrapper_padding + g.title_margin / 2
+        title_lines = [
+            title[start:end].strip()
+            for start, end in break_lines(title, metrics, g.title_font_size, g.inner_width)
+        ] if title else []
+        for index, text in enumerate(title_lines):
+            text_width = metrics.measure(text) * g.title_font_size
+            baseline = (title_top + index * g.title_font_size * metrics.line_height) * s + title_font.getmetrics()[0]
+            draw.text(((g.box_width - text_width) / 2 * s, baseline), text, font=title_font, fill="#333",
+                      anchor="ls", stroke_width=max(1, round(s / 2)), stroke_fill="#333")
+
+        # 段落文字：24px，行高1.8，两端对齐
+        body_font = self._font(self.content_font, g.body_font_size * s)
+        ascent, descent = body_font.getmetrics()
+        line_height = g.body_font_size * g.body_line_height
+        half_leading = (line_height * s - ascent - descent) / 2
+        text_left = left + g.paragraph_border / 2 + g.paragraph_padding_x / 2
+        for paragraph, box_top in boxes:
+            runs = parse_runs(paragraph, "#333")
+            visible = "".join(text for text, _, _ in runs)
+            lines = break_lines(visible, metrics, g.body_font_size, g.text_width)
+            text_top = box_top + g.paragraph_border / 2 + g.paragraph_padding_y / 2
+            for index, (start, end) in enumerate(lines):
+                clusters = self._line_clusters(runs, start, end)
+                baseline = (text_top + index * line_height) * s + half_leading + ascent
+                is_last = index == len(lines) - 1
+                self._draw_line(
+                    image, draw, clusters, text_left * s, baseline, self.content_font, g.body_font_size,
+                    justify_width=0 if is_last else g.text_width
+                )
+
+        if hashtags_top is not None:
+            hashtags_font = self._font(self.content_font, g.hashtags_font_size * s)
+            text_width = metrics.measure(hashtags) * g.hashtags_font_size
+            baseline = (
+                (hashtags_top + g.hashtags_border / 2 + g.hashtags_padding / 2) * s + hashtags_font.getmetrics()[0]
+            )
+            draw.text(((g.box_width - text_width) / 2 * s, baseline), hashtags, font=hashtags_font,
+                      fill="#666", anchor="ls")
+        return image.convert("RGB")
+
+    def _card(self, image: Image.Image, left: float, top: float, right: float, bottom: float,
+              radius: float, outer: bool = True):
+        """白色半透明圆角卡片，2px黑色描边；outer 为True时再加一圈淡黑色外框（.paragraph::before）
+
+        只在卡片所在的区域上合成，不必对整张图做透明度混合。
+        """
+        s = self.scale
+        margin = round(2 * s) if outer else 0
+        x0, y0 = round(left * s) - margin, round(top * s) - margin
+        x1, y1 = round(right * s) + margin, round(bottom * s) + margin
+        layer = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        box = [margin, margin, x1 - x0 - margin - 1, y1 - y0 - margin - 1]
+        draw.rounded_rectangle(box, radius=radius * s, fill=(255, 255, 255, 230),
+                               outline=(0, 0, 0, 204), width=round(2 * s))
+        if outer:
+            draw.rounded_rectangle([0, 0, x1 - x0 - 1, y1 - y0 - 1], radius=radius * s,
+                                   outline=(0, 0, 0, 77), width=max(1, round(s)))
+        image.paste(layer, (x0, y0), layer)
+
+    def render_page(self, page: dict, is_first: bool = False, title: str = "",
+                    background: Path | None = None) -> Image.Image:
+        """按 save_html_and_capture_pages 的页面参数绘制一页，background 为空时使用默认背景"""
+        if is_first:
+            return self.render_title(page["content"], background=background)
+        return self.render_content(title, page["content"], page["hashtags"], background=background)
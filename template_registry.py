@@ -0,0 +1,62 @@
+import logging
+from pathlib import Path
+
+import jinja2
+
+logger = logging.getLogger(__name__)
+
+TITLE = "title"
+CONTENT = "content"
+
+
+class TemplateRegistry:
+    """从目录加载页面模板，支持多套主题
+
+    每个主题是 template_dir 下的一个子目录，包含 title.html 和 content.html：
+
+        templates/
+            default/title.html
+            default/content.html
+            dark/title.html
+            dark/content.html
+
+    编译后的模板在进程内缓存，并写入 cache_dir 的字节码缓存，重启后不必重新编译。
+    """
+
+    def __init__(self, template_dir: Path, cache_dir: Path | None = None):
+        self.template_dir = Path(template_dir)
+        bytecode_cache = None
+        if cache_dir is not None:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(str(cache_dir))
+        self.env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(str(self.template_dir)),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,  # 模板随程序发布，运行期间不检查文件是否修改
+            cache_size=-1
+        )
+
+    def themes(self) -> list[str]:
+        """所有同时提供标题页和内容页模板的主题"""
+        if not self.template_dir.is_dir():
+            return []
+        return sorted(
+            path.name for path in self.template_dir.iterdir()
+            if (path / f"{TITLE}.html").is_file() and (path / f"{CONTENT}.html").is_file()
+        )
+
+    def get(self, theme: str, kind: str) -> jinja2.Template:
+        try:
+            return self.env.get_template(f"{theme}/{kind}.html")
+        except jinja2.TemplateNotFound:
+            raise KeyError(f"未找到主题模板: {theme}/{kind}.html")
+
+    def render(self, theme: str, kind: str, **context) -> str:
+        return self.get(theme, kind).render(**context)
+
+    def prewarm(self):
+        """启动时编译所有模板"""
+        for theme in self.themes():
+            for kind in (TITLE, CONTENT):
+                self.get(theme, kind)
+        logger.info(f"已加载页面模板: {', '.join(self.themes())}")
@@ -10,6 +10,9 @@ import asyncio
 import aiohttp
 from datetime import datetime
 import re
+import csv
+import uuid
+import argparse
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 from queue import Queue
@@ -22,6 +25,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SERVER_URL = "http://localhost:8000"
+
+class GenerationError(Exception):
+    """生成请求失败，retry_after 为服务器建议的重试等待时间"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 def clean_folder_name(title: str) -> str:
     """清理文件夹名称，移除非法字符和emoji
     Args:
@@ -62,148 +74,280 @@ def get_next_folder_number(base_dir: Path) -> int:
         return 1
     return max(int(d.name) for d in existing_folders) + 1
 
-async def generate_content(topic: str, style: str = "干货分享") -> dict:
-    """生成单个话题的内容"""
-    url = "http://localhost:8000/generate"
-    
-    async with aiohttp.ClientSession() as session:
+class FolderAllocator:
+    """O(1) 分配话题文件夹编号
+
+    下一个编号记录在 base_dir/.next_folder 中，只在计数文件不存在时扫描一次目录。
+    用 mkdir 创建目录本身做占位，多个进程同时分配也不会拿到同一个编号。
+    """
+
+    COUNTER_FILE = ".next_folder"
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.counter_path = self.base_dir / self.COUNTER_FILE
+        self._lock = threading.Lock()
+
+    def _read_counter(self) -> int:
         try:
-            # 第一次请求 - 生成标题页
-            logger.info(f"正在生成话题 '{topic}' 的标题页...")
-            async with session.post(url, json={
-                "topic": topic,
-                "style": style,
-                "page_index": "0"
-            }, timeout=120) as response:
-                if response.status != 200:
-                    logger.error(f"生成标题页失败: HTTP {response.status}")
-                    return None
-                
-                result = await response.json()
-                request_id = result["request_id"]
-                total_pages = result["total_pages"]
-                
-                # 获取标题内容
-                title_content = result.get("title", "")
-                if not title_content:
-                    title_content = result.get("content", topic)
-                
-                # 确保 image 目录存在
-                base_dir = Path("image")
-                base_dir.mkdir(parents=True, exist_ok=True)
-                
-                # 获取下一个可用的文件夹编号
-                folder_number = get_next_folder_number(base_dir)
-                topic_dir = base_dir / str(folder_number)
-                topic_dir.mkdir(parents=True, exist_ok=True)
-                logger.info(f"创建目录: {topic_dir}")
-                
+            return int(self.counter_path.read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return get_next_folder_number(self.base_dir)
+
+    def _write_counter(self, value: int):
+        tmp_path = self.counter_path.with_name(f"{self.COUNTER_FILE}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(str(value))
+        tmp_path.replace(self.counter_path)
+
+    def allocate(self) -> tuple[int, Path]:
+        """分配一个新的编号并创建对应的目录"""
+        with self._lock:
+            number = self._read_counter()
+            while True:
+                folder = self.base_dir / str(number)
                 try:
-                    # 移动生成的图片到话题目录
-                    src_image = Path(result["image_path"])
-                    if src_image.exists():
-                        dst_image = topic_dir / src_image.name
-                        src_image.rename(dst_image)
-                        logger.info(f"移动图片到: {dst_image}")
-                    else:
-                        logger.error(f"源图片不存在: {src_image}")
-                except Exception as e:
-                    logger.error(f"移动图片时出错: {str(e)}")
-                
-                # 收集内容数据（包含原始标题）
-                content_data = {
-                    "folder_number": folder_number,
-                    "title": title_content,
-                    "topic": topic,
-                    "content": [],
-                    "hashtags": []
-                }
-                
-                logger.info(f"标题页生成完成")
-                await asyncio.sleep(2)
-            
-            # 生成所有内容页（从第1页开始）
-            for page_index in range(1, total_pages + 1):
-                logger.info(f"正在生成第 {page_index}/{total_pages} 页...")
-                
-                async with session.post(url, json={
-                    "topic": topic,
-                    "style": style,
-                    "request_id": request_id,
-                    "page_index": str(page_index)
-                }, timeout=120) as response:
-                    if response.status != 200:
-                        logger.error(f"生成内容页失败: HTTP {response.status}")
-                        continue
-                    
-                    result = await response.json()
-                    
-                    # 移动生成的图片到话题目录
-                    src_image = Path(result["image_path"])
-                    dst_image = topic_dir / src_image.name
-                    src_image.rename(dst_image)
-                    
-                    # 获取内容数据
-                    content_data["content"].append(result.get("content", ""))
-                    if page_index == total_pages:
-                        content_data["hashtags"] = result.get("hashtags", [])
-                    
-                    logger.info(f"第 {page_index} 页生成完成")
-                    await asyncio.sleep(2)
-            
-            # 保存内容数据到JSON文件
-            json_path = topic_dir / "content.json"
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(content_data, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"话题 '{title_content}' 的所有内容生成完成")
-            logger.info("-----------------------------------")
-            return content_data
-            
-        except Exception as e:
-            logger.error(f"生成过程发生错误: {str(e)}", exc_info=True)
-            return None
+                    folder.mkdir()
+                    break
+                except FileExistsError:
+                    # 其他进程已经占用了这个编号
+                    number += 1
+            self._write_counter(number + 1)
+            return number, folder
 
-async def generate_multiple_topics(topics: list[str], style: str = "干货分享"):
-    """按顺序生成多个话题的内容"""
-    # 检查服务器状态
+_folder_allocators = {}
+
+def allocate_topic_folder(base_dir: Path) -> tuple[int, Path]:
+    """为话题分配编号目录"""
+    key = Path(base_dir).resolve()
+    if key not in _folder_allocators:
+        _folder_allocators[key] = FolderAllocator(base_dir)
+    return _folder_allocators[key].allocate()
+
+async def generate_content(topic: str, style: str = "干货分享", session: aiohttp.ClientSession = None) -> dict:
+    """生成单个话题的内容，失败时返回None"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("http://localhost:8000/docs") as response:
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await _generate_content(session, topic, style)
+        return await _generate_content(session, topic, style)
+    except Exception as e:
+        logger.error(f"生成过程发生错误: {str(e)}", exc_info=True)
+        return None
+
+async def _generate_content(session: aiohttp.ClientSession, topic: str, style: str, request_id: str = "",
+                            options: dict = None) -> dict:
+    """生成单个话题的内容（一次批量请求生成所有页面），失败时抛出异常
+
+    传入之前用过的 request_id 时，服务器会复用已生成的文案，只渲染未完成的页面。
+    """
+    url = f"{SERVER_URL}/generate/batch"
+    
+    logger.info(f"正在生成话题 '{topic}' 的所有页面...")
+    async with session.post(url, json={
+        "topic": topic,
+        "style": style,
+        "request_id": request_id,
+        **(options or {})
+    }, timeout=aiohttp.ClientTimeout(total=600)) as response:
+        if response.status == 429:
+            retry_after = float(response.headers.get("Retry-After", 5))
+            raise GenerationError("服务器渲染队列已满", retry_after=retry_after)
+        if response.status != 200:
+            raise GenerationError(f"生成失败: HTTP {response.status}")
+        
+        result = await response.json()
+    
+    # 获取标题内容
+    title_content = result.get("title") or topic
+    
+    # 分配话题目录
+    folder_number, topic_dir = allocate_topic_folder(Path("image"))
+    logger.info(f"创建目录: {topic_dir}")
+    
+    # 收集内容数据（包含原始标题）
+    content_data = {
+        "folder_number": folder_number,
+        "title": title_content,
+        "topic": topic,
+        "content": [],
+        "hashtags": result.get("hashtags", [])
+    }
+    
+    for page in result["pages"]:
+        try:
+            # 移动生成的图片到话题目录
+            src_image = Path(page["image_path"])
+            if src_image.exists():
+                dst_image = topic_dir / src_image.name
+                src_image.replace(dst_image)
+                logger.info(f"移动图片到: {dst_image}")
+            else:
+                logger.error(f"源图片不存在: {src_image}")
+        except Exception as e:
+            logger.error(f"移动图片时出错: {str(e)}")
+        
+        # 获取内容数据（标题页不计入正文）
+        if page["page_index"] > 0:
+            content_data["content"].append(page.get("content", ""))
+    
+    # 服务器为该请求创建的图片目录已经搬空，顺手删除
+    if result["pages"]:
+        try:
+            Path(result["pages"][0]["image_path"]).parent.rmdir()
+        except OSError:
+            pass
+    
+    # 保存内容数据到JSON文件
+    json_path = topic_dir / "content.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(content_data, f, ensure_ascii=False, indent=2)
+    
+    logger.info(f"话题 '{title_content}' 的所有内容生成完成，共 {result['total_pages']} 页")
+    logger.info("-----------------------------------")
+    return content_data
+
+async def generate_with_retries(session: aiohttp.ClientSession, topic: str, style: str,
+                                retries: int = 2, backoff: float = 2.0, options: dict = None) -> dict:
+    """生成单个话题，失败后按指数退避重试，返回该话题的统计信息
+
+    所有尝试使用同一个 request_id，重试时服务器从中断的地方继续。
+    """
+    started = time.monotonic()
+    request_id = uuid.uuid4().hex
+    report = {"topic": topic, "style": style, "success": False, "attempts": 0, "error": None}
+    
+    for attempt in range(retries + 1):
+        report["attempts"] = attempt + 1
+        try:
+            content_data = await _generate_content(session, topic, style, request_id, options)
+            report.update({
+                "success": True,
+                "error": None,
+                "folder_number": content_data["folder_number"],
+                "title": content_data["title"]
+            })
+            break
+        except Exception as e:
+            report["error"] = str(e) or type(e).__name__
+            if attempt >= retries:
+                logger.error(f"话题 '{topic}' 生成失败（已尝试 {attempt + 1} 次）: {report['error']}")
+                break
+            delay = backoff * (2 ** attempt)
+            if isinstance(e, GenerationError) and e.retry_after:
+                delay = max(delay, e.retry_after)
+            logger.warning(f"话题 '{topic}' 第 {attempt + 1} 次生成失败: {report['error']}，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+    
+    report["latency"] = round(time.monotonic() - started, 3)
+    return report
+
+async def generate_multiple_topics(topics: list, style: str = "干货分享", workers: int = 3,
+                                   retries: int = 2, backoff: float = 2.0, report_path: Path = None,
+                                   options: dict = None) -> list[dict]:
+    """并发生成多个话题的内容
+
+    topics 中的每项可以是话题字符串，也可以是包含 topic、style 的字典。
+    最多同时进行 workers 个话题，所有请求共用一个 ClientSession。
+    options 会原样附加到每个生成请求中（例如 cache、variations）。
+    """
+    tasks = [
+        (item, style) if isinstance(item, str) else (item["topic"], item.get("style") or style)
+        for item in topics
+    ]
+    total = len(tasks)
+    
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10)
+    connector = aiohttp.TCPConnector(limit=max(1, workers) * 2)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # 检查服务器状态
+        try:
+            async with session.get(f"{SERVER_URL}/docs") as response:
                 if response.status != 200:
                     logger.error("无法连接到服务器，请确保服务器正在运行")
                     logger.info("请先运行 python xiaohongshu_generator.py 启动服务器")
-                    return
-    except Exception:
-        logger.error("无法连接到服务器，请确保服务器正在运行")
-        return
-    
-    successful = 0
-    total = len(topics)
-    
-    # 顺序生成每个话题
-    for index, topic in enumerate(topics, 1):
-        logger.info("===================================")
-        logger.info(f"开始生成第 {index}/{total} 个话题: {topic}")
-        logger.info("===================================")
+                    return []
+        except Exception:
+            logger.error("无法连接到服务器，请确保服务器正在运行")
+            return []
         
-        result = await generate_content(topic, style)
+        semaphore = asyncio.Semaphore(max(1, workers))
+        started = time.monotonic()
         
-        if result is not None:
-            successful += 1
-            logger.info(f"话题 '{topic}' 生成成功")
-        else:
-            logger.error(f"话题 '{topic}' 生成失败")
+        async def run(index: int, topic: str, topic_style: str) -> dict:
+            async with semaphore:
+                logger.info("===================================")
+                logger.info(f"开始生成第 {index}/{total} 个话题: {topic}")
+                logger.info("===================================")
+                return await generate_with_retries(session, topic, topic_style, retries, backoff, options)
         
-        # 在话题之间添加短暂延迟
-        if index < total:
-            logger.info("等待2秒后开始生成下一个话题...")
-            await asyncio.sleep(2)
+        reports = await asyncio.gather(*[
+            run(index, topic, topic_style) for index, (topic, topic_style) in enumerate(tasks, 1)
+        ])
+        elapsed = time.monotonic() - started
     
     # 统计结果
+    successful = sum(1 for report in reports if report["success"])
+    latencies = sorted(report["latency"] for report in reports if report["success"])
     logger.info("===================================")
-    logger.info(f"全部生成完成: {successful}/{total} 个话题成功")
+    logger.info(f"全部生成完成: {successful}/{total} 个话题成功，总耗时 {elapsed:.1f} 秒")
+    if latencies:
+        logger.info(
+            f"单话题耗时: 最短 {latencies[0]:.1f}s, 中位 {latencies[len(latencies) // 2]:.1f}s, 最长 {latencies[-1]:.1f}s"
+        )
+    for report in reports:
+        status = "成功" if report["success"] else f"失败: {report['error']}"
+        logger.info(f"  {report['topic']}: {status}（{report['latency']:.1f}s, 尝试 {report['attempts']} 次）")
     logger.info("===================================")
+    
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "total": total,
+                "successful": successful,
+                "elapsed": round(elapsed, 3),
+                "workers": workers,
+                "topics": reports
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"统计报告已保存到: {report_path}")
+    
+    return reports
+
+def load_topics_file(path: Path) -> list[dict]:
+    """从CSV或JSONL文件读取话题
+
+    每条记录包含 topic，可选 style 和 times（生成次数）。
+    CSV需要表头；没有表头时第一列视为话题。
+    """
+    path = Path(path)
+    records = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if path.suffix.lower() == ".jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+        else:
+            rows = list(csv.reader(f))
+            if rows and "topic" in [cell.strip() for cell in rows[0]]:
+                header = [cell.strip() for cell in rows[0]]
+                records = [dict(zip(header, row)) for row in rows[1:]]
+            else:
+                records = [{"topic": row[0]} for row in rows if row]
+    
+    topics = []
+    for record in records:
+        topic = str(record.get("topic", "")).strip()
+        if not topic:
+            continue
+        try:
+            times = max(1, int(record.get("times") or 1))
+        except ValueError:
+            times = 1
+        topics.extend([{"topic": topic, "style": record.get("style") or None}] * times)
+    
+    logger.info(f"从 {path} 读取了 {len(topics)} 个任务")
+    return topics
 
 def get_user_input():
     """获取用户输入的话题和执行次数"""
@@ -363,24 +507,56 @@ class RedBookGeneratorUI:
     
     # ... 其他方法保持不变 ...
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="小红书文章批量生成客户端")
+    parser.add_argument("--topics-file", type=Path, help="话题文件（CSV或JSONL），不指定时交互输入")
+    parser.add_argument("--style", default="干货分享", help="默认文案风格")
+    parser.add_argument("--workers", type=int, default=3, help="同时生成的话题数量")
+    parser.add_argument("--retries", type=int, default=2, help="每个话题失败后的重试次数")
+    parser.add_argument("--backoff", type=float, default=2.0, help="重试的初始等待秒数，每次翻倍")
+    parser.add_argument("--report", type=Path, help="统计报告的保存路径（JSON）")
+    parser.add_argument("--cache", choices=["bypass", "prefer", "only", "refresh"], default="bypass", help="服务器端LLM输出缓存模式")
+    parser.add_argument("--variations", type=int, default=1, help="每个话题缓存的样本数，重复话题轮询使用")
+    parser.add_argument("--renderer", choices=["browser", "raster"], help="渲染方式，默认使用服务器配置")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], help="输出图片格式，默认使用服务器配置")
+    parser.add_argument("--target-bytes", type=int, help="每页图片的目标大小（字节，仅webp/jpeg）")
+    parser.add_argument("-y", "--yes", action="store_true", help="不询问直接开始生成")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        # 获取用户输入的话题和次数
-        topics = get_user_input()
+        # 获取话题：优先读取文件，否则交互输入
+        topics = load_topics_file(args.topics_file) if args.topics_file else get_user_input()
         
         # 确认是否开始生成
-        confirm = input("\n确认开始生成？(y/n): ").strip().lower()
-        if confirm != 'y':
-            print("已取消生成")
-            sys.exit(0)
+        if not args.yes:
+            confirm = input("\n确认开始生成？(y/n): ").strip().lower()
+            if confirm != 'y':
+                print("已取消生成")
+                sys.exit(0)
         
         print("\n开始生成...")
         # 运行生成任务
-        asyncio.run(generate_multiple_topics(topics))
+        asyncio.run(generate_multiple_topics(
+            topics,
+            style=args.style,
+            workers=args.workers,
+            retries=args.retries,
+            backoff=args.backoff,
+            report_path=args.report,
+            options={
+                "cache": args.cache,
+                "variations": args.variations,
+                **({"renderer": args.renderer} if args.renderer else {}),
+                **({"image_format": args.image_format} if args.image_format else {}),
+                **({"target_bytes": args.target_bytes} if args.target_bytes else {})
+            }
+        ))
         
     except KeyboardInterrupt:
         print("\n已中断生成过程")
         sys.exit(1)
     except Exception as e:
         print(f"\n发生错误: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
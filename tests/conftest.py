@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 模块都在仓库根目录下，直接运行 pytest 时也能导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 导入生成服务时会在 SAVE_DIR 下创建任务数据库等文件，测试时放到临时目录
+os.environ.setdefault("SAVE_DIR", tempfile.mkdtemp(prefix="xhs-test-"))
+os.environ.setdefault("OLLAMA_WARMUP", "0")
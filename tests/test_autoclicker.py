@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+
+import pytest
+
+# autoclicker 在导入时就需要 pyautogui 和 pynput，它们需要图形环境；
+# 没有显示器时可以用虚拟显示运行：xvfb-run -a python -m pytest tests
+if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+    pytest.skip("需要X显示，可以在 xvfb-run 下运行", allow_module_level=True)
+pytest.importorskip("pyautogui")
+pytest.importorskip("pynput")
+
+import autoclicker  # noqa: E402
+from autoclicker import compact_actions, decode_actions, encode_actions  # noqa: E402
+
+WINDOW = 0.4
+
+
+def click(x, y, at, button="left", **extra):
+    return {"type": "click", "x": x, "y": y, "button": button, "interval": at, **extra}
+
+
+def test_double_click_within_interval_is_merged_with_its_gap():
+    [merged] = compact_actions([click(10, 20, 1.0), click(10, 20, 1.15)], window=WINDOW)
+    assert merged["clicks"] == 2
+    assert merged["click_interval"] == pytest.approx(0.15)
+    assert merged["interval"] == 1.0
+
+
+def test_clicks_further_apart_than_double_click_interval_stay_separate():
+    actions = [click(10, 20, 1.0), click(10, 20, 1.45)]
+    assert compact_actions(actions, window=WINDOW) == actions
+
+
+def test_different_buttons_at_same_point_stay_separate():
+    # clicks.json 中 (1012, 294) 先左键再右键：选中后打开菜单，不是重复的点击
+    with open("clicks.json") as f:
+        recorded = decode_actions(json.load(f))
+    compacted = compact_actions(recorded, window=WINDOW)
+    at_point = [action["button"] for action in compacted if action.get("x") == 1012 and action.get("y") == 294]
+    assert at_point == ["left", "right"]
+
+
+def test_click_with_its_own_anchor_is_not_merged():
+    actions = [
+        click(10, 20, 1.0, anchor="a/0.png", anchor_offset=(5, 5)),
+        click(10, 20, 1.1, anchor="a/1.png", anchor_offset=(5, 5)),
+    ]
+    compacted = compact_actions(actions, window=WINDOW)
+    assert [action["anchor"] for action in compacted] == ["a/0.png", "a/1.png"]
+
+
+def test_follow_up_click_without_anchor_merges_into_anchored_click():
+    actions = [click(10, 20, 1.0, anchor="a/0.png", anchor_offset=(5, 5)), click(10, 20, 1.1)]
+    [merged] = compact_actions(actions, window=WINDOW)
+    assert merged["clicks"] == 2
+    assert merged["anchor"] == "a/0.png"
+
+
+def test_encode_decode_round_trip():
+    actions = [
+        click(10, 20, 0.0),
+        click(10, 20, 0.12),
+        click(30, 40, 1.5, button="right"),
+        {"type": "drag", "start_x": 1, "start_y": 2, "end_x": 3, "end_y": 4, "button": "left", "interval": 2.0},
+        {"type": "key", "key": "a", "interval": 2.5},
+        click(50, 60, 3.0, anchor="clicks.anchors/5.png", anchor_offset=(24, 24), anchor_scale=2.0),
+    ]
+    data = json.loads(json.dumps(encode_actions(actions)))
+    assert data["version"] == autoclicker.FORMAT_VERSION
+    # 默认值省略
+    assert data["actions"][1] == ["c", 1500, 30, 40, "right"]
+    decoded = decode_actions(data)
+    assert decoded[0] == {"type": "click", "x": 10, "y": 20, "button": "left", "clicks": 2,
+                          "click_interval": 0.12, "interval": 0.0}
+    assert decoded[2]["type"] == "drag" and decoded[2]["end_y"] == 4
+    assert decoded[3] == {"type": "key", "key": "a", "interval": 2.5}
+    assert decoded[4]["anchor"] == "clicks.anchors/5.png"
+    assert decoded[4]["anchor_offset"] == (24, 24)
+
+
+def test_old_list_format_is_read_as_is():
+    actions = [click(1, 2, 0.5)]
+    assert decode_actions(actions) == actions
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        decode_actions({"version": 99, "actions": []})
+
+
+def test_merged_click_replays_with_recorded_gap(monkeypatch):
+    calls = []
+    monkeypatch.setattr(autoclicker.pyautogui, "click", lambda **kwargs: calls.append(kwargs))
+    autoclicker.perform_action({**click(10, 20, 0.0), "clicks": 2, "click_interval": 0.2}, speed=2.0)
+    assert calls == [{"x": 10, "y": 20, "button": "left", "clicks": 2, "interval": 0.1}]
+
+
+def test_recorder_skips_anchor_for_follow_up_click(monkeypatch):
+    from pynput import mouse
+
+    captured = []
+    monkeypatch.setattr(autoclicker, "double_click_interval", lambda: WINDOW)
+    recorder = autoclicker.ClickRecorder(anchor_size=48)
+    monkeypatch.setattr(recorder, "capture_anchor", lambda x, y: captured.append((x, y)) or {"anchor_image": None})
+    recorder.is_recording = True
+    for _ in range(2):
+        recorder.on_click(10, 20, mouse.Button.left, True)
+        recorder.on_click(10, 20, mouse.Button.left, False)
+    assert captured == [(10, 20)]
+    [merged] = compact_actions(recorder.recorded_actions, window=WINDOW)
+    assert merged["clicks"] == 2
+
+
+def test_anchored_recording_is_saved_loaded_and_played_relative_to_anchor(tmp_path, monkeypatch):
+    from PIL import Image
+
+    filename = tmp_path / "macro.json"
+    image = Image.effect_noise((48, 48), 64).convert("RGB")
+    autoclicker.save_actions([
+        click(100, 200, 0.0, anchor_image=image, anchor_offset=(24, 24), anchor_scale=1.0),
+        click(300, 400, 0.01),
+    ], filename)
+    assert (tmp_path / "macro.anchors" / "0.png").is_file()
+
+    actions = autoclicker.load_actions(filename)
+    monkeypatch.setattr(autoclicker.vision_anchor, "screen_scale", lambda: 1.0)
+    assert autoclicker.prepare_anchors(actions) == 1
+    assert actions[0]["template"].size == (48, 48)
+
+    searched, calls = [], []
+    monkeypatch.setattr(autoclicker.vision_anchor, "find_anchor",
+                        lambda template, x, y, **kwargs: searched.append((x, y)) or (110, 195))
+    monkeypatch.setattr(autoclicker.pyautogui, "click", lambda **kwargs: calls.append((kwargs["x"], kwargs["y"])))
+    assert autoclicker.play_actions(actions)
+    assert searched == [(100, 200)]
+    # 有锚点的动作平移到锚点的位置，没有锚点的动作保持录制的位置
+    assert calls == [(110, 195), (300, 400)]
+
+
+def test_playback_stops_when_anchor_does_not_appear(monkeypatch):
+    calls = []
+    monkeypatch.setattr(autoclicker.vision_anchor, "find_anchor", lambda *args, **kwargs: None)
+    monkeypatch.setattr(autoclicker.pyautogui, "click", lambda **kwargs: calls.append(kwargs))
+    assert not autoclicker.play_actions([click(1, 2, 0.0, template=object())], anchor_timeout=0.1)
+    assert calls == []
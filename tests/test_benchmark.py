@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from benchmark import MemoryMonitor, percentile, summarize
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) == 0.0
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([1, 2, 3, 4], 100) == 4
+    assert summarize([1.0, 3.0])["mean"] == 2.0
+
+
+@pytest.mark.skipif(not Path("/proc/self/status").exists(), reason="需要Linux的 /proc")
+def test_memory_monitor_stops_and_joins():
+    monitor = MemoryMonitor(os.getpid(), interval=0.01)
+    monitor.start()
+    monitor.reset()
+    monitor.stop()
+    assert not monitor.is_alive()
+    assert monitor.peak > 0
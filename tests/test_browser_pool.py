@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from browser_pool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.alive = True
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("driver is dead")
+        return 1
+
+    def quit(self):
+        self.alive = False
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        driver = FakeDriver()
+        created.append(driver)
+        return driver
+
+    return BrowserPool(driver_factory=factory, **kwargs), created
+
+
+def acquire_in_thread(pool):
+    result = {}
+
+    def run():
+        started = time.monotonic()
+        try:
+            result["pooled"] = pool.acquire()
+        except Exception as e:
+            result["error"] = e
+        result["waited"] = time.monotonic() - started
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_reuses_idle_driver():
+    pool, created = make_pool(size=2)
+    pooled = pool.acquire()
+    pool.release(pooled)
+    assert pool.acquire() is pooled
+    assert len(created) == 1
+
+
+def test_waiter_gets_released_driver():
+    pool, created = make_pool(size=1, checkout_timeout=5)
+    pooled = pool.acquire()
+    thread, result = acquire_in_thread(pool)
+    time.sleep(0.1)
+    pool.release(pooled)
+    thread.join(5)
+    assert result["pooled"] is pooled
+    assert len(created) == 1
+
+
+@pytest.mark.parametrize("finish", ["broken", "recycled"])
+def test_waiter_creates_driver_when_slot_frees(finish):
+    pool, created = make_pool(size=1, max_renders=1 if finish == "recycled" else 50, checkout_timeout=5)
+    pooled = pool.acquire()
+    thread, result = acquire_in_thread(pool)
+    time.sleep(0.1)
+    pool.release(pooled, broken=finish == "broken")
+    thread.join(5)
+    assert "error" not in result
+    assert result["pooled"] is not pooled
+    assert result["waited"] < 1
+    assert len(created) == 2
+    assert pool.stats()["total"] == 1
+
+
+def test_waiter_replaces_unhealthy_driver_destroyed_by_another_thread():
+    pool, created = make_pool(size=1, checkout_timeout=5)
+    pooled = pool.acquire()
+    pooled.driver.alive = False
+    pool.release(pooled)
+    # 失效的驱动在取出时被替换
+    replacement = pool.acquire()
+    assert replacement is not pooled
+    assert pool.stats()["replaced"] == 1
+    assert pool.stats()["total"] == 1
+
+
+def test_never_exceeds_size():
+    pool, created = make_pool(size=2, checkout_timeout=5)
+    held, errors = [], []
+    lock = threading.Lock()
+
+    def run():
+        try:
+            pooled = pool.acquire()
+            with lock:
+                held.append(pooled)
+                assert pool.stats()["total"] <= 2
+            time.sleep(0.01)
+            pool.release(pooled, broken=len(held) % 3 == 0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not errors
+    assert pool.stats()["total"] <= 2
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, checkout_timeout=0.1)
+    pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from content_cleaner import Block, ContentCleaner, cleaner_for, normalize_lines, register_blocks, split_lines, MODEL_BLOCKS
+
+SAMPLE = (
+    "<think>\n先想想结构。\n</think>\n\n"
+    "  周末宅家指南🏠  \n\n\n"
+    "第一段内容 [思考]草稿[/思考]继续\n"
+    "<!-- 注释 -->第二段\n\n"
+    "【思考】中间的想法【/思考】第三段   \n"
+)
+
+
+def stream_in_chunks(cleaner: ContentCleaner, text: str, sizes) -> list[str]:
+    stream, lines, position = cleaner.stream(), [], 0
+    for size in sizes:
+        if position >= len(text):
+            break
+        lines.extend(stream.lines(text[position:position + size]))
+        position += size
+    lines.extend(stream.lines(text[position:]))
+    lines.extend(stream.finish_lines())
+    return lines
+
+
+def test_clean_removes_blocks_and_normalizes_whitespace():
+    assert cleaner_for("deepseek-r1:1.5b").clean(SAMPLE) == "周末宅家指南🏠\n\n第一段内容 继续\n第二段\n\n第三段"
+
+
+def test_unclosed_block_is_removed_to_the_end():
+    assert ContentCleaner().clean("标题\n<think>还没想完") == "标题"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("标题\n\n注释写法是<!-- 这样。\n\n第二段正文", "标题\n\n注释写法是<!-- 这样。\n\n第二段正文"),
+    ("标题\n\n（思考）后面是正文\n\n第二段", "标题\n\n（思考）后面是正文\n\n第二段"),
+    ("标题\n【思考】没有结束<!--注释-->后面\n<think>想法", "标题\n【思考】没有结束后面"),
+])
+def test_unclosed_non_reasoning_marker_is_kept(text, expected):
+    cleaner = ContentCleaner()
+    assert cleaner.clean(text) == expected
+    for size in (1, 2, 3, 5, 100):
+        assert stream_in_chunks(cleaner, text, [size] * len(text)) == split_lines(expected)
+
+
+def test_normalize_lines():
+    assert normalize_lines("  a  \n\n\n  b \n c ") == "a\n\nb\nc"
+    assert split_lines("  a  \n\n\n  b \n") == ["a", "b"]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_streaming_lines_match_batch_cleaning(seed):
+    rng = random.Random(seed)
+    cleaner = cleaner_for("deepseek-r1:1.5b")
+    sizes = [rng.randint(1, 7) for _ in range(len(SAMPLE))]
+    assert stream_in_chunks(cleaner, SAMPLE, sizes) == split_lines(cleaner.clean(SAMPLE))
+
+
+def test_marker_split_across_chunks():
+    cleaner = ContentCleaner()
+    stream = cleaner.stream()
+    assert stream.feed("前面<th") == "前面"
+    assert stream.feed("ink>隐藏</thi") == ""
+    assert stream.in_block
+    assert stream.feed("nk>后面") == "后面"
+    assert stream.finish() == ""
+
+
+def test_finish_drops_unclosed_block():
+    stream = ContentCleaner().stream()
+    assert stream.lines("标题\n<think>想法") == ["标题"]
+    assert stream.finish_lines() == []
+
+
+def test_unclosed_marker_is_held_until_closed_or_finished():
+    stream = ContentCleaner().stream()
+    assert stream.feed("前面<!-- 可能") == "前面"
+    assert stream.in_block
+    assert stream.feed("是注释") == ""
+    assert stream.finish() == "<!-- 可能是注释"
+    stream = ContentCleaner().stream()
+    assert stream.feed("前面<!-- 注释 -") == "前面"
+    assert stream.feed("->后面") == "后面"
+
+
+def test_model_specific_blocks(monkeypatch):
+    monkeypatch.setitem(MODEL_BLOCKS, "testmodel", ())
+    register_blocks("testmodel", Block("<x>", "</x>"))
+    try:
+        assert cleaner_for("TestModel:7b").clean("a<x>b</x>c") == "ac"
+        assert cleaner_for("other").clean("a<x>b</x>c") == "a<x>b</x>c"
+        # 多个后端使用不同模型时合并所有标记
+        assert cleaner_for("other", "testmodel").clean("a<x>b</x>c") == "ac"
+    finally:
+        cleaner_for.cache_clear()
@@ -0,0 +1,78 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+import xiaohongshu_generator as generator
+from image_output import MIN_QUALITY, OutputOptions, encode_image, finish_capture, resize_capture
+
+
+@pytest.fixture(scope="module")
+def noise():
+    """随机噪声图：有损压缩后的大小随质量明显变化"""
+    rng = random.Random(0)
+    return Image.frombytes("RGB", (160, 160), bytes(rng.getrandbits(8) for _ in range(160 * 160 * 3)))
+
+
+def png_bytes(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_search_finds_highest_quality_within_target(noise):
+    full = encode_image(noise, OutputOptions("jpeg", quality=90, scale=1))
+    encoded = encode_image(noise, OutputOptions("jpeg", quality=90, scale=1, target_bytes=full.size // 2))
+    assert MIN_QUALITY <= encoded.quality < 90
+    assert encoded.size <= full.size // 2
+    assert not encoded.over_target
+    higher = encode_image(noise, OutputOptions("jpeg", quality=encoded.quality + 1, scale=1))
+    assert higher.size > full.size // 2
+
+
+def test_unreachable_target_reports_lowest_quality_tried(noise):
+    encoded = encode_image(noise, OutputOptions("webp", quality=80, scale=1, target_bytes=100))
+    assert encoded.quality == MIN_QUALITY
+    assert encoded.over_target and encoded.info()["over_target"]
+
+
+def test_quality_at_or_below_minimum_is_reported_as_used(noise):
+    encoded = encode_image(noise, OutputOptions("jpeg", quality=5, scale=1, target_bytes=100))
+    assert encoded.quality == 5
+    assert encoded.over_target
+    assert encoded.data == encode_image(noise, OutputOptions("jpeg", quality=5, scale=1)).data
+
+
+def test_png_over_target_is_flagged(noise):
+    encoded = encode_image(noise, OutputOptions("png", scale=1, target_bytes=100))
+    assert encoded.quality is None and encoded.over_target
+    assert not encode_image(noise, OutputOptions("png", scale=1)).over_target
+
+
+def test_finish_capture_keeps_matching_data(noise):
+    data = png_bytes(noise)
+    encoded = finish_capture(data, OutputOptions("png", scale=1), capture_ms=3)
+    assert encoded.data == data and encoded.encode_ms == 3
+    converted = finish_capture(data, OutputOptions("webp", quality=70, scale=1))
+    assert Image.open(io.BytesIO(converted.data)).format == "WEBP"
+
+
+def test_resize_capture(noise):
+    data = png_bytes(noise)
+    assert resize_capture(data, 160, 160) is data
+    assert Image.open(io.BytesIO(resize_capture(data, 320, 320))).size == (320, 320)
+
+
+class FakeElement:
+    """没有CDP的驱动返回的元素：截图按设备像素比1输出"""
+
+    def __init__(self, image: Image.Image):
+        self.size = {"width": image.width, "height": image.height}
+        self.screenshot_as_png = png_bytes(image)
+
+
+@pytest.mark.parametrize("scale", [1, 1.5, 2])
+def test_screenshot_fallback_honours_scale(noise, scale):
+    data = generator._screenshot_element(object(), FakeElement(noise), OutputOptions("png", scale=scale))
+    assert Image.open(io.BytesIO(data)).size == (round(160 * scale), round(160 * scale))
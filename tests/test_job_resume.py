@@ -0,0 +1,170 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import xiaohongshu_generator as generator
+from job_store import MemoryJobStore
+
+TITLE = "周末宅家指南"
+PARAGRAPHS = ["第一段内容", "第二段内容", "第三段内容"]
+
+
+def fake_output(image_path: Path) -> dict:
+    return {"format": "png", "bytes": image_path.stat().st_size, "width": 1, "height": 1}
+
+
+@pytest.fixture
+def fake_render(monkeypatch, tmp_path):
+    """替换模型和浏览器：文案固定，截图写入临时文件，每段一页"""
+    store = MemoryJobStore()
+    monkeypatch.setattr(generator, "job_store", store)
+    monkeypatch.setattr(generator, "PAGINATION_MODE", "browser")
+    failures = {"article": 0}
+
+    async def generate_article(request):
+        return TITLE, "\n\n".join(PARAGRAPHS)
+
+    def capture(name: str) -> tuple[str, dict]:
+        image_path = tmp_path / name
+        image_path.write_bytes(b"png")
+        return str(image_path), fake_output(image_path)
+
+    def save_pages(pages, request_id="", **kwargs):
+        captured = [capture(f"{request_id}-{page['page_index']}.png") for page in pages]
+        return [path for path, _ in captured], [output for _, output in captured]
+
+    def save_article(paragraphs, request_id="", **kwargs):
+        if failures["article"]:
+            failures["article"] -= 1
+            raise RuntimeError("浏览器崩溃")
+        captured = [capture(f"{request_id}-article-{index}.png") for index in range(len(paragraphs))]
+        return list(paragraphs), [path for path, _ in captured], [output for _, output in captured]
+
+    monkeypatch.setattr(generator, "generate_article", generate_article)
+    monkeypatch.setattr(generator, "save_html_and_capture_pages", save_pages)
+    monkeypatch.setattr(generator, "save_html_and_capture_article", save_article)
+    return store, failures
+
+
+def test_batch_retry_after_failed_article_render_returns_every_page(fake_render):
+    store, failures = fake_render
+    failures["article"] = 1
+    client = TestClient(generator.app)
+    body = {"topic": "周末", "request_id": "retry-batch"}
+
+    assert client.post("/generate/batch", json=body).status_code == 500
+    assert store.get_job("retry-batch") is None  # 没有内容页的任务不会被保存
+
+    response = client.post("/generate/batch", json=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["total_pages"] == len(PARAGRAPHS)
+    assert [page["content"] for page in result["pages"][1:]] == PARAGRAPHS
+    assert all(Path(page["image_path"]).exists() for page in result["pages"])
+
+
+def test_generate_retry_after_failed_article_render_returns_every_page(fake_render):
+    store, failures = fake_render
+    failures["article"] = 1
+    client = TestClient(generator.app)
+    body = {"topic": "周末", "request_id": "retry-single"}
+
+    assert client.post("/generate", json=body).status_code == 500
+    response = client.post("/generate", json=body)
+    assert response.status_code == 200
+    assert response.json()["total_pages"] == len(PARAGRAPHS)
+    last = client.post("/generate", json={**body, "page_index": str(len(PARAGRAPHS))}).json()
+    assert last["content"] == PARAGRAPHS[-1]
+
+
+def test_batch_records_title_page_of_browser_paginated_job(fake_render):
+    store, _ = fake_render
+    client = TestClient(generator.app)
+    result = client.post("/generate/batch", json={"topic": "周末", "request_id": "title-page"}).json()
+    job = store.get_job("title-page")
+    assert generator.is_page_done(job, 0)
+    assert job["pages"][0]["image_path"] == result["pages"][0]["image_path"]
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def fake_stream(monkeypatch, text: str, fail_after: int = None):
+    """模型按行输出 text，fail_after 行之后断开"""
+    async def stream_llm(prompt, cache_mode="bypass", variations=1):
+        for number, line in enumerate(text.splitlines(keepends=True)):
+            if fail_after is not None and number >= fail_after:
+                raise ConnectionError("模型连接断开")
+            yield line
+
+    monkeypatch.setattr(generator, "stream_llm", stream_llm)
+
+
+def long_article(count: int = 30) -> list[str]:
+    return [f"第{index}段" + "内容很长的一段文字，" * (index * 7 % 25 + 3) for index in range(count)]
+
+
+def test_incremental_paginator_matches_full_pagination(monkeypatch):
+    monkeypatch.setattr(generator, "add_emojis_and_styling", lambda text: text)
+    paragraphs = long_article()
+    paginator = generator.IncrementalPaginator(TITLE)
+    pages = [page for paragraph in paragraphs for page in paginator.add(paragraph)]
+    pages += paginator.finish()
+    assert pages == generator.calculate_content_pages("\n\n".join(paragraphs), title=TITLE)
+
+
+def test_incremental_paginator_lays_out_only_the_open_page(monkeypatch):
+    sizes = []
+    paginate = generator.layout_engine.paginate
+
+    def counting(paragraphs, **kwargs):
+        sizes.append(len(paragraphs))
+        return paginate(paragraphs, **kwargs)
+
+    monkeypatch.setattr(generator.layout_engine, "paginate", counting)
+    paginator = generator.IncrementalPaginator(TITLE)
+    emitted = 0
+    for paragraph in long_article(200):
+        emitted += len(paginator.add(paragraph))
+    assert emitted > 20
+    assert max(sizes) < 10  # 与已经输出的段落数无关
+
+
+def test_stream_saves_complete_job(fake_render, monkeypatch):
+    store, _ = fake_render
+    fake_stream(monkeypatch, "\n".join([TITLE, *PARAGRAPHS]))
+    client = TestClient(generator.app)
+    response = client.post("/generate/stream", json={"topic": "周末", "request_id": "stream-ok"})
+    events = parse_events(response.text)
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] in ("title", "page") and kinds[-1] == "done"
+    done = events[-1][1]
+    assert kinds.count("page") == done["total_pages"] >= 1
+    job = store.get_job("stream-ok")
+    assert job["complete"] and job["total_pages"] == done["total_pages"]
+    assert client.get("/jobs/stream-ok").json()["completed"]
+
+
+def test_interrupted_stream_is_regenerated_on_resume(fake_render, monkeypatch):
+    store, _ = fake_render
+    fake_stream(monkeypatch, "\n".join([TITLE, *long_article()]), fail_after=25)
+    client = TestClient(generator.app)
+    body = {"topic": "周末", "request_id": "stream-cut"}
+    events = parse_events(client.post("/generate/stream", json=body).text)
+    assert events[-1][0] == "error"
+    job = store.get_job("stream-cut")
+    assert job is not None and not job["complete"]
+    assert not client.get("/jobs/stream-cut").json()["completed"]
+
+    # 不完整的任务不能按页继续渲染，重新请求时生成整篇文章
+    assert client.post("/generate", json={**body, "page_index": "1"}).status_code == 409
+    result = client.post("/generate/batch", json=body).json()
+    assert [page["content"] for page in result["pages"][1:]] == PARAGRAPHS
+    assert store.get_job("stream-cut")["complete"]
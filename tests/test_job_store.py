@@ -0,0 +1,118 @@
+import sqlite3
+import time
+
+import pytest
+
+from job_store import (
+    JobStore, MemoryJobStore, SQLiteJobStore, PAGE_DONE, PAGE_PENDING, create_job_store
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(tmp_path / "jobs.db")
+
+
+def test_incomplete_store_fails_on_instantiation():
+    class Incomplete(JobStore):
+        def save_job(self, *args, **kwargs):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_save_and_get_job(store):
+    store.save_job("r1", "标题", ["第一页", "第二页"], topic="周末", style="轻松")
+    job = store.get_job("r1")
+    assert job["title"] == "标题"
+    assert job["content_pages"] == ["第一页", "第二页"]
+    assert job["total_pages"] == 2
+    assert job["topic"] == "周末"
+    assert job["pages"] == {}
+
+
+def test_page_status_survives_job_update(store):
+    store.save_job("r1", "标题", ["一"])
+    store.set_page_status("r1", 0, PAGE_PENDING)
+    store.set_page_status("r1", 0, PAGE_DONE, "out/0.png", output={"format": "png", "bytes": 10})
+    store.save_job("r1", "标题", ["一", "二"])
+    page = store.get_job("r1")["pages"][0]
+    assert page == {"status": PAGE_DONE, "image_path": "out/0.png", "output": {"format": "png", "bytes": 10}}
+
+
+def test_expired_jobs_are_hidden_and_evicted(store):
+    store.save_job("old", "旧", ["一"], ttl=-1)
+    store.save_job("new", "新", ["一"])
+    assert store.get_job("old") is None
+    assert store.evict_expired() == 1
+    assert store.get_job("new") is not None
+
+
+def test_page_status_for_missing_job_is_ignored(store):
+    store.set_page_status("gone", 1, PAGE_DONE, "out/1.png")
+    assert store.get_job("gone") is None
+    store.save_job("gone", "标题", ["一"])
+    assert store.get_job("gone")["pages"] == {}
+
+
+def test_render_finishing_after_eviction_leaves_no_orphan(tmp_path):
+    store = SQLiteJobStore(tmp_path / "jobs.db")
+    store.save_job("r1", "标题", ["一"], ttl=-1)
+    store.set_page_status("r1", 0, PAGE_PENDING)
+    assert store.evict_expired() == 1
+    store.set_page_status("r1", 0, PAGE_DONE, "out/0.png")
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] == 0
+
+
+def test_evict_removes_orphan_pages_left_by_older_versions(tmp_path):
+    store = SQLiteJobStore(tmp_path / "jobs.db")
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        conn.execute(
+            "INSERT INTO pages (request_id, page_index, status, updated_at) VALUES ('orphan', 0, 'done', ?)",
+            (time.time(),)
+        )
+    store.evict_expired()
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] == 0
+
+
+def test_delete_job(store):
+    store.save_job("r1", "标题", ["一"])
+    store.set_page_status("r1", 0, PAGE_DONE)
+    store.delete_job("r1")
+    assert store.get_job("r1") is None
+
+
+def test_create_job_store(tmp_path):
+    assert isinstance(create_job_store("memory"), MemoryJobStore)
+    assert isinstance(create_job_store(f"sqlite:///{tmp_path / 'jobs.db'}"), SQLiteJobStore)
+    with pytest.raises(ValueError):
+        create_job_store("redis://localhost")
+
+
+def test_incomplete_flag(store):
+    store.save_job("r1", "标题", ["一"], complete=False)
+    assert store.get_job("r1")["complete"] is False
+    store.save_job("r1", "标题", ["一", "二"])
+    assert store.get_job("r1")["complete"] is True
+
+
+def test_jobs_saved_by_older_versions_are_complete(tmp_path):
+    with sqlite3.connect(tmp_path / "jobs.db") as conn:
+        conn.execute("""
+            CREATE TABLE jobs (
+                request_id TEXT PRIMARY KEY, topic TEXT NOT NULL DEFAULT '', style TEXT NOT NULL DEFAULT '',
+                title TEXT NOT NULL, content_pages TEXT NOT NULL,
+                created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "INSERT INTO jobs VALUES ('old', '', '', '标题', '[\"一\"]', ?, ?, ?)",
+            (time.time(), time.time(), time.time() + 60)
+        )
+    store = SQLiteJobStore(tmp_path / "jobs.db")
+    assert store.get_job("old")["complete"] is True
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import xiaohongshu_generator as generator
+from fake_ollama import create_app
+from keep_alive import format_keep_alive, parse_keep_alive
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("30m", 1800),
+    ("1h30m", 5400),
+    ("5m0s", 300),
+    ("1.5h", 5400),
+    ("250ms", 0.25),
+    ("100us", 1e-4),
+    ("2h45m30.5s", 9930.5),
+    ("0", 0),
+    ("90", 90),
+    (90, 90),
+    (2.5, 2.5),
+    (" 10s ", 10),
+])
+def test_parse_durations(value, seconds):
+    assert parse_keep_alive(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", ["-1", -1, "-1m", "-1h30m"])
+def test_negative_means_forever(value):
+    assert parse_keep_alive(value) is None
+
+
+@pytest.mark.parametrize("value", ["", "m", "1d", "1h30", "h1", "30 m", "1h-30m", "abc", True, "1e3s"])
+def test_invalid_values_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_keep_alive(value)
+
+
+def test_format_for_ollama():
+    assert format_keep_alive(None) == -1
+    assert format_keep_alive(1800) == "1800s"
+    assert format_keep_alive(0.25) == "0.25s"
+    assert parse_keep_alive(format_keep_alive(5400.5)) == 5400.5
+
+
+def test_window_uses_parsed_duration(monkeypatch):
+    monkeypatch.setattr(generator, "OLLAMA_KEEP_ALIVE_SECONDS", 5400)
+    monkeypatch.setitem(generator._keep_alive_window, "active", False)
+    assert generator.current_keep_alive() == "5400s"
+    monkeypatch.setitem(generator._keep_alive_window, "active", True)
+    monkeypatch.setitem(generator._keep_alive_window, "until", generator.time.monotonic() + 60)
+    monkeypatch.setitem(generator._keep_alive_window, "after", 5400)
+    assert generator.current_keep_alive() == "5460s"
+    monkeypatch.setitem(generator._keep_alive_window, "until", None)
+    assert generator.current_keep_alive() == -1
+
+
+def test_invalid_keep_alive_is_rejected_when_set():
+    client = TestClient(generator.app)
+    response = client.post("/model/keep-alive", json={"duration": 60, "keep_alive": "1h30"})
+    assert response.status_code == 400
+    assert generator._keep_alive_window["active"] is False
+
+
+def test_fake_ollama_accepts_go_durations_and_rejects_bad_values():
+    client = TestClient(create_app(ttft=0, tokens_per_second=0))
+    for value in ("1h30m", "5m0s", -1, format_keep_alive(1800.5)):
+        assert client.post("/api/generate", json={"prompt": "", "stream": False, "keep_alive": value}).status_code == 200
+    response = client.post("/api/generate", json={"prompt": "", "stream": False, "keep_alive": "1h30"})
+    assert response.status_code == 400
+    assert "error" in response.json()
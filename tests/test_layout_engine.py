@@ -0,0 +1,127 @@
+import gc
+import random
+import weakref
+
+import pytest
+
+from layout_engine import (
+    NO_LINE_END,
+    NO_LINE_START,
+    LayoutEngine,
+    PageGeometry,
+    break_lines,
+    load_font_metrics,
+    split_markup,
+    strip_markup,
+)
+
+SPAN = '<span style="color:red">'
+
+
+@pytest.fixture
+def font():
+    return load_font_metrics(None)  # 使用估算的字宽，不依赖字体文件
+
+
+def test_split_markup_plain_text():
+    assert split_markup("你好世界", 2) == ("你好", "世界")
+
+
+def test_split_markup_closes_and_reopens_tags():
+    head, tail = split_markup(f"<b>前面{SPAN}你好世界</span>后面</b>", 4)
+    assert head == f"<b>前面{SPAN}你好</span></b>"
+    assert tail == f"<b>{SPAN}世界</span>后面</b>"
+
+
+def test_split_markup_counts_entities_as_one_character():
+    head, tail = split_markup("a&amp;b&lt;c", 3)
+    assert (head, tail) == ("a&amp;b", "&lt;c")
+    assert strip_markup(head) + strip_markup(tail) == "a&b<c"
+
+
+def test_split_markup_ignores_self_closing_tags():
+    assert split_markup("第一行<br/>第二行", 3) == ("第一行<br/>", "第二行")
+
+
+def test_split_markup_offset_beyond_text():
+    assert split_markup(f"{SPAN}短</span>", 5) == (f"{SPAN}短</span>", "")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_split_markup_keeps_visible_text(seed):
+    rng = random.Random(seed)
+    words = ["你好", "世界", "emoji🏠", "&amp;", "word "]
+    markup = "".join(
+        f"<b>{rng.choice(words)}</b>" if rng.random() < 0.3 else rng.choice(words) for _ in range(12)
+    )
+    text = strip_markup(markup)
+    offset = rng.randrange(1, len(text))
+    head, tail = split_markup(markup, offset)
+    # 拆分点两侧的空白会被去掉（换行处不显示空格），其余文字不变
+    joined = strip_markup(head) + strip_markup(tail)
+    assert joined.replace(" ", "") == text.replace(" ", "")
+    assert len(strip_markup(head).rstrip()) <= offset
+    assert head.count("<b>") == head.count("</b>")
+    assert tail.count("<b>") == tail.count("</b>")
+
+
+def test_break_lines_respects_width(font):
+    text = "今天天气很好" * 30
+    lines = break_lines(text, font, 24, 240)
+    assert "".join(text[start:end] for start, end in lines) == text
+    assert all(font.measure(text[start:end]) * 24 <= 240 + 1e-6 for start, end in lines)
+    assert len(lines) == len(text) // 10
+
+
+def test_break_lines_keeps_punctuation_off_line_start(font):
+    text = "这是一个测试，（括号）里面还有句号。" * 10
+    lines = break_lines(text, font, 24, 24 * 7)
+    for start, end in lines:
+        assert text[start] not in NO_LINE_START
+        assert text[end - 1] not in NO_LINE_END
+
+
+def test_break_lines_force_breaks_long_words(font):
+    word = "a" * 100
+    lines = break_lines(word, font, 20, 200)
+    assert "".join(word[start:end] for start, end in lines) == word
+    assert len(lines) > 1
+
+
+def test_break_lines_empty_text(font):
+    assert break_lines("", font, 24, 240) == [(0, 0)]
+
+
+def test_paginate_fits_pages_and_keeps_text():
+    engine = LayoutEngine(None, PageGeometry())
+    paragraphs = [f"第{i}段" + "内容很长的一段文字，" * (i * 7 % 40 + 3) for i in range(15)]
+    pages = engine.paginate(paragraphs, title="标题")
+
+    available = engine.available_height("标题")
+    assert len(pages) > 1
+    assert all(engine._page_height(page) <= available for page in pages)
+    assert engine._page_height(pages[-1]) + engine.hashtags_height() <= available
+    pieces = "".join(strip_markup(p) for page in pages for p in page)
+    assert pieces == "".join(paragraphs)
+
+
+def test_split_oversized_paragraph():
+    engine = LayoutEngine(None, PageGeometry())
+    paragraph = f"{SPAN}" + "很长的段落内容。" * 400 + "</span>"
+    pieces = engine.split_oversized(paragraph)
+    assert len(pieces) > 1
+    assert all(engine.paragraph_height(piece) <= engine.available_height() for piece in pieces)
+    assert all(piece.startswith(SPAN) and piece.endswith("</span>") for piece in pieces)
+
+
+def test_line_cache_is_per_instance():
+    narrow = LayoutEngine(None, PageGeometry(box_width=400))
+    wide = LayoutEngine(None, PageGeometry())
+    paragraph = "内容很长的一段文字，" * 20
+    assert len(narrow._paragraph_lines(paragraph)) > len(wide._paragraph_lines(paragraph))
+    assert wide._paragraph_lines.cache_info().currsize == 1
+
+    ref = weakref.ref(narrow)
+    del narrow
+    gc.collect()
+    assert ref() is None  # 缓存不会让实例一直存活
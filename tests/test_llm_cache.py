@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import xiaohongshu_generator as generator
+from llm_cache import LLMCache
+
+KEY = LLMCache.make_key("qwen2.5:7b", "提示词", {"temperature": 0.7})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(tmp_path / "llm_cache")
+
+
+def test_key_depends_on_model_prompt_and_params():
+    assert KEY == LLMCache.make_key("qwen2.5:7b", "提示词", {"temperature": 0.7})
+    assert KEY != LLMCache.make_key("qwen2.5:3b", "提示词", {"temperature": 0.7})
+    assert KEY != LLMCache.make_key("qwen2.5:7b", "提示词", {"temperature": 0.8})
+
+
+def test_variations_are_served_round_robin(cache):
+    cache.put(KEY, "一", variations=2)
+    assert cache.get(KEY, variations=2) is None  # 样本不足，需要继续生成
+    assert cache.get(KEY, variations=2, allow_partial=True) == "一"
+    cache.put(KEY, "二", variations=2)
+    cache.put(KEY, "三", variations=2)  # 样本已满，不再保存
+    assert [cache.get(KEY, variations=2) for _ in range(4)] == ["一", "二", "一", "二"]
+
+
+def test_replace_drops_the_oldest_sample(cache):
+    cache.put(KEY, "一", variations=2)
+    cache.put(KEY, "二", variations=2)
+    cache.put(KEY, "三", variations=2, replace=True)
+    assert {cache.get(KEY, variations=2) for _ in range(2)} == {"二", "三"}
+
+
+def test_expired_entries_are_ignored_and_evicted(tmp_path):
+    cache = LLMCache(tmp_path, max_age=60)
+    cache.put(KEY, "旧")
+    path = tmp_path / f"{KEY}.json"
+    entry = path.read_text(encoding="utf-8").replace('"created_at": ', '"created_at": -')
+    path.write_text(entry, encoding="utf-8")
+    assert cache.get(KEY) is None
+    cache.put("other", "新")
+    old = time.time() - 120
+    os.utime(tmp_path / "other.json", (old, old))
+    assert cache.evict() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(tmp_path):
+    cache = LLMCache(tmp_path, evict_every=1000)
+    for index, key in enumerate(("a", "b", "c")):
+        cache.put(key, "内容" * 100)
+        os.utime(tmp_path / f"{key}.json", (time.time() - 100 + index, time.time() - 100 + index))
+    cache.get("a")  # 读取会刷新修改时间
+    cache.max_bytes = 2 * (tmp_path / "a.json").stat().st_size
+    assert cache.evict() == 1
+    assert cache.get("a") is not None and cache.get("b") is None and cache.get("c") is not None
+
+
+def test_eviction_runs_every_n_puts(tmp_path):
+    cache = LLMCache(tmp_path, max_bytes=0, evict_every=3)
+    cache.put("a", "一")
+    cache.put("b", "二")
+    assert cache.stats()["entries"] == 2  # 还没到清理的时候
+    cache.put("c", "三")
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def fake_model(monkeypatch, cache):
+    """替换模型：每次调用返回带序号的文案，并记录调用次数"""
+    calls = []
+
+    async def stream_ollama(prompt):
+        calls.append(prompt)
+        yield f"标题{len(calls)}\n"
+        yield "正文"
+
+    monkeypatch.setattr(generator, "stream_ollama", stream_ollama)
+    monkeypatch.setattr(generator, "llm_cache", cache)
+    return calls
+
+
+def generate(mode: str, variations: int = 1) -> str:
+    return asyncio.run(generator.generate_with_ollama("提示词", mode, variations))
+
+
+def test_prefer_calls_the_model_once(fake_model):
+    assert generate("prefer") == "标题1\n正文"
+    assert generate("prefer") == "标题1\n正文"
+    assert len(fake_model) == 1
+
+
+def test_bypass_neither_reads_nor_writes(fake_model, cache):
+    generate("bypass")
+    generate("bypass")
+    assert len(fake_model) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_only_fails_on_miss_and_serves_cached_output(fake_model):
+    with pytest.raises(HTTPException) as error:
+        generate("only")
+    assert error.value.status_code == 404
+    generate("prefer")
+    assert generate("only") == "标题1\n正文"
+    assert len(fake_model) == 1
+
+
+def test_refresh_always_calls_the_model_and_updates_the_cache(fake_model):
+    generate("prefer")
+    assert generate("refresh") == "标题2\n正文"
+    assert generate("prefer") == "标题2\n正文"
+    assert len(fake_model) == 2
+
+
+def test_prefer_with_variations_fills_then_rotates(fake_model):
+    outputs = [generate("prefer", variations=2) for _ in range(5)]
+    assert len(fake_model) == 2
+    assert outputs[:2] == ["标题1\n正文", "标题2\n正文"]
+    assert set(outputs[2:]) == {"标题1\n正文", "标题2\n正文"}
+    assert outputs[2] != outputs[3]
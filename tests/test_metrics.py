@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def sampler():
+    samples = iter([100 * 1024 * 1024, 300 * 1024 * 1024, 200 * 1024 * 1024, 150 * 1024 * 1024])
+    metrics.sample_stage_memory(lambda: next(samples))
+    yield
+    metrics.sample_stage_memory(None)
+
+
+def test_span_records_stage_peak_memory(sampler):
+    timings = metrics.begin_request()
+    with metrics.span("render"):
+        pass
+    with metrics.span("render"):
+        pass
+    stage = timings.as_dict()["stages"]["render"]
+    assert stage["count"] == 2
+    assert stage["peak_rss_mb"] == 300.0
+
+
+def test_span_without_sampler_has_no_memory():
+    timings = metrics.begin_request()
+    with metrics.span("render"):
+        pass
+    assert "peak_rss_mb" not in timings.as_dict()["stages"]["render"]
+
+
+@pytest.mark.skipif(not Path("/proc/self/status").exists(), reason="需要Linux的 /proc")
+def test_process_tree_rss():
+    assert metrics.process_tree_rss(os.getpid()) > 0
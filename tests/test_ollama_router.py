@@ -0,0 +1,201 @@
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import HTTPException
+
+import xiaohongshu_generator as generator
+from fake_ollama import create_app
+from ollama_router import LATENCY, LEAST_OUTSTANDING, Backend, BackendRouter, NoBackendAvailable, parse_backends
+
+TEXT = "周末宅家指南\n\n第一段\n\n第二段"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeOllama:
+    """在后台线程中运行的 fake_ollama 服务"""
+
+    def __init__(self, port: int = None, **options):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        app = create_app(**{"text": TEXT, "ttft": 0, "tokens_per_second": 0, **options})
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> "FakeOllama":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise TimeoutError("fake_ollama 启动超时")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(10)
+
+    def stats(self) -> dict:
+        return httpx.get(f"{self.url}/stats").json()
+
+
+@pytest.fixture
+def fakes():
+    started = []
+
+    def start(count: int, **options) -> list[FakeOllama]:
+        servers = [FakeOllama(**options).start() for _ in range(count)]
+        started.extend(servers)
+        return servers
+
+    yield start
+    for server in started:
+        if not server.server.should_exit:
+            server.stop()
+
+
+@pytest.fixture
+def use_router(monkeypatch):
+    def install(servers, strategy=LEAST_OUTSTANDING) -> BackendRouter:
+        router = BackendRouter([Backend(server.url, "deepseek-r1:1.5b") for server in servers], strategy=strategy)
+        monkeypatch.setattr(generator, "llm_router", router)
+        return router
+
+    return install
+
+
+def run(coroutine):
+    """在新的事件循环中运行，结束时关闭绑定在这个循环上的共享HTTP客户端"""
+    async def wrapper():
+        try:
+            return await coroutine
+        finally:
+            await generator.close_http_client()
+
+    return asyncio.run(wrapper())
+
+
+def test_parse_backends():
+    backends = parse_backends("http://a:11434/, http://b:11434|qwen2.5:7b", "deepseek-r1:1.5b")
+    assert [(backend.url, backend.model) for backend in backends] == [
+        ("http://a:11434", "deepseek-r1:1.5b"), ("http://b:11434", "qwen2.5:7b")
+    ]
+    with pytest.raises(ValueError):
+        parse_backends(" ", "m")
+
+
+def test_choose_skips_unhealthy_and_excluded_backends():
+    a, b, c = Backend("http://a", "m"), Backend("http://b", "m"), Backend("http://c", "m")
+    a.healthy = b.healthy = True
+    router = BackendRouter([a, b, c])
+    with router.track(a):
+        assert router.choose() is b
+        assert router.choose(exclude=[b]) is a
+    with pytest.raises(NoBackendAvailable):
+        router.choose(exclude=[a, b])
+
+
+def test_latency_strategy_weighs_latency_by_outstanding():
+    fast, slow = Backend("http://fast", "m"), Backend("http://slow", "m")
+    fast.healthy = slow.healthy = True
+    fast.latency, slow.latency = 0.1, 0.25
+    router = BackendRouter([fast, slow], strategy=LATENCY)
+    assert router.choose() is fast
+    with router.track(fast), router.track(fast):
+        # 0.1 x 3 > 0.25 x 1
+        assert router.choose() is slow
+
+
+def test_least_outstanding_spreads_concurrent_requests(fakes, use_router):
+    servers = fakes(3, ttft=0.2)
+    router = use_router(servers)
+
+    async def scenario():
+        assert await generator.check_ollama_status()
+        return await asyncio.gather(*(generator.generate_with_ollama(f"提示词{i}") for i in range(9)))
+
+    results = run(scenario())
+    assert all(result == TEXT for result in results)
+    assert [server.stats()["requests"] for server in servers] == [3, 3, 3]
+    assert all(backend.outstanding == 0 for backend in router.backends)
+
+
+def test_fails_over_when_backend_is_killed_mid_run(fakes, use_router):
+    servers = fakes(2, ttft=0.1)
+    router = use_router(servers)
+    victim = servers[0]
+
+    async def scenario():
+        assert await generator.check_ollama_status()
+        tasks = []
+        for i in range(10):
+            tasks.append(asyncio.ensure_future(generator.generate_with_ollama(f"提示词{i}")))
+            if i == 3:
+                await asyncio.to_thread(victim.stop)
+            await asyncio.sleep(0.03)
+        return await asyncio.gather(*tasks)
+
+    results = run(scenario())
+    assert all(result == TEXT for result in results)
+    dead, alive = router.backends
+    assert not dead.healthy
+    assert dead.failures >= 1
+    assert router.failovers == dead.failures
+    assert alive.healthy
+    assert servers[1].stats()["requests"] >= 6
+
+
+def test_backend_becomes_healthy_again_after_probe(fakes, use_router):
+    [server] = fakes(1)
+    router = use_router([server])
+    backend = router.backends[0]
+
+    async def scenario():
+        client = generator.get_http_client()
+        assert await router.probe_all(client) == [backend]
+        server.stop()
+        with pytest.raises(HTTPException) as raised:
+            await generator.generate_with_ollama("提示词")
+        assert raised.value.status_code == 503
+        assert not backend.healthy
+        assert not await router.probe(backend, client)
+
+        # 同一个端口上重新启动后，下一次检查恢复可用
+        restarted = FakeOllama(port=server.port).start()
+        try:
+            assert await router.probe(backend, client)
+            assert backend.healthy and backend.model_available
+            assert await generator.generate_with_ollama("提示词") == TEXT
+        finally:
+            await asyncio.to_thread(restarted.stop)
+
+    run(scenario())
+
+
+def test_health_loop_probes_and_reports_recovery(fakes):
+    [server] = fakes(1)
+    backend = Backend(server.url, "deepseek-r1:1.5b")
+    router = BackendRouter([backend], health_interval=0.05)
+    recovered = []
+
+    async def on_recover(recovered_backend):
+        recovered.append(recovered_backend)
+
+    async def scenario():
+        async with httpx.AsyncClient() as client:
+            loop = asyncio.ensure_future(router.run_health_checks(lambda: client, on_recover=on_recover))
+            await asyncio.sleep(0.3)
+            loop.cancel()
+
+    asyncio.run(scenario())
+    assert backend.healthy
+    assert recovered == [backend]
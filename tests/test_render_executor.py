@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import xiaohongshu_generator as generator
+from xiaohongshu_generator import RenderExecutor, RenderQueueFull
+
+
+def test_admission_holds_a_slot_until_closed():
+    executor = RenderExecutor(workers=1, queue_depth=1)
+    first = executor.admit()
+    second = executor.admit()
+    assert executor.is_full()
+    with pytest.raises(RenderQueueFull):
+        executor.admit()
+    assert executor.stats()["rejected"] == 1
+    first.close()
+    first.close()  # 重复调用不会多归还
+    assert executor.stats()["reserved"] == 1
+    second.close()
+    assert not executor.is_full()
+    executor.shutdown()
+
+
+def test_admitted_pages_run_within_reserved_slots():
+    executor = RenderExecutor(workers=1, queue_depth=2)
+    release = threading.Event()
+
+    async def scenario():
+        admission = executor.admit(slots=2)
+        task = asyncio.ensure_future(admission.run_many([release.wait] * 5))
+        await asyncio.sleep(0.05)
+        # 五个页面只占用预留的两个名额，其他请求仍有一个名额
+        assert executor.stats()["streaming"] == 2
+        assert executor.stats()["pending"] == 0
+        assert not executor.is_full()
+        with pytest.raises(RenderQueueFull):
+            executor.admit(slots=2)
+        release.set()
+        assert await task == [True] * 5
+        admission.close()
+        assert executor.stats()["reserved"] == 0
+
+    asyncio.run(scenario())
+    executor.shutdown()
+
+
+def test_many_streams_never_exceed_the_bound():
+    executor = RenderExecutor(workers=2, queue_depth=2)
+    release = threading.Event()
+    peak = 0
+
+    async def scenario():
+        nonlocal peak
+        admissions = []
+        while True:
+            try:
+                admissions.append(executor.admit())
+            except RenderQueueFull:
+                break
+        assert len(admissions) == 4
+        tasks = [asyncio.ensure_future(admission.run_many([release.wait] * 10)) for admission in admissions]
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            stats = executor.stats()
+            peak = max(peak, stats["pending"] + stats["streaming"])
+        # 流式请求占满名额时，一次性提交的请求收到429
+        with pytest.raises(RenderQueueFull):
+            await executor.run(lambda: None)
+        release.set()
+        await asyncio.gather(*tasks)
+        for admission in admissions:
+            admission.close()
+
+    asyncio.run(scenario())
+    assert peak == 4
+    executor.shutdown()
+
+
+def test_stream_is_rejected_before_opening_when_queue_is_full(monkeypatch):
+    executor = RenderExecutor(workers=1, queue_depth=0)
+    monkeypatch.setattr(generator, "render_executor", executor)
+    admission = executor.admit()
+    client = TestClient(generator.app)
+    response = client.post("/generate/stream", json={"topic": "周末", "style": "轻松"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    admission.close()
+    executor.shutdown()
@@ -0,0 +1,127 @@
+import os
+import random
+import sys
+import threading
+
+import pytest
+from PIL import Image, ImageDraw
+
+import vision_anchor
+from vision_anchor import Match, OpenCVMatcher, PillowMatcher, Template
+
+
+def textured_screen(size=(400, 300), seed=1) -> Image.Image:
+    """有足够特征的测试画面：浅色背景上随机的色块"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for _ in range(120):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        w, h = rng.randint(4, 30), rng.randint(4, 30)
+        draw.rectangle((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return image
+
+
+def matchers():
+    yield PillowMatcher()
+    if vision_anchor.cv2 is not None:
+        yield OpenCVMatcher()
+
+
+@pytest.mark.parametrize("matcher", list(matchers()), ids=lambda matcher: type(matcher).__name__)
+def test_finds_template_at_its_position(matcher):
+    screen = textured_screen()
+    template = Template(screen.crop((150, 100, 198, 148)), offset=(24, 24))
+    found = matcher.match(screen, template)
+    assert (found.x, found.y) == (150, 100)
+    assert found.score > 0.95
+
+
+@pytest.mark.parametrize("matcher", list(matchers()), ids=lambda matcher: type(matcher).__name__)
+def test_finds_shifted_template(matcher):
+    template = Template(textured_screen().crop((150, 100, 198, 148)), offset=(24, 24))
+    shifted = Image.new("RGB", (400, 300), (245, 245, 245))
+    shifted.paste(textured_screen(), (13, -7))
+    found = matcher.match(shifted, template)
+    assert (found.x, found.y) == (163, 93)
+
+
+def test_blank_screen_does_not_match_mostly_white_template():
+    screen = textured_screen()
+    template = Template(screen.crop((150, 100, 198, 148)), offset=(24, 24))
+    assert PillowMatcher().match(Image.new("RGB", (400, 300), (255, 255, 255)), template) is None
+
+
+def test_missing_template_is_not_found():
+    template = Template(textured_screen(seed=1).crop((150, 100, 198, 148)), offset=(24, 24))
+    assert PillowMatcher().match(textured_screen(seed=2), template) is None
+
+
+def test_featureless_region_is_not_distinctive():
+    assert not Template(Image.new("RGB", (48, 48), (200, 200, 200)), (24, 24)).distinctive
+    assert Template(textured_screen().crop((150, 100, 198, 148)), (24, 24)).distinctive
+
+
+def test_template_larger_than_haystack():
+    template = Template(textured_screen().crop((0, 0, 48, 48)), (24, 24))
+    assert PillowMatcher().match(Image.new("RGB", (20, 20)), template) is None
+
+
+def test_template_is_rescaled_for_screen_scale(tmp_path):
+    path = tmp_path / "anchor.png"
+    textured_screen().crop((150, 100, 198, 148)).save(path)
+    template = Template.load(path, (24, 24), recorded_scale=1.0, scale=2.0)
+    assert template.size == (96, 96)
+
+
+def test_find_anchor_clicks_relative_to_moved_anchor(monkeypatch):
+    screen = textured_screen()
+    template = Template(screen.crop((150, 100, 198, 148)), offset=(24, 24))
+    # 界面向右下移动了 (10, 5)
+    moved = Image.new("RGB", screen.size, (245, 245, 245))
+    moved.paste(screen, (10, 5))
+    monkeypatch.setattr(vision_anchor, "_screen_region", lambda x, y, radius: (x - radius, y - radius, 2 * radius, 2 * radius))
+    monkeypatch.setattr(vision_anchor, "grab", lambda region: moved.crop(
+        (region[0], region[1], region[0] + region[2], region[1] + region[3])
+    ))
+    assert vision_anchor.find_anchor(template, 174, 124, radius=60, timeout=1) == (184, 129)
+
+
+def test_find_anchor_times_out_and_can_be_stopped(monkeypatch):
+    template = Template(textured_screen().crop((150, 100, 198, 148)), offset=(24, 24))
+    blank = Image.new("RGB", (120, 120), (255, 255, 255))
+    monkeypatch.setattr(vision_anchor, "_screen_region", lambda x, y, radius: (0, 0, 120, 120))
+    monkeypatch.setattr(vision_anchor, "grab", lambda region: blank)
+    assert vision_anchor.find_anchor(template, 60, 60, timeout=0.1) is None
+    stop = threading.Event()
+    stop.set()
+    assert vision_anchor.find_anchor(template, 60, 60, timeout=5, stop_event=stop) is None
+
+
+@pytest.mark.skipif(sys.platform.startswith("linux") and not os.environ.get("DISPLAY"),
+                    reason="需要X显示，可以在 xvfb-run 下运行")
+def test_capture_and_find_on_real_screen(tmp_path):
+    """在真实（或虚拟）屏幕上显示测试画面，录制锚点后再找到它"""
+    pytest.importorskip("pyautogui")
+    tkinter = pytest.importorskip("tkinter")
+    from PIL import ImageTk
+
+    screen = textured_screen()
+    root = tkinter.Tk()
+    root.overrideredirect(True)
+    root.geometry(f"{screen.width}x{screen.height}+0+0")
+    photo = ImageTk.PhotoImage(screen)
+    tkinter.Label(root, image=photo, borderwidth=0).place(x=0, y=0)
+    root.update()
+    root.after(300, root.quit)
+    root.mainloop()
+    try:
+        vision_anchor.screen_scale.cache_clear()
+        anchor = vision_anchor.capture_anchor(174, 124, size=48)
+        assert anchor is not None
+        image, offset, scale = anchor
+        image.save(tmp_path / "anchor.png")
+        template = Template.load(tmp_path / "anchor.png", offset, scale, vision_anchor.screen_scale())
+        assert vision_anchor.find_anchor(template, 174, 124, radius=80, timeout=2) == (174, 124)
+    finally:
+        root.destroy()
@@ -0,0 +1,207 @@
+"""视觉锚点：录制时在点击位置截取一小块参考图，播放时等它出现后再相对它点击
+
+匹配只在录制位置周围的有限区域内进行；模板在播放前一次性加载、转为灰度并按屏幕缩放比例缩放。
+有 OpenCV 时用 cv2.matchTemplate，否则用纯 Pillow 的由粗到细匹配。
+匹配函数只处理图片，不访问屏幕；截图通过 pyautogui 完成，在虚拟X显示（Xvfb）下同样可用。
+"""
+import functools
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageStat
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # OpenCV 是可选依赖，缺失时使用 Pillow 匹配
+    cv2 = None
+
+ANCHOR_SIZE = 48  # 录制时截取的锚点边长（逻辑像素）
+SEARCH_RADIUS = 200  # 播放时在录制位置周围多大范围内查找（逻辑像素）
+ANCHOR_TIMEOUT = 10.0  # 等待锚点出现的最长时间（秒）
+POLL_INTERVAL = 0.05  # 没找到时隔多久再截一次图（秒）
+COARSE_FACTOR = 4  # Pillow 匹配时先在缩小这么多倍的图上粗略查找
+COARSE_CANDIDATES = 3  # 粗略查找保留的候选位置数
+MIN_CONTRAST = 4.0  # 模板灰度的平均偏差低于这个值时（几乎是纯色）不能作为锚点
+
+
+@dataclass
+class Match:
+    """模板左上角在被搜索图片中的位置（像素）和相似度（0~1）"""
+    x: int
+    y: int
+    score: float
+
+
+class Template:
+    """预先处理好的锚点模板
+
+    offset 是点击位置相对模板左上角的偏移（逻辑像素）；
+    图片按 播放时的屏幕缩放 / 录制时的屏幕缩放 预先缩放，播放时不再处理。
+    """
+
+    def __init__(self, image: Image.Image, offset: tuple[int, int], scale: float = 1.0):
+        self.offset = tuple(offset)
+        self.scale = scale
+        self.image = image.convert("L")
+        # 灰度与其平均值的平均偏差，用来把差异换算成相似度，纯色背景不会被当成匹配
+        stat = ImageStat.Stat(self.image)
+        self.contrast = ImageStat.Stat(ImageChops.difference(
+            self.image, Image.new("L", self.image.size, round(stat.mean[0]))
+        )).mean[0]
+        factor = COARSE_FACTOR if min(self.image.size) >= COARSE_FACTOR * 4 else 1
+        self.coarse_factor = factor
+        self.coarse = self.image.reduce(factor) if factor > 1 else self.image
+        self.array = np.asarray(self.image) if cv2 is not None else None
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def distinctive(self) -> bool:
+        return self.contrast >= MIN_CONTRAST
+
+    @classmethod
+    def load(cls, path: Path, offset: tuple[int, int], recorded_scale: float = 1.0,
+             scale: float = 1.0) -> "Template":
+        with Image.open(path) as image:
+            image.load()
+        if abs(scale - recorded_scale) > 1e-6:
+            size = (round(image.width * scale / recorded_scale), round(image.height * scale / recorded_scale))
+            image = image.resize(size, Image.LANCZOS)
+        return cls(image, offset, scale)
+
+
+class PillowMatcher:
+    """只依赖 Pillow 的匹配：先在缩小的图上找出候选位置，再在原图上的邻近位置精确比较
+
+    相似度为 1 - 平均灰度差 / 模板自身的平均偏差，与模板的明暗和对比度无关。
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+
+    def match(self, haystack: Image.Image, template: Template) -> Match | None:
+        haystack = haystack.convert("L")
+        width, height = template.size
+        if width > haystack.width or height > haystack.height:
+            return None
+        factor = template.coarse_factor
+        coarse = haystack.reduce(factor) if factor > 1 else haystack
+        candidates = _scan(
+            coarse, template.coarse,
+            ((x, y) for y in range(coarse.height - template.coarse.height + 1)
+             for x in range(coarse.width - template.coarse.width + 1)),
+            keep=COARSE_CANDIDATES
+        )
+        positions = {
+            (x, y)
+            for _, cx, cy in candidates
+            for y in range(max(0, (cy - 1) * factor), min(haystack.height - height, (cy + 1) * factor) + 1)
+            for x in range(max(0, (cx - 1) * factor), min(haystack.width - width, (cx + 1) * factor) + 1)
+        }
+        [(_, x, y)] = _scan(haystack, template.image, sorted(positions), keep=1)
+        score = 1 - _difference(haystack, template.image, x, y) / max(template.contrast, MIN_CONTRAST)
+        return Match(x, y, score) if score >= self.threshold else None
+
+
+def _scan(haystack: Image.Image, template: Image.Image, positions, keep: int) -> list[tuple[float, int, int]]:
+    """比较每个位置的平均灰度差，返回差异最小的 keep 个 (差异, x, y)"""
+    width, height = template.size
+    best = []
+    for x, y in positions:
+        # 缩小到1x1得到整数的平均差异，比 ImageStat 快得多
+        difference = ImageChops.difference(haystack.crop((x, y, x + width, y + height)), template)
+        value = difference.reduce((width, height)).getpixel((0, 0))
+        if len(best) < keep or value < best[-1][0]:
+            best.append((value, x, y))
+            best.sort()
+            del best[keep:]
+            if value == 0 and keep == 1:
+                break
+    return best
+
+
+def _difference(haystack: Image.Image, template: Image.Image, x: int, y: int) -> float:
+    width, height = template.size
+    return ImageStat.Stat(ImageChops.difference(haystack.crop((x, y, x + width, y + height)), template)).mean[0]
+
+
+class OpenCVMatcher:
+    """cv2.matchTemplate（归一化相关系数）"""
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+
+    def match(self, haystack: Image.Image, template: Template) -> Match | None:
+        width, height = template.size
+        if width > haystack.width or height > haystack.height:
+            return None
+        result = cv2.matchTemplate(np.asarray(haystack.convert("L")), template.array, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        return Match(x, y, float(score)) if score >= self.threshold else None
+
+
+def default_matcher():
+    return OpenCVMatcher() if cv2 is not None else PillowMatcher()
+
+
+@functools.lru_cache(maxsize=1)
+def screen_scale() -> float:
+    """截图像素与 pyautogui 逻辑坐标之比（高分屏上通常为2）"""
+    import pyautogui
+    return pyautogui.screenshot().width / pyautogui.size().width
+
+
+def _screen_region(x: int, y: int, radius: int) -> tuple[int, int, int, int]:
+    """以 (x, y) 为中心、限制在屏幕内的区域（逻辑像素）"""
+    import pyautogui
+    screen_width, screen_height = pyautogui.size()
+    left, top = max(0, x - radius), max(0, y - radius)
+    right, bottom = min(screen_width, x + radius), min(screen_height, y + radius)
+    return left, top, right - left, bottom - top
+
+
+def grab(region: tuple[int, int, int, int]) -> Image.Image:
+    """截取屏幕上的区域（逻辑像素），返回截图像素的图片"""
+    import pyautogui
+    scale = screen_scale()
+    return pyautogui.screenshot(region=tuple(round(value * scale) for value in region))
+
+
+def capture_anchor(x: int, y: int, size: int = ANCHOR_SIZE) -> tuple[Image.Image, tuple[int, int], float] | None:
+    """录制时截取点击位置周围的参考图，返回 (图片, 点击位置相对图片左上角的偏移, 屏幕缩放)
+
+    截取的区域几乎是纯色、无法可靠匹配时返回None。
+    """
+    left, top, width, height = _screen_region(x, y, size // 2)
+    image = grab((left, top, width, height))
+    offset = (x - left, y - top)
+    if not Template(image, offset).distinctive:
+        return None
+    return image, offset, screen_scale()
+
+
+def find_anchor(template: Template, x: int, y: int, radius: int = SEARCH_RADIUS,
+                timeout: float = ANCHOR_TIMEOUT, stop_event=None, matcher=None) -> tuple[int, int] | None:
+    """在 (x, y) 周围等待锚点出现，返回应该点击的位置（逻辑像素）；超时或被停止时返回None"""
+    matcher = matcher or default_matcher()
+    region = _screen_region(x, y, radius)
+    deadline = time.perf_counter() + timeout
+    while True:
+        found = matcher.match(grab(region), template)
+        if found is not None:
+            return (
+                region[0] + round(found.x / template.scale) + template.offset[0],
+                region[1] + round(found.y / template.scale) + template.offset[1]
+            )
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        if stop_event is not None:
+            if stop_event.wait(min(POLL_INTERVAL, remaining)):
+                return None
+        else:
+            time.sleep(min(POLL_INTERVAL, remaining))
@@ -8,6 +8,7 @@ a = Analysis(
     binaries=[],
     datas=[
         ('fonts', 'fonts'),
+        ('templates', 'templates'),
         ('bg1.jpg', '.'),
         ('优设标题黑.ttf', '.'),
         ('No.14-上首水滴体.ttf', '.')
@@ -1,24 +1,43 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import Literal
 import httpx
 import os
 from datetime import datetime
-import pyautogui
 import time
 from pathlib import Path
-import jinja2
 import json
 import asyncio
 import logging
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import emoji
 import random
 import math
+import base64
+import functools
+import contextvars
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from browser_pool import BrowserPool, create_chrome_driver
+from asset_manager import AssetManager, FONT, BACKGROUND
+from font_subsetter import FontSubsetter
+from template_registry import TemplateRegistry, TITLE, CONTENT
+from image_output import OutputOptions, EncodedImage, encode_image, finish_capture, resize_capture
+import metrics
+from metrics import span
+from document_server import DocumentServer
+from llm_cache import LLMCache
+from keep_alive import parse_keep_alive, format_keep_alive
+from ollama_router import BackendRouter, NoBackendAvailable, parse_backends
+from content_cleaner import cleaner_for
+from layout_engine import LayoutEngine
+from raster_renderer import RasterRenderer
+from job_store import create_job_store, PAGE_PENDING, PAGE_DONE, PAGE_FAILED
 
 app = FastAPI()
 
@@ -30,221 +49,284 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # 修改保存目录配置
-SAVE_DIR = Path("generated_content")
+SAVE_DIR = Path(os.getenv("SAVE_DIR", "generated_content"))
 IMAGE_DIR = SAVE_DIR / "image"  # 添加图片目录
-HTML_DIR = SAVE_DIR  # HTML文件仍保存在根目录
+HTML_DIR = SAVE_DIR  # 模板引用的资源暂存在 HTML_DIR/assets 下
 
 # Ollama配置
-OLLAMA_URL = "http://localhost:11434"
-MODEL_NAME = "deepseek-r1:1.5b"
-
-# 修改标题页模板
-title_template_str = """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        @font-face {
-            font-family: 'YouSheTitleBlack';
-            src: url('优设标题黑.ttf') format('truetype');
-        }
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")  # 基准测试时指向 fake_ollama.py
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "deepseek-r1:1.5b")
+# 多个Ollama服务时用逗号分隔，| 后面可以指定该服务使用的模型，例如 "http://a:11434,http://b:11434|qwen2.5:7b"
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", OLLAMA_URL)
+OLLAMA_ROUTING = os.getenv("OLLAMA_ROUTING", "least_outstanding")  # least_outstanding 或 latency
+OLLAMA_HEALTH_TTL = float(os.getenv("OLLAMA_HEALTH_TTL", "30"))  # 后台健康检查的间隔（秒）
+OLLAMA_OPTIONS = {
+    "temperature": 0.7,  # 添加温度参数
+    "max_tokens": 500    # 限制生成长度
+}
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # 每次请求后模型保持加载的时间（"30m"、"1h30m"），-1表示一直保持
+OLLAMA_KEEP_ALIVE_SECONDS = parse_keep_alive(OLLAMA_KEEP_ALIVE)  # 启动时校验，格式不对直接报错
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") != "0"  # 启动时预先加载模型并计算提示词前缀
+llm_router = BackendRouter(
+    parse_backends(OLLAMA_BACKENDS, MODEL_NAME), strategy=OLLAMA_ROUTING, health_interval=OLLAMA_HEALTH_TTL
+)
+# 按模型去掉思考过程等内容，见 content_cleaner.MODEL_BLOCKS
+content_cleaner = cleaner_for(*llm_router.models)
 
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
+# 所有请求共用的提示词前缀，后面接主题和风格
+PROMPT_PREAMBLE = """请你扮演一个90后小红书博主，围绕下面给出的主题，按照指定的风格创作一篇文案。
+要求：
+1. 文案总字数控制在5000字之间
+2. 标题要简短吸引人，带有emoji，最多10字，需要能自然分成三行，标题严格限制在10字以内！
+3. 正文分段阐述，每段都要带emoji
+4. 使用网络流行语，要有年轻人的语气
+5. 内容要接地气，像朋友在聊天
+6. 每段都要简短有力，突出重点
+7. 使用中文标点符号"""
 
-        body {
-            margin: 0;
-            padding: 20px;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            min-height: 100vh;
-            background: #f5f5f5;
-        }
-        
-        .content-box {
-            width: 975px;
-            height: 1300px;
-            position: relative;
-            overflow: hidden;
-            background-image: url('bg1.jpg');
-            background-size: cover;
-            background-position: center;
-            display: flex;
-            align-items: center;
-        }
-        
-        .title-wrapper {
-            width: 100%;
-            padding: 60px;
-        }
-        
-        .title {
-            font-family: 'YouSheTitleBlack', sans-serif;
-            font-size: 150px;
-            color: #000;
-            line-height: 1;
-            text-align: center;
-            padding: 40px;
-            white-space: pre-line;
-            -webkit-font-smoothing: antialiased;
-            -moz-osx-font-smoothing: grayscale;
-            font-weight: normal;
-        }
-    </style>
-</head>
-<body>
-    <div class="content-box">
-        <div class="title-wrapper">
-            <div class="title">{{ title }}</div>
-        </div>
-    </div>
-</body>
-</html>
-"""
+# LLM输出缓存配置
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", str(SAVE_DIR / "llm_cache")))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_MAX_AGE = float(os.getenv("LLM_CACHE_MAX_AGE", str(7 * 24 * 3600)))
 
-# 修改内容页模板
-content_template_str = """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        @font-face {
-            font-family: 'ShangShouYuYuan';
-            src: url('No.14-上首水滴体.ttf') format('truetype');
-        }
+llm_cache = LLMCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_MAX_AGE)
 
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
+# 浏览器池配置
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))  # 最多同时存活的浏览器数量
+BROWSER_MAX_RENDERS = int(os.getenv("BROWSER_MAX_RENDERS", "50"))  # 每个浏览器渲染多少次后回收
+BROWSER_CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", "60"))  # 等待可用浏览器的超时时间
 
-        body {
-            margin: 0;
-            padding: 20px;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            min-height: 100vh;
-        }
-        
-        .content-box {
-            width: 975px;
-            height: 1300px;
-            position: relative;
-            overflow: hidden;
-            background-image: url('bg1.jpg');
-            background-size: cover;
-            background-position: center;
-        }
-        
-        .content-wrapper {
-            width: 100%;
-            height: 100%;
-            padding: 40px;
-            background: rgba(255, 255, 255, 0);  /* 降低白色背景的不透明度 */
-            backdrop-filter: blur(1px);  /* 减小模糊程度 */
-            display: flex;
-            flex-direction: column;
-        }
-        
-        .title {
-            font-family: 'ShangShouYuYuan', sans-serif;
-            font-size: 32px;
-            font-weight: 700;
-            color: #333;
-            text-align: center;
-            margin-top: 30px;  /* 增加顶部边距 */
-            margin-bottom: 30px;
-        }
-        
-        .content {
-            flex: 1;
-            font-family: 'ShangShouYuYuan', sans-serif;
-            font-size: 24px;
-            line-height: 1.8;
-            color: #333;
-            display: flex;
-            flex-direction: column;
-            gap: 25px;
-            padding: 30px 0;  /* 将顶部内边距从20px增加到30px */
-        }
-        
-        .paragraph {
-            margin: 0;
-            padding: 25px 30px;
-            text-align: justify;
-            background: rgba(255, 255, 255, 0.9);  /* 白色半透明背景 */
-            border-radius: 20px;  /* 增大圆角 */
-            box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1);  /* 轻微阴影 */
-            backdrop-filter: blur(5px);  /* 背景模糊效果 */
-            border: 2px solid rgba(0, 0, 0, 0.8);  /* 黑色描边 */
-            position: relative;  /* 为伪元素定位 */
-        }
-        
-        /* 添加双层效果 */
-        .paragraph::before {
-            content: '';
-            position: absolute;
-            top: -2px;
-            left: -2px;
-            right: -2px;
-            bottom: -2px;
-            border-radius: 20px;  /* 与段落相同的圆角 */
-            border: 1px solid rgba(0, 0, 0, 0.3);  /* 外层淡黑色边框 */
-            pointer-events: none;  /* 确保不影响交互 */
-        }
-        
-        .hashtags {
-            font-family: 'ShangShouYuYuan', sans-serif;
-            margin-top: auto;
-            padding: 15px;
-            font-size: 20px;
-            color: #666;
-            text-align: center;
-            background: rgba(255, 255, 255, 0.9);
-            border-radius: 15px;
-            backdrop-filter: blur(5px);
-            border: 2px solid rgba(0, 0, 0, 0.8);  /* 与段落相同的边框样式 */
-        }
-        
-        .macaron-text {
-            font-weight: 500;
-            text-shadow: 1px 1px 2px rgba(255, 255, 255, 0.8);
+browser_pool = BrowserPool(
+    size=BROWSER_POOL_SIZE,
+    max_renders=BROWSER_MAX_RENDERS,
+    checkout_timeout=BROWSER_CHECKOUT_TIMEOUT,
+    driver_factory=lambda: create_warm_driver()
+)
+
+# 截图配置
+# screenshot: 使用浏览器原生截图（默认，不需要网络）
+# html2canvas: 使用本地的 html2canvas.min.js，找不到时才从CDN加载
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "screenshot")
+CAPTURE_SCALE = float(os.getenv("CAPTURE_SCALE", "2"))  # 输出图片的缩放倍数，975x1300 -> 1950x2600
+HTML2CANVAS_JS = Path(os.getenv("HTML2CANVAS_JS", "html2canvas.min.js"))
+HTML2CANVAS_CDN = "https://html2canvas.hertzen.com/dist/html2canvas.min.js"
+RENDER_READY_TIMEOUT = 10  # 等待字体和图片就绪的超时时间（秒）
+
+# 输出图片配置（可按请求指定）
+# IMAGE_FORMAT: png / webp / jpeg；IMAGE_TARGET_BYTES: 有损格式的目标大小，按质量二分查找
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "png")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "90"))
+IMAGE_TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", "0")) or None
+DEFAULT_OUTPUT = OutputOptions(IMAGE_FORMAT, IMAGE_QUALITY, CAPTURE_SCALE, IMAGE_TARGET_BYTES)
+
+# 字体和背景图：启动时按内容哈希暂存到 HTML_DIR/assets，模板通过URL引用
+# 额外的字体和背景可以在 ASSET_MANIFEST 清单中注册（也可以覆盖下面的默认资源）
+ASSET_MANIFEST = Path(os.getenv("ASSET_MANIFEST", "assets.json"))
+asset_manager = AssetManager(HTML_DIR / "assets")
+asset_manager.register(FONT, "title", "优设标题黑.ttf")
+asset_manager.register(FONT, "content", os.getenv("CONTENT_FONT", "No.14-上首水滴体.ttf"))
+asset_manager.register(BACKGROUND, "default", "bg1.jpg")
+asset_manager.load_manifest(ASSET_MANIFEST)
+TITLE_FONT = asset_manager.source(FONT, "title")
+CONTENT_FONT = asset_manager.source(FONT, "content")
+BACKGROUND_IMAGE = asset_manager.source(BACKGROUND, "default")
+
+# 字体子集：每篇帖子只加载实际用到的字符（安装 brotli 时为WOFF2），按字符集合的哈希缓存
+FONT_SUBSETTING = os.getenv("FONT_SUBSETTING", "1") == "1"
+font_subsetter = FontSubsetter(
+    HTML_DIR / "assets" / "subsets",
+    max_files=int(os.getenv("FONT_SUBSET_MAX_FILES", "500"))
+)
+
+# 排版配置：分页时按内容页模板实际加载的字体测量字宽
+layout_engine = LayoutEngine(str(CONTENT_FONT))
+# 分页方式
+# measure: 按字体文件中的字宽在服务端计算（默认，不需要浏览器）
+# browser: 整篇文章加载进一个文档，由浏览器测量段落高度后分页，并在同一文档中截取每一页
+PAGINATION_MODE = os.getenv("PAGINATION_MODE", "measure")
+
+# 渲染方式（可按请求指定）
+# browser: 通过浏览器池渲染HTML模板并截图（默认）
+# raster: 不使用浏览器，按模板的布局直接用字体光栅化绘制
+RENDERER = os.getenv("RENDERER", "browser")
+EMOJI_FONT = os.getenv("EMOJI_FONT")  # 彩色emoji字体（如 NotoColorEmoji.ttf），未配置时光栅渲染跳过emoji
+raster_renderer = RasterRenderer(
+    BACKGROUND_IMAGE, TITLE_FONT, CONTENT_FONT,
+    layout=layout_engine,
+    emoji_font=EMOJI_FONT,
+    scale=CAPTURE_SCALE
+)
+
+# 渲染并发配置
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(BROWSER_POOL_SIZE)))  # 同时进行的渲染数量
+RENDER_QUEUE_DEPTH = int(os.getenv("RENDER_QUEUE_DEPTH", "8"))  # 允许排队等待的渲染数量
+RENDER_RETRY_AFTER = int(os.getenv("RENDER_RETRY_AFTER", "5"))  # 队列已满时建议客户端等待的秒数
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", str(RENDER_WORKERS)))  # 批量生成时同时使用的浏览器数量
+STREAM_RENDER_SLOTS = int(os.getenv("STREAM_RENDER_SLOTS", "1"))  # 每个流式请求最多同时渲染的页面数
+
+class RenderQueueFull(Exception):
+    """渲染队列已满"""
+
+class RenderExecutor:
+    """有界的渲染线程池
+
+    Selenium渲染是同步阻塞的，放到线程池中执行以免卡住事件循环。
+    正在执行和排队的任务总数超过 workers + queue_depth 时直接拒绝。
+    流式请求在开始时通过 admit() 准入并预留固定数量的名额，之后陆续提交的页面只在这些名额内执行，
+    超出的页面在请求内部等待，因此无论有多少页面，总数都不会超过上限。
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        self._pending = 0
+        self._reserved = 0  # 已准入、还没有结束的流式请求预留的名额数
+        self._streaming = 0  # 正在预留名额内执行的渲染数
+        self._rejected = 0
+        self._completed = 0
+
+    def is_full(self, slots: int = 1) -> bool:
+        """再加入 slots 个任务是否会超过上限"""
+        return self._pending + self._reserved + slots > self.workers + self.queue_depth
+
+    def admit(self, slots: int = STREAM_RENDER_SLOTS) -> "RenderAdmission":
+        """为陆续提交页面的请求（流式生成）做一次准入并预留 slots 个名额，队列已满时抛出 RenderQueueFull"""
+        slots = max(1, slots)
+        if self.is_full(slots):
+            self._rejected += 1
+            raise RenderQueueFull()
+        self._reserved += slots
+        return RenderAdmission(self, slots)
+
+    async def run(self, func, *args, **kwargs):
+        """在线程池中执行渲染函数并等待结果"""
+        results = await self.run_many([functools.partial(func, *args, **kwargs)])
+        return results[0]
+
+    async def run_many(self, calls: list) -> list:
+        """一次提交同一请求的多个渲染任务，整体准入后并行执行"""
+        if self.is_full():
+            self._rejected += 1
+            raise RenderQueueFull()
+        self._pending += len(calls)
+        try:
+            return await self._execute(calls)
+        finally:
+            self._pending -= len(calls)
+
+    async def _execute(self, calls: list) -> list:
+        """在线程池中并行执行，不做准入检查"""
+        try:
+            loop = asyncio.get_running_loop()
+            # 每个任务复制一份当前上下文，渲染线程中的耗时也能计入所属请求
+            futures = [
+                loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+                for call in calls
+            ]
+            return await asyncio.gather(*futures)
+        finally:
+            self._completed += len(calls)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "pending": self._pending,
+            "reserved": self._reserved,
+            "streaming": self._streaming,
+            "running": min(self._pending + self._streaming, self.workers),
+            "queued": max(0, self._pending + self._streaming - self.workers),
+            "completed": self._completed,
+            "rejected": self._rejected,
         }
-    </style>
-</head>
-<body>
-    <div class="content-box">
-        <div class="content-wrapper">
-            <div class="title">{{ title }}</div>
-            <div class="content">
-            {% for para in content.split('\n\n') %}
-                {% if para.strip() %}
-                <div class="paragraph">{{ para }}</div>
-                {% endif %}
-            {% endfor %}
-            </div>
-            {% if hashtags %}
-            <div class="hashtags">{{ hashtags }}</div>
-            {% endif %}
-        </div>
-    </div>
-</body>
-</html>
-"""
 
-# 创建Jinja2模板
-title_template = jinja2.Template(title_template_str)
-content_template = jinja2.Template(content_template_str)
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class RenderAdmission:
+    """已准入请求预留的名额，请求结束时调用 close() 归还
+
+    请求的页面不再被拒绝，但同时最多执行 slots 个，其余的在请求内部排队，
+    占用的始终是准入时预留的名额，不会挤占其他请求。
+    """
+
+    def __init__(self, executor: RenderExecutor, slots: int = 1):
+        self.executor = executor
+        self.slots = slots
+        self._semaphore = asyncio.Semaphore(slots)
+        self.closed = False
+
+    async def run_many(self, calls: list) -> list:
+        async def run(call):
+            async with self._semaphore:
+                self.executor._streaming += 1
+                try:
+                    [result] = await self.executor._execute([call])
+                finally:
+                    self.executor._streaming -= 1
+                return result
+        return await asyncio.gather(*map(run, calls))
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.executor._reserved -= self.slots
+
+render_executor = RenderExecutor(RENDER_WORKERS, RENDER_QUEUE_DEPTH)
+
+# 监控指标，通过 /metrics 以Prometheus文本格式导出
+LLM_TTFT = metrics.REGISTRY.histogram("xhs_llm_time_to_first_token_seconds", "模型返回第一个token的耗时（秒）")
+LLM_TOKENS_PER_SECOND = metrics.REGISTRY.histogram(
+    "xhs_llm_tokens_per_second", "模型生成速度（token/秒）",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+LLM_TOKENS = metrics.REGISTRY.counter("xhs_llm_tokens_total", "模型生成的token总数")
+LLM_FAILOVERS = metrics.REGISTRY.counter("xhs_llm_failovers_total", "后端出错后改用其他后端的次数", ("backend",))
+metrics.REGISTRY.gauge(
+    "xhs_llm_backend_outstanding", "各Ollama后端正在处理的请求数",
+    lambda: {(backend.url,): backend.outstanding for backend in llm_router.backends}, ("backend",)
+)
+metrics.REGISTRY.gauge(
+    "xhs_llm_backend_healthy", "各Ollama后端是否可用",
+    lambda: {(backend.url,): int(backend.healthy) for backend in llm_router.backends}, ("backend",)
+)
+REQUESTS = metrics.REGISTRY.counter("xhs_requests_total", "HTTP请求数", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.REGISTRY.histogram("xhs_request_duration_seconds", "HTTP请求耗时（秒）", ("endpoint",))
+PAGES_RENDERED = metrics.REGISTRY.counter("xhs_pages_rendered_total", "渲染完成的页面数", ("renderer", "format"))
+IMAGE_BYTES = metrics.REGISTRY.counter("xhs_image_bytes_total", "输出图片的总字节数", ("format",))
+
+# 在各阶段的耗时中附带进程树（含浏览器）的内存峰值，每次采样要遍历 /proc，只在基准测试时开启
+STAGE_MEMORY = os.getenv("STAGE_MEMORY", "0") == "1"
+if STAGE_MEMORY and Path("/proc/self/status").exists():
+    metrics.sample_stage_memory(functools.partial(metrics.process_tree_rss, os.getpid()))
+metrics.REGISTRY.gauge(
+    "xhs_render_tasks", "渲染线程池中的任务数", lambda: {
+        ("running",): render_executor.stats()["running"],
+        ("queued",): render_executor.stats()["queued"]
+    }, ("state",)
+)
+metrics.REGISTRY.gauge(
+    "xhs_browsers", "浏览器池中的浏览器数", lambda: {
+        ("idle",): browser_pool.stats()["idle"],
+        ("in_use",): browser_pool.stats()["in_use"]
+    }, ("state",)
+)
+
+def render_queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="渲染队列已满，请稍后重试",
+        headers={"Retry-After": str(RENDER_RETRY_AFTER)}
+    )
+
+# 页面模板：templates/<主题>/title.html 和 content.html，编译结果写入字节码缓存
+TEMPLATE_DIR = Path(os.getenv("TEMPLATE_DIR", "templates"))
+TEMPLATE_CACHE_DIR = Path(os.getenv("TEMPLATE_CACHE_DIR", str(SAVE_DIR / "template_cache")))
+template_registry = TemplateRegistry(TEMPLATE_DIR, TEMPLATE_CACHE_DIR)
+
+# 渲染好的HTML只保存在内存中，通过本地HTTP服务交给浏览器加载
+document_server = DocumentServer(HTML_DIR / "assets")
 
 class ContentRequest(BaseModel):
     topic: str
@@ -252,74 +334,306 @@ class ContentRequest(BaseModel):
     system_prompt: str = ""
     request_id: str = ""
     page_index: str = "0"  # 添加页面索引字段
+    job_ttl: float | None = None  # 任务保留时间（秒），默认 JOB_TTL
+    cache: Literal["bypass", "prefer", "only", "refresh"] = "bypass"  # LLM输出缓存：不使用 / 优先使用 / 只使用 / 重新生成并写入
+    variations: int = Field(default=1, ge=1, le=20)  # 每个提示词缓存的样本数，轮询返回
+    renderer: Literal["browser", "raster"] = RENDERER  # 渲染方式：浏览器截图 / 直接光栅化
+    background: str = "default"  # 背景图名称，需在资源清单中注册
+    theme: str = "default"  # 页面模板主题，对应 templates/ 下的子目录
+    image_format: Literal["png", "webp", "jpeg"] = IMAGE_FORMAT  # 输出图片格式
+    image_quality: int = Field(default=IMAGE_QUALITY, ge=1, le=100)  # 有损格式的质量（目标大小搜索的上限）
+    image_scale: float = Field(default=CAPTURE_SCALE, gt=0, le=4)  # 输出图片的缩放倍数
+    target_bytes: int | None = Field(default=IMAGE_TARGET_BYTES, gt=0)  # 每页图片的目标大小（字节）
+    include_timings: bool = False  # 在响应中附带各阶段的耗时
 
-# 使用字典来跟踪每个用户的生成状态
-user_generation_states = {}
+# 任务存储配置
+JOB_STORE_URL = os.getenv("JOB_STORE", f"sqlite:///{SAVE_DIR / 'jobs.db'}")  # memory 或 sqlite:///路径
+JOB_TTL = float(os.getenv("JOB_TTL", str(24 * 3600)))  # 任务默认保留一天
+JOB_EVICT_INTERVAL = 600  # 清理过期任务的间隔（秒）
 
-async def check_ollama_status():
-    """检查Ollama服务是否可用"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{OLLAMA_URL}/api/tags")
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                if not any(model["name"] == MODEL_NAME for model in models):
-                    print(f"警告: 模型 {MODEL_NAME} 未找到，请先下载")
-                return True
-    except Exception as e:
-        print(f"Ollama服务未启动: {str(e)}")
-        return False
+# 记录每个请求的标题、分页内容和每页的渲染状态，重启后可以继续渲染
+job_store = create_job_store(JOB_STORE_URL, default_ttl=JOB_TTL)
 
-async def generate_with_ollama(prompt: str) -> str:
-    """使用Ollama生成内容"""
-    if not await check_ollama_status():
-        logger.error("Ollama服务未启动")
-        raise HTTPException(status_code=503, detail="Ollama服务未启动")
+# 应用级共享的HTTP客户端，复用与Ollama之间的keep-alive连接
+_http_client: httpx.AsyncClient | None = None
+
+# 批量生成窗口：窗口内模型一直保持加载，结束后再按 OLLAMA_KEEP_ALIVE 计时
+_keep_alive_window = {
+    "active": False,
+    "until": None,  # time.monotonic() 时间，None表示直到手动结束
+    "after": OLLAMA_KEEP_ALIVE_SECONDS  # 窗口结束后模型保持加载的秒数，None表示一直保持
+}
+# 模型预热状态
+_model_warmup = {
+    "warmed": False,
+    "load_seconds": None
+}
+
+def current_keep_alive():
+    """当前请求应使用的 keep_alive（发送给Ollama的取值）
 
-    async with httpx.AsyncClient(timeout=60.0) as client:  # 增加超时时间
+    窗口有结束时间时，保持到窗口结束后再过窗口设置的时间，之后没有请求也会正常卸载。
+    """
+    if not _keep_alive_window["active"]:
+        return format_keep_alive(OLLAMA_KEEP_ALIVE_SECONDS)
+    until = _keep_alive_window["until"]
+    after = _keep_alive_window["after"]
+    if until is None or after is None:
+        return format_keep_alive(None)
+    remaining = until - time.monotonic()
+    if remaining <= 0:
+        _keep_alive_window.update(active=False, until=None, after=OLLAMA_KEEP_ALIVE_SECONDS)
+        return format_keep_alive(after)
+    return format_keep_alive(math.ceil(remaining + after))
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的HTTP客户端，未创建时按需创建"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def check_ollama_status() -> bool:
+    """立即检查所有Ollama后端，返回是否至少有一个可用"""
+    with span("ollama_health"):
+        recovered = await llm_router.probe_all(get_http_client())
+    if OLLAMA_WARMUP and _model_warmup["warmed"]:
+        # 启动之后才恢复的后端同样需要预热
+        for backend in recovered:
+            asyncio.create_task(warm_up_backend(backend))
+    return llm_router.available
+
+class BackendFailed(Exception):
+    """后端在产出第一个token之前出错，可以改用其他后端"""
+
+async def stream_ollama(prompt: str):
+    """流式调用Ollama，逐个产出生成的文本片段
+
+    后端由 llm_router 选择；在产出第一个片段之前出错时把该后端标记为不可用，改用下一个后端。
+    """
+    tried = []
+    failure = None
+    while True:
+        try:
+            backend = llm_router.choose(exclude=tried)
+        except NoBackendAvailable:
+            if failure is not None and isinstance(failure.__cause__, httpx.TimeoutException):
+                raise HTTPException(status_code=504, detail="生成超时，请重试")
+            # 所有后端都被标记为不可用时立即重新检查一次，不等后台检查
+            if tried or not await check_ollama_status():
+                logger.error("没有可用的Ollama后端")
+                detail = f"所有Ollama后端都不可用: {failure}" if tried else "Ollama服务未启动"
+                raise HTTPException(status_code=503, detail=detail)
+            continue
+        tried.append(backend)
         try:
-            logger.info("开始请求Ollama API")
-            response = await client.post(
-                f"{OLLAMA_URL}/api/generate",
+            async for token in stream_backend(backend, prompt):
+                yield token
+            return
+        except BackendFailed as e:
+            failure = e
+            backend.mark_down(str(e))
+            llm_router.failovers += 1
+            LLM_FAILOVERS.inc(backend=backend.url)
+            logger.warning(f"Ollama后端 {backend.url} 出错，改用其他后端: {str(e)}")
+
+async def stream_backend(backend, prompt: str):
+    """在一个后端上流式生成；产出第一个片段之前的连接错误抛出 BackendFailed"""
+    started = time.perf_counter()
+    first_token_at = None
+    try:
+        logger.info(f"开始请求Ollama API: {backend.url}")
+        with llm_router.track(backend), span("llm_generate"):
+            async with get_http_client().stream(
+                "POST",
+                f"{backend.url}/api/generate",
                 json={
-                    "model": MODEL_NAME,
+                    "model": backend.model,
                     "prompt": prompt,
                     "stream": True,
-                    "temperature": 0.7,  # 添加温度参数
-                    "max_tokens": 500    # 限制生成长度
+                    "keep_alive": current_keep_alive(),
+                    **OLLAMA_OPTIONS
                 }
-            )
-            response.raise_for_status()
-            
-            logger.info("开始接收流式响应")
-            full_response = ""
-            async for line in response.aiter_lines():
-                if line:
+            ) as response:
+                if response.status_code >= 500 or response.status_code == 404:
+                    # 服务出错或该后端没有这个模型
+                    raise BackendFailed(f"HTTP {response.status_code}")
+                response.raise_for_status()
+                
+                logger.info("开始接收流式响应")
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
                     try:
                         data = json.loads(line)
-                        if "response" in data:
-                            full_response += data["response"]
-                            print(".", end="", flush=True)
-                        if "error" in data:  # 检查错误信息
-                            logger.error(f"Ollama返回错误: {data['error']}")
-                            raise HTTPException(status_code=500, detail=data['error'])
                     except json.JSONDecodeError as e:
                         logger.warning(f"JSON解析错误: {str(e)}, line: {line}")
                         continue
+                    if "error" in data:  # 检查错误信息
+                        logger.error(f"Ollama返回错误: {data['error']}")
+                        if first_token_at is None:
+                            raise BackendFailed(data["error"])
+                        raise HTTPException(status_code=500, detail=data['error'])
+                    if data.get("response"):
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            backend.observe_latency(first_token_at - started)
+                            LLM_TTFT.observe(first_token_at - started)
+                            metrics.record("llm_ttft_seconds", first_token_at - started)
+                        yield data["response"]
+                    if data.get("done"):
+                        record_generation_speed(data, started, first_token_at)
 
-            if not full_response.strip():
-                logger.error("生成的内容为空")
-                raise HTTPException(status_code=500, detail="生成的内容为空")
-
-            logger.info("生成完成")
-            return full_response
-
-        except httpx.TimeoutException as e:
+    except (HTTPException, BackendFailed):
+        raise
+    except httpx.TransportError as e:
+        # 还没有产出内容时可以改用其他后端（超时也属于 TransportError）
+        if first_token_at is None:
+            raise BackendFailed(str(e) or type(e).__name__) from e
+        if isinstance(e, httpx.TimeoutException):
             logger.error(f"请求超时: {str(e)}")
             raise HTTPException(status_code=504, detail="生成超时，请重试")
-        except Exception as e:
-            logger.error(f"生成过程发生错误: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Ollama API错误: {str(e)}")
+        backend.mark_down(str(e))
+        logger.error(f"连接Ollama失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"连接Ollama失败: {str(e)}")
+    except Exception as e:
+        logger.error(f"生成过程发生错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ollama API错误: {str(e)}")
+
+def record_generation_speed(data: dict, started: float, first_token_at: float | None):
+    """根据Ollama最后一条消息中的 eval_count / eval_duration 记录生成速度"""
+    tokens = data.get("eval_count", 0)
+    duration = data.get("eval_duration", 0) / 1e9  # 纳秒
+    if not duration and first_token_at is not None:
+        duration = time.perf_counter() - first_token_at
+    if not tokens or duration <= 0:
+        return
+    LLM_TOKENS.inc(tokens)
+    LLM_TOKENS_PER_SECOND.observe(tokens / duration)
+    metrics.record("llm_tokens", tokens)
+    metrics.record("llm_tokens_per_second", tokens / duration)
+
+async def load_model(backend, prompt: str = "", keep_alive=None) -> dict:
+    """让一个后端加载模型，不生成内容（只生成一个token）
+
+    prompt 不为空时Ollama会同时计算它的KV缓存，之后以它开头的提示词可以直接复用。
+    返回Ollama的响应（包含 load_duration 等耗时，单位纳秒）。
+    """
+    response = await get_http_client().post(
+        f"{backend.url}/api/generate",
+        json={
+            "model": backend.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": keep_alive if keep_alive is not None else current_keep_alive(),
+            "options": {"num_predict": 1}
+        },
+        timeout=300.0  # 第一次加载模型可能需要较长时间
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def load_model_everywhere(keep_alive=None) -> int:
+    """让所有可用的后端加载模型，返回成功的后端数"""
+    backends = [backend for backend in llm_router.backends if backend.healthy]
+    results = await asyncio.gather(
+        *(load_model(backend, keep_alive=keep_alive) for backend in backends), return_exceptions=True
+    )
+    for backend, result in zip(backends, results):
+        if isinstance(result, Exception):
+            logger.warning(f"后端 {backend.url} 加载模型失败: {str(result)}")
+    return sum(not isinstance(result, Exception) for result in results)
+
+async def warm_up_backend(backend) -> bool:
+    """预先加载一个后端的模型，并让它缓存所有请求共用的提示词前缀，第一个请求不用再等待"""
+    started = time.perf_counter()
+    try:
+        with span("llm_warmup"):
+            data = await load_model(backend, PROMPT_PREAMBLE)
+    except Exception as e:
+        logger.warning(f"预热模型失败: {backend.url}: {str(e)}")
+        return False
+    load_seconds = data.get("load_duration", 0) / 1e9
+    _model_warmup.update(warmed=True, load_seconds=max(load_seconds, _model_warmup["load_seconds"] or 0))
+    logger.info(
+        f"模型已预热: {backend.model}@{backend.url}，加载 {load_seconds:.1f}s，"
+        f"共 {time.perf_counter() - started:.1f}s，keep_alive={current_keep_alive()}"
+    )
+    return True
+
+async def warm_up_model() -> bool:
+    """并发预热所有可用的后端，至少一个成功时返回True"""
+    results = await asyncio.gather(
+        *(warm_up_backend(backend) for backend in llm_router.backends if backend.healthy)
+    )
+    return any(results)
+
+def model_status() -> dict:
+    until = _keep_alive_window["until"]
+    return {
+        "model": MODEL_NAME,
+        "keep_alive": current_keep_alive(),
+        "window": _keep_alive_window["active"],
+        "window_remaining_seconds": round(until - time.monotonic(), 1) if _keep_alive_window["active"] and until else None,
+        **_model_warmup,
+        "router": llm_router.stats()
+    }
+
+async def stream_llm(prompt: str, cache_mode: str = "bypass", variations: int = 1):
+    """带缓存的流式生成
+
+    - bypass: 不读也不写缓存
+    - prefer: 命中时直接返回缓存，否则调用模型并写入缓存
+    - only: 只读缓存，未命中时返回404
+    - refresh: 不读缓存，调用模型后写入缓存（样本已满时替换最早的样本）
+    variations 大于1时每个提示词缓存多个样本，样本不足时继续调用模型补充。
+    缓存的读写在线程中进行，不阻塞事件循环。
+    """
+    if cache_mode == "bypass":
+        async for token in stream_ollama(prompt):
+            yield token
+        return
+    
+    # 各后端的模型都计入缓存键，只有一个后端时与原来的键相同
+    key = LLMCache.make_key(",".join(llm_router.models), prompt, OLLAMA_OPTIONS)
+    cached = None
+    if cache_mode != "refresh":
+        cached = await asyncio.to_thread(llm_cache.get, key, variations, allow_partial=(cache_mode == "only"))
+    if cached is not None:
+        logger.info(f"命中LLM缓存: {key[:12]}")
+        yield cached
+        return
+    if cache_mode == "only":
+        raise HTTPException(status_code=404, detail="LLM缓存未命中")
+    
+    parts = []
+    async for token in stream_ollama(prompt):
+        parts.append(token)
+        yield token
+    text = "".join(parts)
+    if text.strip():
+        await asyncio.to_thread(llm_cache.put, key, text, variations, replace=(cache_mode == "refresh"))
+
+async def generate_with_ollama(prompt: str, cache_mode: str = "bypass", variations: int = 1) -> str:
+    """使用Ollama生成内容"""
+    parts = [token async for token in stream_llm(prompt, cache_mode, variations)]
+    full_response = "".join(parts)
+
+    if not full_response.strip():
+        logger.error("生成的内容为空")
+        raise HTTPException(status_code=500, detail="生成的内容为空")
+
+    logger.info(f"生成完成，共 {len(parts)} 个片段")
+    return full_response
 
 def get_element_position(html_path):
     """获取内容盒子的位置"""
@@ -340,6 +654,7 @@ def get_element_position(html_path):
     
     return x, y, 975, 1300
 
+@span("decorate")
 def add_emojis_and_styling(text: str) -> str:
     """添加emoji装饰和马卡龙色系文字样式"""
     # 马卡龙色系列表
@@ -403,101 +718,413 @@ def add_emojis_and_styling(text: str) -> str:
     
     return text
 
-def save_html_and_capture_div(content: str, hashtags: str, is_first: bool = False, title: str = "", page_index: int = 0) -> tuple[str, str]:
-    """保存HTML并捕获指定div为图片"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # 确保字体文件和背景图片存在并复制
-    font_files = {
-        Path("优设标题黑.ttf"): "标题字体",
-        Path("No.42-上首芋圆体.ttf"): "内容字体",
-        Path("bg1.jpg"): "背景图片"
+def new_request_id() -> str:
+    """生成请求ID，秒级时间戳加随机后缀，并发请求不会重复"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def validate_request_id(request_id: str) -> str:
+    """请求ID会用作目录名，只允许字母、数字、下划线和连字符"""
+    if not re.fullmatch(r"[A-Za-z0-9_\-]{1,64}", request_id):
+        raise HTTPException(status_code=400, detail=f"无效的请求ID: {request_id}")
+    return request_id
+
+def validate_background(background: str) -> str:
+    """背景图必须是已注册的资源"""
+    if background not in asset_manager.names(BACKGROUND):
+        raise HTTPException(status_code=400, detail=f"未注册的背景: {background}")
+    return background
+
+def validate_theme(theme: str) -> str:
+    """主题必须在模板目录中存在"""
+    if theme not in template_registry.themes():
+        raise HTTPException(status_code=400, detail=f"未知的主题: {theme}")
+    return theme
+
+def timing_fields(request: ContentRequest, timings: metrics.Timings) -> dict:
+    """请求要求时在响应中附带各阶段的耗时"""
+    return {"timings": timings.as_dict()} if request.include_timings else {}
+
+def output_options(request: ContentRequest) -> OutputOptions:
+    return OutputOptions(request.image_format, request.image_quality, request.image_scale, request.target_bytes)
+
+def atomic_write(path: Path, data: bytes | str):
+    """先写入同目录下的临时文件再重命名，读者不会看到写了一半的文件"""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        if isinstance(data, str):
+            tmp_path.write_text(data, encoding="utf-8")
+        else:
+            tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def save_html_and_capture_div(content: str, hashtags: str, is_first: bool = False, title: str = "", page_index: int = 0,
+                              request_id: str = "") -> str:
+    """渲染单个页面并捕获指定div为图片"""
+    page = {"page_index": page_index, "content": content, "hashtags": hashtags}
+    image_paths, _ = save_html_and_capture_pages([page], is_first=is_first, title=title, request_id=request_id)
+    return image_paths[0]
+
+def template_assets(background: str = "default", title_text: str = "", content_texts: tuple[str, ...] = ()) -> dict:
+    """模板中字体和背景图的URL
+
+    传入页面上的文字时，对应的字体换成只包含这些字符的子集；生成子集失败时使用完整字体。
+    """
+    assets = {
+        "title_font_url": asset_manager.url(FONT, "title"),
+        "title_font_format": "truetype",
+        "content_font_url": asset_manager.url(FONT, "content"),
+        "content_font_format": "truetype",
+        "background_url": asset_manager.url(BACKGROUND, background)
     }
+    if not (FONT_SUBSETTING and font_subsetter.available):
+        return assets
+    for name, texts in (("title", (title_text,) if title_text else ()), ("content", content_texts)):
+        if not texts:
+            continue
+        try:
+            with span("font_subset"):
+                subset_path = font_subsetter.subset(asset_manager.path(FONT, name), *texts)
+        except Exception as e:
+            logger.warning(f"生成{name}字体子集失败，使用完整字体: {str(e)}")
+            continue
+        assets[f"{name}_font_url"] = font_subsetter.url(subset_path)
+        assets[f"{name}_font_format"] = font_subsetter.css_format
+    return assets
+
+@span("browser_launch")
+def create_warm_driver():
+    """创建浏览器并先加载一次所有字体和背景图，之后的渲染直接使用浏览器中的缓存"""
+    driver = create_chrome_driver()
+    try:
+        driver.get(document_server.asset_url(asset_manager.preload_page().name))
+        _wait_for_render_ready(driver)
+    except Exception as e:
+        logger.warning(f"浏览器预加载资源失败: {str(e)}")
+    return driver
+
+def save_html_and_capture_pages(pages: list[dict], is_first: bool = False, title: str = "",
+                                request_id: str = "", background: str = "default",
+                                theme: str = "default",
+                                output: OutputOptions = DEFAULT_OUTPUT) -> tuple[list[str], list[dict]]:
+    """把多个页面渲染进同一个HTML文档，并在一次浏览器会话中依次截图
+
+    pages 中每项包含 page_index、content、hashtags。
+    标题页只有一页，content 即标题内容。
+    HTML只保存在内存中，由本地文档服务交给浏览器。
+    图片保存在 IMAGE_DIR/request_id/ 下，并发的请求互不覆盖。
+    返回图片路径和每张图片的输出信息（格式、尺寸、大小、编码耗时）。
+    """
+    request_id = request_id or new_request_id()
+    
+    # 图片按页码命名：标题页为1.png，内容页从2.png开始（扩展名随输出格式）
+    image_dir = IMAGE_DIR / request_id
+    image_dir.mkdir(parents=True, exist_ok=True)
+    image_paths = [image_dir / f"{page['page_index'] + 1}{output.extension}" for page in pages]
     
-    # 检查所有必需文件
-    for file_path, desc in font_files.items():
-        if not file_path.exists():
-            raise FileNotFoundError(f"找不到{desc}文件: {file_path}")
-    
-    # 复制资源文件到HTML目录
-    for resource in font_files.keys():
-        dest = HTML_DIR / resource.name
-        if not dest.exists():
-            import shutil
-            shutil.copy2(resource, dest)
-    
-    # 修改文件命名逻辑
-    file_prefix = "title" if is_first else "content"
-    html_path = HTML_DIR / f"{file_prefix}_{timestamp}.html"
-    # 图片按页码命名：标题页为1.png，内容页从2.png开始
-    image_name = f"{page_index + 1}.png"
-    image_path = IMAGE_DIR / image_name
-    
-    logger.info(f"正在生成{'标题' if is_first else '内容'}页面")
-    logger.info(f"HTML路径: {html_path}")
-    logger.info(f"图片路径: {image_path}")
+    logger.info(f"正在生成{'标题' if is_first else '内容'}页面，共 {len(pages)} 页")
+    logger.info(f"图片路径: {', '.join(str(p) for p in image_paths)}")
     
     # 渲染模板
-    template = title_template if is_first else content_template
     if is_first:
         # 标题页渲染
-        html_content = template.render(
-            title=content  # 对于标题页，content就是标题内容
-        )
+        assets = template_assets(background, title_text=pages[0]["content"])
+        with span("template_render"):
+            html_content = template_registry.render(
+                theme, TITLE,
+                title=pages[0]["content"],  # 对于标题页，content就是标题内容
+                **assets
+            )
     else:
         # 内容页渲染
-        html_content = template.render(
-            title=title,
-            content=content,
-            hashtags=hashtags
+        assets = template_assets(
+            background,
+            content_texts=(title, *(page["content"] for page in pages), *(page["hashtags"] for page in pages))
         )
+        with span("template_render"):
+            html_content = template_registry.render(theme, CONTENT, title=title, pages=pages, **assets)
     
-    # 保存HTML
+    # 从浏览器池借用驱动
     try:
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
-            logger.info("HTML已生成")
+        with document_server.publish(html_content) as url, browser_pool.driver() as driver:
+            outputs = _capture_content_boxes(driver, url, image_paths, output=output)
     except Exception as e:
-        logger.error(f"HTML生成错误: {str(e)}")
-        raise
+        logger.error(f"图片生成错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"图片生成错误: {str(e)}")
+    
+    return [str(p) for p in image_paths], outputs
+
+def save_raster_pages(pages: list[dict], is_first: bool = False, title: str = "",
+                      request_id: str = "", background: str = "default",
+                      output: OutputOptions = DEFAULT_OUTPUT) -> tuple[list[str], list[dict]]:
+    """不经过浏览器，直接绘制页面并保存图片，图片路径与浏览器渲染相同"""
+    request_id = request_id or new_request_id()
+    image_dir = IMAGE_DIR / request_id
+    image_dir.mkdir(parents=True, exist_ok=True)
+    
+    image_paths, outputs = [], []
+    for page in pages:
+        image_path = image_dir / f"{page['page_index'] + 1}{output.extension}"
+        with span("raster_draw"):
+            image = raster_renderer.render_page(
+                page, is_first=is_first, title=title, background=asset_manager.path(BACKGROUND, background)
+            )
+        with span("encode"):
+            encoded = encode_image(image, output, source_scale=raster_renderer.scale)
+        _save_image(image_path, encoded)
+        image_paths.append(str(image_path))
+        outputs.append(encoded.info())
+    return image_paths, outputs
+
+@span("image_write")
+def _save_image(image_path: Path, encoded: EncodedImage):
+    atomic_write(image_path, encoded.data)
+    logger.info(
+        f"图片已保存到: {image_path}（{encoded.format} {encoded.width}x{encoded.height}，"
+        f"{encoded.size // 1024}KB，编码 {encoded.encode_ms:.0f}ms）"
+    )
+
+def save_html_and_capture_article(paragraphs: list[str], title: str = "", request_id: str = "",
+                                  hashtags: str = "#生活分享", background: str = "default",
+                                  theme: str = "default",
+                                  output: OutputOptions = DEFAULT_OUTPUT) -> tuple[list[str], list[str], list[dict]]:
+    """一次加载整篇文章：由浏览器测量段落高度并分页，再在同一文档中依次截取每一页
+
+    返回分好页的内容、对应的图片路径（内容页从2.png开始）和每张图片的输出信息。
+    """
+    request_id = request_id or new_request_id()
+    
+    # 单独一页都放不下的段落先按行拆开，浏览器只负责决定每页放哪些段落
+    paragraphs = [
+        piece
+        for paragraph in paragraphs if paragraph.strip()
+        for piece in layout_engine.split_oversized(paragraph.strip(), title=title)
+    ]
+    
+    image_dir = IMAGE_DIR / request_id
+    image_dir.mkdir(parents=True, exist_ok=True)
     
-    # 设置Chrome选项
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--hide-scrollbars')
-    chrome_options.add_argument(f'--window-size=1200,1600')
-    chrome_options.add_argument('--disable-web-security')  # 添加此选项以允许跨域
+    assets = template_assets(background, content_texts=(title, *paragraphs, hashtags))
+    with span("template_render"):
+        html_content = template_registry.render(
+            theme, CONTENT,
+            title=title,
+            pages=[{"content": '\n\n'.join(paragraphs), "hashtags": hashtags}],
+            **assets
+        )
+    logger.info(f"正在一次性排版整篇文章，共 {len(paragraphs)} 段")
     
     try:
-        driver = webdriver.Chrome(options=chrome_options)
-        file_url = html_path.absolute().as_uri()
-        driver.get(file_url)
+        with document_server.publish(html_content) as url, browser_pool.driver() as driver:
+            _load_document(driver, url, 1)
+            layout = driver.execute_script(MEASURE_LAYOUT_JS)
+            if len(layout["heights"]) != len(paragraphs):
+                raise ValueError(f"段落数量不一致: {len(layout['heights'])}/{len(paragraphs)}")
+            page_groups = cut_measured_pages(
+                layout["heights"], layout["gap"], layout["available"], layout["hashtags"]
+            )
+            logger.info(f"浏览器排版完成，共 {len(page_groups)} 页")
+            
+            image_paths, outputs = [], []
+            for page_number, indexes in enumerate(page_groups, start=1):
+                is_last = page_number == len(page_groups)
+                driver.execute_script(SHOW_PAGE_JS, indexes, is_last)
+                image_path = image_dir / f"{page_number + 1}{output.extension}"
+                encoded = _capture_box(driver, 0, output=output)
+                _save_image(image_path, encoded)
+                image_paths.append(str(image_path))
+                outputs.append(encoded.info())
+    except Exception as e:
+        logger.error(f"图片生成错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"图片生成错误: {str(e)}")
+    
+    content_pages = ['\n\n'.join(paragraphs[i] for i in indexes) for indexes in page_groups]
+    return content_pages, image_paths, outputs
+
+# 测量第一个内容盒子中每个段落的实际高度，以及内容区可用的高度
+MEASURE_LAYOUT_JS = """
+    const box = document.querySelector('.content-box');
+    const content = box.querySelector('.content');
+    const contentStyle = getComputedStyle(content);
+    const wrapperStyle = getComputedStyle(box.querySelector('.content-wrapper'));
+    const hashtags = box.querySelector('.hashtags');
+    const top = content.getBoundingClientRect().top + parseFloat(contentStyle.paddingTop);
+    const bottom = box.getBoundingClientRect().bottom
+        - parseFloat(wrapperStyle.paddingBottom) - parseFloat(contentStyle.paddingBottom);
+    return {
+        heights: [...content.querySelectorAll('.paragraph')].map(p => p.getBoundingClientRect().height),
+        gap: parseFloat(contentStyle.rowGap) || 0,
+        available: bottom - top,
+        hashtags: hashtags ? hashtags.getBoundingClientRect().height : 0
+    };
+"""
+
+# 只显示属于当前页的段落，话题标签只在最后一页显示
+SHOW_PAGE_JS = """
+    const [indexes, isLast] = arguments;
+    const box = document.querySelector('.content-box');
+    const visible = new Set(indexes);
+    box.querySelectorAll('.content .paragraph').forEach((p, i) => {
+        p.style.display = visible.has(i) ? '' : 'none';
+    });
+    const hashtags = box.querySelector('.hashtags');
+    if (hashtags) hashtags.style.display = isLast ? '' : 'none';
+"""
+
+def cut_measured_pages(heights: list[float], gap: float, available: float, hashtags: float = 0) -> list[list[int]]:
+    """按浏览器测得的段落高度顺序贪心分页，返回每页的段落序号
+
+    最后一页需要为话题标签留出位置，放不下时把最后一段挪到新的一页。
+    """
+    pages = []
+    current = []
+    used = 0.0
+    for index, height in enumerate(heights):
+        extra = height + (gap if current else 0)
+        if current and used + extra > available:
+            pages.append(current)
+            current, used = [], 0.0
+            extra = height
+        current.append(index)
+        used += extra
+    if current:
+        if len(current) > 1 and used + hashtags > available:
+            pages.append(current[:-1])
+            current = current[-1:]
+        pages.append(current)
+    return pages
+
+@span("document_load")
+def _load_document(driver, url: str, min_boxes: int) -> list:
+    """加载文档并等待字体和图片就绪，返回所有内容盒子"""
+    driver.get(url)
+    
+    # 等待内容盒子加载完成
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.CLASS_NAME, "content-box"))
+    )
+    content_boxes = driver.find_elements(By.CLASS_NAME, "content-box")
+    if len(content_boxes) < min_boxes:
+        raise ValueError(f"内容盒子数量不足: {len(content_boxes)}/{min_boxes}")
+    
+    # 等待字体和背景图片真正就绪，代替固定的sleep
+    _wait_for_render_ready(driver)
+    return content_boxes
+
+def _capture_box(driver, index: int, content_box=None, backend: str = None,
+                 output: OutputOptions = DEFAULT_OUTPUT) -> EncodedImage:
+    """截取第 index 个内容盒子，尽量让浏览器直接输出目标格式"""
+    backend = backend or CAPTURE_BACKEND
+    started = time.perf_counter()
+    with span("capture"):
+        if backend == "screenshot":
+            if content_box is None:
+                content_box = driver.find_elements(By.CLASS_NAME, "content-box")[index]
+            data = _screenshot_element(driver, content_box, output)
+        elif backend == "html2canvas":
+            data = _html2canvas_element(driver, index, output)
+        else:
+            raise ValueError(f"未知的截图方式: {backend}")
+    with span("encode"):
+        return finish_capture(data, output, capture_ms=(time.perf_counter() - started) * 1000)
+
+def _capture_content_boxes(driver, url: str, image_paths: list[Path], backend: str = None,
+                           output: OutputOptions = DEFAULT_OUTPUT) -> list[dict]:
+    """在已有的浏览器中加载文档，并依次截取每个内容盒子，返回每张图片的输出信息"""
+    content_boxes = _load_document(driver, url, len(image_paths))
+    
+    outputs = []
+    for index, (content_box, image_path) in enumerate(zip(content_boxes, image_paths)):
+        encoded = _capture_box(driver, index, content_box, backend, output)
         
-        # 等待内容盒子加载完成
-        content_box = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "content-box"))
+        # 保存图片到请求目录
+        _save_image(image_path, encoded)
+        outputs.append(encoded.info())
+    return outputs
+
+def _wait_for_render_ready(driver):
+    """等待 document.fonts.ready 以及所有图片（包括CSS背景图）解码完成"""
+    driver.set_script_timeout(RENDER_READY_TIMEOUT)
+    driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        const waits = [document.fonts.ready];
+        document.querySelectorAll('img').forEach(img => {
+            waits.push(img.decode().catch(() => {}));
+        });
+        document.querySelectorAll('.content-box').forEach(el => {
+            const match = getComputedStyle(el).backgroundImage.match(/url\\(["']?(.*?)["']?\\)/);
+            if (match) {
+                const img = new Image();
+                img.src = match[1];
+                waits.push(img.decode().catch(() => {}));
+            }
+        });
+        Promise.all(waits).then(() => requestAnimationFrame(() => done(true)));
+    """)
+
+def _screenshot_element(driver, element, output: OutputOptions = DEFAULT_OUTPUT) -> bytes:
+    """使用浏览器原生截图获取元素的图片数据，由浏览器直接编码为输出格式"""
+    if not hasattr(driver, "execute_cdp_cmd"):
+        # 只能得到按设备像素比截取的PNG：先缩放到要求的倍数，之后由服务端转换格式
+        size = element.size
+        return resize_capture(
+            element.screenshot_as_png, round(size["width"] * output.scale), round(size["height"] * output.scale)
         )
-        
-        # 注入html2canvas库
+    
+    rect = driver.execute_script("""
+        const r = arguments[0].getBoundingClientRect();
+        return {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height};
+    """, element)
+    params = {
+        "format": output.capture_format,
+        "captureBeyondViewport": True,
+        "clip": {**rect, "scale": output.scale}
+    }
+    if output.capture_format != "png":
+        params["quality"] = output.quality
+    result = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+    # CDP协议只能以base64返回，直接解码字符串，不再做其他处理
+    return base64.b64decode(result["data"])
+
+def _inject_html2canvas(driver):
+    """向当前文档注入html2canvas，同一文档只注入一次"""
+    if driver.execute_script("return typeof html2canvas !== 'undefined'"):
+        return
+    if HTML2CANVAS_JS.exists():
+        # 注入本地的html2canvas，不依赖网络
+        driver.execute_script("""
+            const script = document.createElement('script');
+            script.textContent = arguments[0];
+            document.head.appendChild(script);
+        """, HTML2CANVAS_JS.read_text(encoding="utf-8"))
+    else:
+        logger.warning(f"未找到本地html2canvas: {HTML2CANVAS_JS}，从CDN加载")
         driver.execute_script("""
             return new Promise((resolve, reject) => {
                 var script = document.createElement('script');
-                script.src = 'https://html2canvas.hertzen.com/dist/html2canvas.min.js';
+                script.src = arguments[0];
                 script.onload = resolve;
                 script.onerror = reject;
                 document.body.appendChild(script);
             });
-        """)
-        
-        # 等待html2canvas加载完成
-        time.sleep(2)
-        
-        # 执行截图并等待结果
+        """, HTML2CANVAS_CDN)
+
+def _html2canvas_element(driver, index: int = 0, output: OutputOptions = DEFAULT_OUTPUT) -> bytes:
+    """使用html2canvas获取第 index 个内容盒子的图片数据
+
+    canvas 编码后的二进制数据直接POST回本地文档服务，不经过WebDriver的base64。
+    """
+    _inject_html2canvas(driver)
+    
+    mime_type = OutputOptions(output.capture_format).mime_type
+    with document_server.upload_slot() as (upload_url, uploaded):
+        # 执行截图并等待上传完成
         result = driver.execute_script("""
+            const [scale, index, mimeType, quality, uploadUrl] = arguments;
             return new Promise((resolve, reject) => {
-                const element = document.querySelector('.content-box');
+                const element = document.querySelectorAll('.content-box')[index];
                 if (!element) {
                     reject('Content box not found');
                     return;
@@ -506,345 +1133,747 @@ def save_html_and_capture_div(content: str, hashtags: str, is_first: bool = Fals
                 html2canvas(element, {
                     width: 975,
                     height: 1300,
-                    scale: 2,
+                    scale: scale,
                     useCORS: true,
                     allowTaint: true,
                     backgroundColor: null,
-                    logging: true,
-                    onclone: function(clonedDoc) {
-                        // 确保背景图片已加载
-                        const images = clonedDoc.getElementsByTagName('img');
-                        return Promise.all(Array.from(images).map(img => {
-                            if (img.complete) return Promise.resolve();
-                            return new Promise(resolve => {
-                                img.onload = resolve;
-                                img.onerror = resolve;
-                            });
-                        }));
-                    }
+                    logging: false
                 }).then(canvas => {
-                    resolve(canvas.toDataURL('image/png'));
+                    canvas.toBlob(blob => {
+                        fetch(uploadUrl, {method: 'POST', body: blob})
+                            .then(response => resolve(response.ok))
+                            .catch(reject);
+                    }, mimeType, quality / 100);
                 }).catch(error => {
                     reject(error);
                 });
             });
-        """)
-        
-        if not result:
-            raise ValueError("Failed to generate image")
-        
-        # 移除base64头部描述
-        img_data = result.replace('data:image/png;base64,', '')
-        
-        # 保存图片到image子目录
-        import base64
-        with open(image_path, 'wb') as f:
-            f.write(base64.b64decode(img_data))
-        
-        logger.info(f"图片已保存到: {image_path}")
-        
-    except Exception as e:
-        logger.error(f"图片生成错误: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"图片生成错误: {str(e)}")
-    
-    finally:
-        driver.quit()
+        """, output.scale, index, mime_type, output.quality, upload_url)
+        data = uploaded()
     
-    return str(html_path), str(image_path)
+    if not result or not data:
+        raise ValueError("Failed to generate image")
+    return data
 
 # 修改分页函数
-def calculate_content_pages(content: str, max_height: int = 1100) -> list[str]:
-    """根据内容长度动态分页，确保内容不会被裁剪"""
+@span("paginate")
+def calculate_content_pages(content: str, title: str = "", complete: bool = True) -> list[str]:
+    """按真实字宽排版并分页，确保内容不会被裁剪
+
+    complete 为False表示内容还没结束（流式生成），此时不为最后一页预留话题标签的位置。
+    """
     paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-    pages = []
-    current_page = []
-    estimated_height = 0
-    
-    # 调整参数使排版更紧凑
-    font_size = 24
-    line_height = 1.4  # 进一步减小行高
-    padding = 25  # 减小段落内边距
-    chars_per_line = 40  # 增加每行字符数
-    margin_between_paragraphs = 15  # 减小段落间距
-    title_height = 80  # 标题占用高度
-    hashtags_height = 50  # 标签占用高度
-    
-    # 计算可用内容区域高度
-    available_height = max_height - title_height - hashtags_height
-    
-    for para in paragraphs:
-        # 估算当前段落高度（考虑emoji和样式标签的影响）
-        effective_length = len(para) + (para.count('🌸') + para.count('✨') + para.count('🍭')) * 2
-        lines = math.ceil(effective_length / chars_per_line)
-        para_height = (lines * font_size * line_height) + padding
-        
-        # 如果不是第一段，添加段落间距
-        if current_page:
-            para_height += margin_between_paragraphs
-        
-        # 尝试添加到当前页
-        if estimated_height + para_height <= available_height or not current_page:
-            current_page.append(para)
-            estimated_height += para_height
-        else:
-            # 如果当前段落太长，尝试拆分
-            if len(para) > chars_per_line * 2:  # 只拆分较长的段落
-                words = para.split()
-                first_part = []
-                second_part = []
-                current_length = 0
-                
-                for word in words:
-                    if current_length + len(word) <= chars_per_line * 2:
-                        first_part.append(word)
-                        current_length += len(word) + 1
-                    else:
-                        second_part.append(word)
-                
-                if first_part:
-                    current_page.append(' '.join(first_part))
-                    pages.append('\n\n'.join(current_page))
-                    current_page = [' '.join(second_part)] if second_part else []
-                    estimated_height = para_height
-                else:
-                    pages.append('\n\n'.join(current_page))
-                    current_page = [para]
-                    estimated_height = para_height
-            else:
-                pages.append('\n\n'.join(current_page))
-                current_page = [para]
-                estimated_height = para_height
+    pages = layout_engine.paginate(paragraphs, title=title, complete=complete)
+    return ['\n\n'.join(page) for page in pages]
+
+def build_prompt(request: ContentRequest) -> str:
+    """根据请求构造提示词
+
+    固定的说明放在前面，主题和风格放在最后：所有请求的提示词前缀相同，
+    Ollama 可以复用上一次请求已经计算好的前缀（KV缓存），只需处理最后几行。
+    """
+    return (request.system_prompt or PROMPT_PREAMBLE) + f"\n\n主题：{request.topic}\n风格：{request.style}"
+
+async def generate_article(request: ContentRequest) -> tuple[str, str]:
+    """调用模型生成文案，返回标题和加好emoji、样式的正文（尚未分页）"""
+    generated_text = await generate_with_ollama(build_prompt(request), request.cache, request.variations)
+    generated_text = clean_content(generated_text)
     
-    # 添加最后一页
-    if current_page:
-        pages.append('\n\n'.join(current_page))
+    # 分离标题和内容
+    lines = generated_text.splitlines()
+    title = lines[0].strip() if lines else ""
+    content = '\n\n'.join(lines[1:]) if len(lines) > 1 else ""
     
-    return pages
+    logger.info(f"生成的标题: {title}")  # 添加日志
+    
+    # 处理内容，添加emoji和样式
+    decorated_content = add_emojis_and_styling(content)
+    return title, decorated_content
+
+async def generate_post(request: ContentRequest) -> tuple[str, list[str]]:
+    """调用模型生成文案，返回标题和分好页的内容"""
+    title, decorated_content = await generate_article(request)
+    
+    # 分页处理
+    content_pages = calculate_content_pages(decorated_content, title=title)
+    return title, content_pages
+
+class IncrementalPaginator:
+    """逐段追加内容并分页，只返回不会再变化的页面
+
+    分页是顺序贪心的，排满的页面不会因为后续段落而改变，而且每一页都从页首重新开始计算。
+    因此只需保留最后一页（尚未排满）的段落，每次追加时只对这一页重新排版，
+    总耗时与文章长度成线性关系，结果与对整篇文章调用 calculate_content_pages 相同。
+    """
+
+    def __init__(self, title: str = ""):
+        self.title = title
+        self.open_page = []  # 最后一页的段落（被拆开的段落只保留落在这一页的部分）
+
+    def _paginate(self, paragraphs: list[str], complete: bool) -> list[list[str]]:
+        return layout_engine.paginate(paragraphs, title=self.title, complete=complete)
+
+    def add(self, paragraph: str) -> list[str]:
+        """追加一个段落，返回新确定的页面"""
+        self.open_page += [p.strip() for p in paragraph.split('\n\n') if p.strip()]
+        pages = self._paginate(self.open_page, complete=False)
+        if not pages:
+            return []
+        self.open_page = pages[-1]
+        return ['\n\n'.join(page) for page in pages[:-1]]
+
+    def finish(self) -> list[str]:
+        """内容结束，返回剩余的所有页面"""
+        pages = self._paginate(self.open_page, complete=True)
+        self.open_page = []
+        return ['\n\n'.join(page) for page in pages]
 
 # 修改生成内容的处理逻辑
+def build_page(page_index: int, title: str, content_pages: list[str]) -> dict:
+    """构造某一页的渲染参数，页码0为标题页"""
+    if page_index == 0:
+        return {"page_index": 0, "content": title, "hashtags": ""}
+    return {
+        "page_index": page_index,
+        "content": content_pages[page_index - 1],
+        # 移除话题标签，只在最后一页显示生活分享标签
+        "hashtags": "#生活分享" if page_index == len(content_pages) else ""
+    }
+
+def render_job_pages(request_id: str, pages: list[dict], is_first: bool = False, title: str = "",
+                     renderer: str = "browser", background: str = "default", theme: str = "default",
+                     output: OutputOptions = DEFAULT_OUTPUT) -> list[dict]:
+    """渲染任务中的一组页面，并记录每页的渲染状态（在渲染线程中执行）
+
+    返回每页的图片路径和输出信息。光栅渲染按默认主题的布局绘制，不使用 theme。
+    """
+    for page in pages:
+        job_store.set_page_status(request_id, page["page_index"], PAGE_PENDING)
+    try:
+        if renderer == "raster":
+            image_paths, outputs = save_raster_pages(
+                pages, is_first=is_first, title=title, request_id=request_id, background=background,
+                output=output
+            )
+        else:
+            image_paths, outputs = save_html_and_capture_pages(
+                pages, is_first=is_first, title=title, request_id=request_id, background=background, theme=theme,
+                output=output
+            )
+    except Exception:
+        for page in pages:
+            job_store.set_page_status(request_id, page["page_index"], PAGE_FAILED)
+        raise
+    for page, image_path, image_output in zip(pages, image_paths, outputs):
+        job_store.set_page_status(request_id, page["page_index"], PAGE_DONE, image_path, output=image_output)
+        PAGES_RENDERED.inc(renderer=renderer, format=image_output["format"])
+        IMAGE_BYTES.inc(image_output["bytes"], format=image_output["format"])
+    return [
+        {"image_path": image_path, "output": image_output}
+        for image_path, image_output in zip(image_paths, outputs)
+    ]
+
+def render_job_article(request_id: str, title: str, content: str, topic: str = "", style: str = "",
+                       ttl: float = None, background: str = "default", theme: str = "default",
+                       output: OutputOptions = DEFAULT_OUTPUT) -> list[str]:
+    """浏览器分页模式：一次排版并渲染所有内容页，保存任务并记录每页状态（在渲染线程中执行）
+
+    返回分好页的内容。
+    """
+    content_pages, image_paths, outputs = save_html_and_capture_article(
+        content.split('\n\n'), title=title, request_id=request_id, background=background, theme=theme,
+        output=output
+    )
+    job_store.save_job(request_id, title, content_pages, topic=topic, style=style, ttl=ttl)
+    for page_index, (image_path, image_output) in enumerate(zip(image_paths, outputs), start=1):
+        job_store.set_page_status(request_id, page_index, PAGE_DONE, image_path, output=image_output)
+        PAGES_RENDERED.inc(renderer="browser", format=image_output["format"])
+        IMAGE_BYTES.inc(image_output["bytes"], format=image_output["format"])
+    return content_pages
+
+def get_resumable_job(request_id: str) -> dict | None:
+    """读取可以继续渲染的任务
+
+    流式生成中断时留下的任务内容不完整，删除后返回None，由调用方重新生成整篇文章。
+    """
+    job = job_store.get_job(request_id)
+    if job is not None and not job["complete"]:
+        logger.info(f"任务内容不完整，重新生成: {request_id}")
+        job_store.delete_job(request_id)
+        return None
+    return job
+
+def is_page_done(job: dict, page_index: int) -> bool:
+    """页面已经渲染完成且图片仍然存在"""
+    page_state = job["pages"].get(page_index)
+    return bool(
+        page_state and page_state["status"] == PAGE_DONE and page_state["image_path"]
+        and Path(page_state["image_path"]).exists()
+    )
+
 @app.post("/generate")
 async def generate_content(request: ContentRequest):
     """生成小红书风格的内容"""
-    request_id = request.request_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    timings = metrics.begin_request()
+    request_id = validate_request_id(request.request_id) if request.request_id else new_request_id()
+    validate_background(request.background)
+    validate_theme(request.theme)
     page_index = int(request.page_index) if request.page_index else 0
     is_first = (page_index == 0)
     
-    # 从用户状态中获取或创建HTML文件列表
-    if request_id not in user_generation_states:
-        user_generation_states[request_id] = {
-            "html_files": []  # 用于跟踪该请求生成的所有HTML文件
-        }
+    # 渲染队列已满时尽早拒绝，避免白白调用模型
+    if render_executor.is_full():
+        raise render_queue_full_error()
     
     try:
         logger.info(f"收到生成请求 - 主题: {request.topic}, 风格: {request.style}")
         logger.info(f"请求ID: {request_id}, 页面索引: {page_index}")
         
+        if not request.request_id:
+            job = None
+        elif page_index == 0:
+            job = get_resumable_job(request_id)
+        else:
+            job = job_store.get_job(request_id)
+        
         if page_index == 0:  # 标题页
-            # 生成内容
-            prompt = request.system_prompt + f"\n\n主题：{request.topic}\n风格：{request.style}" if request.system_prompt else f"""
-            请你扮演一个90后小红书博主，围绕主题"{request.topic}"创作一篇{request.style}风格的文案。
-            要求：
-            1. 文案总字数控制在5000字之间
-            2. 标题要简短吸引人，带有emoji，最多10字，需要能自然分成三行，标题严格限制在10字以内！
-            3. 正文分段阐述，每段都要带emoji
-            4. 使用网络流行语，要有年轻人的语气
-            5. 内容要接地气，像朋友在聊天
-            6. 每段都要简短有力，突出重点
-            7. 使用中文标点符号
-            """
-            
-            generated_text = await generate_with_ollama(prompt)
-            generated_text = clean_content(generated_text)
-            
-            # 分离标题和内容
-            lines = generated_text.splitlines()
-            title = lines[0].strip() if lines else ""
-            content = '\n\n'.join(lines[1:]) if len(lines) > 1 else ""
-            
-            logger.info(f"生成的标题: {title}")  # 添加日志
-            
-            # 处理内容，添加emoji和样式
-            decorated_content = add_emojis_and_styling(content)
-            
-            # 分页处理
-            content_pages = calculate_content_pages(decorated_content)
+            if job is not None:
+                # 任务已存在（例如服务重启后恢复），直接使用保存的内容，不再调用模型
+                logger.info(f"恢复已有任务: {request_id}")
+                title, content_pages = job["title"], job["content_pages"]
+            elif PAGINATION_MODE == "browser" and request.renderer == "browser":
+                # 由浏览器分页，所有内容页在同一个文档中一次渲染完成
+                title, content = await generate_article(request)
+                content_pages = await render_executor.run(
+                    render_job_article, request_id, title, content,
+                    topic=request.topic, style=request.style, ttl=request.job_ttl,
+                    background=request.background, theme=request.theme, output=output_options(request)
+                )
+            else:
+                title, content_pages = await generate_post(request)
+                job_store.save_job(
+                    request_id, title, content_pages,
+                    topic=request.topic, style=request.style, ttl=request.job_ttl
+                )
             total_pages = len(content_pages)
             
             logger.info(f"内容已分为 {total_pages} 页")
             
             # 生成标题页
-            html_path, image_path = save_html_and_capture_div(
-                content=title,
-                hashtags="",
+            [image] = await render_executor.run(
+                render_job_pages,
+                request_id,
+                [build_page(0, title, content_pages)],
                 is_first=True,
                 title=title,
-                page_index=0
+                renderer=request.renderer,
+                background=request.background,
+                theme=request.theme,
+                output=output_options(request)
             )
-            # 记录HTML文件路径
-            user_generation_states[request_id]["html_files"].append(html_path)
-            
-            # 更新状态
-            user_generation_states[request_id].update({
-                "title": title,
-                "content_pages": content_pages,
-                "total_pages": total_pages,
-                "current_page": 0,
-                "timestamp": datetime.now()
-            })
             
             return {
                 "status": "success",
-                "html_path": html_path,
-                "image_path": image_path,
+                "image_path": image["image_path"],
+                "output": image["output"],
                 "is_first": is_first,
                 "request_id": request_id,
                 "page_index": page_index,
                 "total_pages": total_pages,
                 "title": title,  # 确保返回标题
                 "content": title,  # 对于标题页，content就是标题内容
-                "hashtags": []
+                "hashtags": [],
+                **timing_fields(request, timings)
             }
         
         else:  # 内容页
-            if request_id not in user_generation_states:
+            if job is None:
                 raise HTTPException(status_code=400, detail=f"无效的请求ID: {request_id}")
+            if not job["complete"]:
+                raise HTTPException(status_code=409, detail=f"任务内容尚未生成完成，请重新请求标题页: {request_id}")
             
-            state = user_generation_states[request_id]
-            title = state["title"]
-            content_pages = state["content_pages"]
-            total_pages = state["total_pages"]
+            title = job["title"]
+            content_pages = job["content_pages"]
+            total_pages = job["total_pages"]
             
             if page_index > total_pages:
                 raise HTTPException(status_code=400, detail=f"页面索引超出范围: {page_index}/{total_pages}")
             
             # 获取当前页内容
-            current_page_content = content_pages[page_index - 1]
-            
-            # 移除话题标签，只在最后一页显示生活分享标签
-            hashtags = ["#生活分享"] if page_index == total_pages else []
-            hashtags_text = ' '.join(hashtags)
+            page = build_page(page_index, title, content_pages)
+            current_page_content = page["content"]
+            hashtags = [page["hashtags"]] if page["hashtags"] else []
             
-            # 生成内容页
-            html_path, image_path = save_html_and_capture_div(
-                current_page_content,
-                hashtags_text,
-                is_first=False,
-                title=title,
-                page_index=page_index
-            )
-            # 记录HTML文件路径
-            user_generation_states[request_id]["html_files"].append(html_path)
+            if is_page_done(job, page_index):
+                # 已经渲染过（例如浏览器分页模式下一次渲染了所有内容页），直接返回
+                image = job["pages"][page_index]
+            else:
+                # 生成内容页
+                [image] = await render_executor.run(
+                    render_job_pages,
+                    request_id,
+                    [page],
+                    is_first=False,
+                    title=title,
+                    renderer=request.renderer,
+                    background=request.background,
+                    theme=request.theme,
+                    output=output_options(request)
+                )
             
-            # 如果是最后一页，清理所有HTML文件
+            # 任务记录保留到过期，便于重新获取
             if page_index == total_pages:
-                # 清理该请求生成的所有HTML文件
-                html_files = user_generation_states[request_id]["html_files"]
-                for html_file in html_files:
-                    try:
-                        Path(html_file).unlink()
-                        logger.info(f"已清理HTML文件: {html_file}")
-                    except Exception as e:
-                        logger.warning(f"清理HTML文件失败: {str(e)}")
-                
-                # 清理状态
-                del user_generation_states[request_id]
-                logger.info("所有页面生成完成，已清理HTML文件和状态")
+                logger.info("所有页面生成完成")
         
         return {
             "status": "success",
-            "html_path": html_path,
-            "image_path": image_path,
+            "image_path": image["image_path"],
+            "output": image.get("output"),
             "is_first": is_first,
             "request_id": request_id,
             "page_index": page_index,
             "total_pages": total_pages,
             "title": title if page_index == 1 else None,  # 只在第一页返回标题
             "content": current_page_content if not is_first else None,
-            "hashtags": hashtags if page_index == total_pages else []
+            "hashtags": hashtags if page_index == total_pages else [],
+            **timing_fields(request, timings)
         }
         
+    except RenderQueueFull:
+        # 保留状态，客户端可以稍后重试同一页
+        raise render_queue_full_error()
+    
+    except HTTPException:
+        # 保留原本的状态码（例如缓存未命中的404）
+        raise
+    
     except Exception as e:
-        # 发生错误时也清理HTML文件
-        if request_id in user_generation_states:
-            html_files = user_generation_states[request_id]["html_files"]
-            for html_file in html_files:
-                try:
-                    Path(html_file).unlink()
-                    logger.info(f"错误处理时清理HTML文件: {html_file}")
-                except Exception as clean_error:
-                    logger.warning(f"清理HTML文件失败: {str(clean_error)}")
-            del user_generation_states[request_id]
-        
+        # 任务记录保留，客户端可以重试失败的页面
         logger.error(f"生成过程发生错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-# 添加定期清理函数
-async def cleanup_files():
-    """定期清理HTML文件"""
-    while True:
-        try:
-            # 清理HTML目录中的所有html文件
-            for html_file in HTML_DIR.glob("*.html"):
-                try:
-                    html_file.unlink()
-                    logger.info(f"清理过期HTML文件: {html_file}")
-                except Exception as e:
-                    logger.warning(f"清理文件失败: {str(e)}")
-            
-            await asyncio.sleep(3600)  # 每小时检查一次
-            
-        except Exception as e:
-            logger.error(f"清理过程发生错误: {str(e)}")
-            await asyncio.sleep(3600)  # 发生错误时等待一小时后重试
+@app.get("/jobs/{request_id}")
+async def get_job_status(request_id: str):
+    """查询任务的渲染进度，用于崩溃或重启后继续渲染剩余页面"""
+    job = job_store.get_job(request_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {request_id}")
+    
+    pages = []
+    for page_index in range(job["total_pages"] + 1):
+        page_state = job["pages"].get(page_index, {})
+        pages.append({
+            "page_index": page_index,
+            "status": page_state.get("status", PAGE_PENDING),
+            "image_path": page_state.get("image_path"),
+            "output": page_state.get("output")
+        })
+    
+    return {
+        "request_id": request_id,
+        "topic": job["topic"],
+        "style": job["style"],
+        "title": job["title"],
+        "total_pages": job["total_pages"],
+        "content_complete": job["complete"],
+        "completed": job["complete"] and all(page["status"] == PAGE_DONE for page in pages),
+        "pending_pages": [page["page_index"] for page in pages if page["status"] != PAGE_DONE],
+        "pages": pages,
+        "expires_at": datetime.fromtimestamp(job["expires_at"]).isoformat()
+    }
+
+@app.post("/generate/batch")
+async def generate_batch(request: ContentRequest):
+    """一次生成整篇文章的所有页面
+
+    标题页单独一个文档；内容页按 BATCH_PARALLELISM 分组，
+    每组渲染进同一个文档，在一个浏览器会话中依次截图，各组并行。
+    传入已有任务的 request_id 时不再调用模型，只渲染尚未完成的页面。
+    """
+    timings = metrics.begin_request()
+    request_id = validate_request_id(request.request_id) if request.request_id else new_request_id()
+    validate_background(request.background)
+    validate_theme(request.theme)
+    
+    if render_executor.is_full():
+        raise render_queue_full_error()
+    
+    try:
+        logger.info(f"收到批量生成请求 - 主题: {request.topic}, 风格: {request.style}")
+        
+        job = get_resumable_job(request_id) if request.request_id else None
+        if job is not None:
+            logger.info(f"恢复已有任务: {request_id}")
+            title, content_pages = job["title"], job["content_pages"]
+            done_pages = {page_index for page_index in job["pages"] if is_page_done(job, page_index)}
+        elif PAGINATION_MODE == "browser" and request.renderer == "browser":
+            # 标题页和整篇文章的内容页各用一个浏览器并行渲染
+            # 任务在 render_job_article 分好页后才保存：文章渲染失败时不会留下没有内容页的任务，
+            # 重试时重新生成，而不是把空任务当作已经完成
+            title, content = await generate_article(request)
+            [title_image], content_pages = await render_executor.run_many([
+                functools.partial(
+                    render_job_pages, request_id, [build_page(0, title, [])],
+                    is_first=True, title=title, background=request.background, theme=request.theme,
+                    output=output_options(request)
+                ),
+                functools.partial(
+                    render_job_article, request_id, title, content,
+                    topic=request.topic, style=request.style, ttl=request.job_ttl,
+                    background=request.background, theme=request.theme, output=output_options(request)
+                )
+            ])
+            # 标题页可能先于任务保存完成，它的状态在这里补记
+            job_store.set_page_status(
+                request_id, 0, PAGE_DONE, title_image["image_path"], output=title_image["output"]
+            )
+            done_pages = set(range(len(content_pages) + 1))
+        else:
+            title, content_pages = await generate_post(request)
+            job_store.save_job(
+                request_id, title, content_pages,
+                topic=request.topic, style=request.style, ttl=request.job_ttl
+            )
+            done_pages = set()
+        total_pages = len(content_pages)
+        logger.info(f"内容已分为 {total_pages} 页")
+        
+        pages = [
+            build_page(page_index, title, content_pages)
+            for page_index in range(1, total_pages + 1)
+            if page_index not in done_pages
+        ]
+        
+        # 内容页按组切分，标题页占用一个浏览器
+        group_count = max(1, min(BATCH_PARALLELISM - 1, len(pages)))
+        group_size = math.ceil(len(pages) / group_count) if pages else 0
+        groups = [pages[i:i + group_size] for i in range(0, len(pages), group_size)] if pages else []
+        
+        calls = []
+        if 0 not in done_pages:
+            calls.append(functools.partial(
+                render_job_pages, request_id, [build_page(0, title, content_pages)],
+                is_first=True, title=title, renderer=request.renderer,
+                background=request.background, theme=request.theme, output=output_options(request)
+            ))
+        calls += [
+            functools.partial(
+                render_job_pages, request_id, group, is_first=False, title=title,
+                renderer=request.renderer, background=request.background, theme=request.theme,
+                output=output_options(request)
+            )
+            for group in groups
+        ]
+        if calls:
+            await render_executor.run_many(calls)
+        
+        logger.info("所有页面生成完成")
+        
+        job = job_store.get_job(request_id)
+        return {
+            "status": "success",
+            "request_id": request_id,
+            "total_pages": total_pages,
+            "title": title,
+            "hashtags": ["#生活分享"] if total_pages else [],
+            "pages": [
+                {
+                    "page_index": page_index,
+                    "image_path": job["pages"][page_index]["image_path"],
+                    "output": job["pages"][page_index].get("output"),
+                    "content": build_page(page_index, title, content_pages)["content"]
+                }
+                for page_index in range(total_pages + 1)
+            ],
+            **timing_fields(request, timings)
+        }
+    
+    except RenderQueueFull:
+        raise render_queue_full_error()
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"批量生成过程发生错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse_event(event: str, data: dict) -> str:
+    """格式化一条SSE事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/generate/stream")
+async def generate_stream(request: ContentRequest):
+    """流式生成：模型还在输出时就开始分页和渲染
+
+    以SSE返回事件：title（标题页就绪）、page（内容页就绪）、done、error。
+    """
+    request_id = validate_request_id(request.request_id) if request.request_id else new_request_id()
+    validate_background(request.background)
+    validate_theme(request.theme)
+    
+    # 在打开流之前准入，队列已满时直接返回429；名额在流结束时归还
+    try:
+        admission = render_executor.admit()
+    except RenderQueueFull:
+        raise render_queue_full_error()
+    
+    logger.info(f"收到流式生成请求 - 主题: {request.topic}, 风格: {request.style}")
+    return StreamingResponse(
+        _stream_post_events(request, request_id, admission),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+        background=BackgroundTask(admission.close)  # 流没有开始就结束时同样归还名额
+    )
+
+async def _stream_post_events(request: ContentRequest, request_id: str, admission: RenderAdmission):
+    events = asyncio.Queue()
+    producer = asyncio.create_task(_stream_post(request, request_id, events, admission))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield _sse_event(*event)
+    finally:
+        # 客户端断开时停止生成
+        if not producer.done():
+            producer.cancel()
+        admission.close()
+
+async def _stream_post(request: ContentRequest, request_id: str, events: asyncio.Queue,
+                       admission: RenderAdmission):
+    """边接收模型输出边渲染，渲染完成的页面放入 events 队列"""
+    timings = metrics.begin_request()
+    render_tasks = []
+    
+    def schedule_render(event: str, data: dict, page: dict, is_first: bool):
+        async def render():
+            [[image]] = await admission.run_many(
+                [functools.partial(
+                    render_job_pages, request_id, [page], is_first=is_first, title=title,
+                    renderer=request.renderer, background=request.background, theme=request.theme,
+                    output=output_options(request)
+                )]
+            )
+            await events.put((event, {**data, **image}))
+        render_tasks.append(asyncio.create_task(render()))
+    
+    def save_job(complete: bool = False):
+        # 最后一页和话题标签确定之前任务都标记为不完整，中途断开时不会被当作完整的文章恢复
+        job_store.save_job(
+            request_id, title, content_pages,
+            topic=request.topic, style=request.style, ttl=request.job_ttl, complete=complete
+        )
+    
+    def schedule_pages(pages: list[str], hashtags: str = ""):
+        for page_content in pages:
+            page_index = len(content_pages) + 1
+            content_pages.append(page_content)
+            save_job()
+            data = {"request_id": request_id, "page_index": page_index, "content": page_content}
+            if hashtags:
+                data["hashtags"] = [hashtags]
+            schedule_render(
+                "page",
+                data,
+                {"page_index": page_index, "content": page_content, "hashtags": hashtags},
+                is_first=False
+            )
+    
+    title = None
+    content_pages = []
+    paginator = None
+    # 思考过程在接收时就被去掉，每个片段只处理一次
+    cleaner = content_cleaner.stream()
+    
+    def handle_lines(lines: list[str]):
+        nonlocal title, paginator
+        for line in lines:
+            if title is None:
+                # 第一行是标题，立即渲染标题页
+                title = line.strip()
+                logger.info(f"生成的标题: {title}")
+                paginator = IncrementalPaginator(title)
+                save_job()
+                schedule_render(
+                    "title",
+                    {"request_id": request_id, "page_index": 0, "title": title},
+                    {"page_index": 0, "content": title, "hashtags": ""},
+                    is_first=True
+                )
+            else:
+                schedule_pages(paginator.add(add_emojis_and_styling(line)))
+    
+    try:
+        async for token in stream_llm(build_prompt(request), request.cache, request.variations):
+            handle_lines(cleaner.lines(token))
+        handle_lines(cleaner.finish_lines())
+        
+        if title is None:
+            raise HTTPException(status_code=500, detail="生成的内容为空")
+        
+        # 剩余页面，最后一页带上生活分享标签
+        rest = paginator.finish()
+        schedule_pages(rest[:-1])
+        schedule_pages(rest[-1:], hashtags="#生活分享")
+        save_job(complete=True)
+        logger.info(f"内容已分为 {len(content_pages)} 页")
+        
+        await asyncio.gather(*render_tasks)
+        await events.put(("done", {
+            "request_id": request_id,
+            "title": title,
+            "total_pages": len(content_pages),
+            **timing_fields(request, timings)
+        }))
+    
+    except HTTPException as e:
+        await events.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+    
+    except Exception as e:
+        logger.error(f"流式生成过程发生错误: {str(e)}", exc_info=True)
+        await events.put(("error", {"status_code": 500, "detail": str(e)}))
+    
+    finally:
+        for task in render_tasks:
+            if not task.done():
+                task.cancel()
+        await events.put(None)
 
 # 修改启动事件
 @app.on_event("startup")
 async def startup_event():
+    # 创建共享的HTTP客户端
+    get_http_client()
+    
     if not await check_ollama_status():
         print("警告: Ollama服务未启动，请确保服务可用")
+    elif OLLAMA_WARMUP:
+        # 在后台加载模型，不阻塞启动
+        asyncio.create_task(warm_up_model())
+    # 后台定期检查各后端，恢复可用的后端重新预热
+    asyncio.create_task(llm_router.run_health_checks(
+        get_http_client, on_recover=warm_up_backend if OLLAMA_WARMUP else None
+    ))
+    
+    # 检查并暂存字体和背景图，之后的渲染不再检查和复制文件
+    await asyncio.to_thread(asset_manager.stage)
     
-    # 启动定期清理任务
-    asyncio.create_task(cleanup_files())
+    # 编译页面模板，启动本地文档服务
+    await asyncio.to_thread(template_registry.prewarm)
+    document_server.start()
+    
+    # 预热浏览器池
+    await asyncio.to_thread(browser_pool.start)
+    
+    # 预热光栅渲染用的背景图
+    try:
+        await asyncio.to_thread(raster_renderer.prewarm)
+    except Exception as e:
+        logger.warning(f"预热光栅渲染失败: {str(e)}")
     
     async def cleanup_states():
         while True:
-            await asyncio.sleep(3600)  # 每小时清理一次
-            user_generation_states.clear()
-            logger.info("已清理用户生成状态")
+            await asyncio.sleep(JOB_EVICT_INTERVAL)
+            try:
+                evicted = job_store.evict_expired()
+                if evicted:
+                    logger.info(f"已清理 {evicted} 个过期任务")
+            except Exception as e:
+                logger.error(f"清理过期任务失败: {str(e)}")
+            try:
+                await asyncio.to_thread(llm_cache.evict)
+            except Exception as e:
+                logger.error(f"清理LLM缓存失败: {str(e)}")
     
     asyncio.create_task(cleanup_states())
 
-# 添加clean_content函数定义
+@app.on_event("shutdown")
+async def shutdown_event():
+    render_executor.shutdown()
+    await asyncio.to_thread(browser_pool.close)
+    document_server.close()
+    await close_http_client()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """按路由统计请求数和耗时（按路由模板统计，不按具体的request_id）"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        if endpoint != "/metrics":
+            REQUESTS.inc(endpoint=endpoint, status=str(status))
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus格式的监控指标"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+class KeepAliveRequest(BaseModel):
+    duration: float | None = Field(default=None, gt=0)  # 窗口持续的秒数，不传表示直到 DELETE
+    keep_alive: str | float | None = None  # 窗口结束后模型保持加载的时间（秒数或 "1h30m"），默认 OLLAMA_KEEP_ALIVE
+
+@app.post("/model/keep-alive")
+async def start_keep_alive_window(request: KeepAliveRequest):
+    """开始批量生成窗口：立即加载模型，窗口内模型一直保持加载"""
+    after = OLLAMA_KEEP_ALIVE_SECONDS
+    if request.keep_alive is not None:
+        try:
+            after = parse_keep_alive(request.keep_alive)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    _keep_alive_window.update(
+        active=True,
+        until=time.monotonic() + request.duration if request.duration else None,
+        after=after
+    )
+    if not await load_model_everywhere():
+        raise HTTPException(status_code=503, detail="加载模型失败：没有可用的Ollama后端")
+    return model_status()
+
+@app.delete("/model/keep-alive")
+async def end_keep_alive_window():
+    """结束批量生成窗口，模型改为按窗口设置的时间（默认 OLLAMA_KEEP_ALIVE）计时后卸载"""
+    after = _keep_alive_window["after"]
+    _keep_alive_window.update(active=False, until=None, after=OLLAMA_KEEP_ALIVE_SECONDS)
+    # 窗口内的请求让模型一直保持加载，需要一次请求重新开始计时
+    await load_model_everywhere(keep_alive=format_keep_alive(after))
+    return model_status()
+
+@app.get("/pool/stats")
+async def get_pool_stats():
+    """查看浏览器池和渲染队列状态"""
+    return {
+        "browser_pool": browser_pool.stats(),
+        "render_executor": render_executor.stats(),
+        "llm_cache": await asyncio.to_thread(llm_cache.stats),
+        "font_subsets": font_subsetter.stats(),
+        "document_server": document_server.stats(),
+        "llm": model_status()
+    }
+
+@span("clean_content")
 def clean_content(text: str) -> str:
     """清理生成的内容
-    - 移除<think>标签及其内容
-    - 移除其他思考标记
-    - 清理多余的空行
+    - 移除<think>等思考标记及其内容（没有结束标记时去掉到结尾）
+    - 移除HTML注释
+    - 清理行首行尾的空白和多余的空行
     """
-    # 移除<think>标签及其内容
-    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-    
-    # 移除其他可能的思考标记
-    text = re.sub(r'\[思考\].*?\[/思考\]', '', text, flags=re.DOTALL)
-    text = re.sub(r'【思考】.*?【/思考】', '', text, flags=re.DOTALL)
-    text = re.sub(r'（思考）.*?（/思考）', '', text, flags=re.DOTALL)
-    
-    # 移除markdown格式的注释
-    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
-    
-    # 清理多余的空行
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    
-    # 清理行首行尾的空白字符
-    text = '\n'.join(line.strip() for line in text.split('\n'))
-    
-    # 最后整体去除首尾空白
-    return text.strip()
+    return content_cleaner.clean(text)
 
 if __name__ == "__main__":
     import uvicorn
     logger.info(f"正在启动服务...")
     logger.info(f"使用模型: {MODEL_NAME}")
+    logger.info(f"Ollama后端: {', '.join(backend.url for backend in llm_router.backends)}（{OLLAMA_ROUTING}）")
     logger.info(f"保存目录: {SAVE_DIR}")
     logger.info(f"图片目录: {IMAGE_DIR}")
     